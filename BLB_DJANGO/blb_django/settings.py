@@ -45,20 +45,27 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primero para medir la petición completa (ver gestion/metricas.py)
+    'gestion.metricas.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # ?_profile=1 en cualquier URL (solo personal), ver gestion/perfilado.py
+    'gestion.perfilado.PerfiladoMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'gestion.replica.ReplicaMiddleware',
+    'gestion.consultas_lentas.ConsultasLentasMiddleware',
 ]
 
 ROOT_URLCONF = 'blb_django.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que además mide el tiempo de render por petición
+        'BACKEND': 'gestion.metricas.PlantillasMedidas',
         'DIRS': [BASE_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -82,9 +89,87 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        # Reutilizar la conexión entre peticiones en lugar de abrir una nueva cada vez
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # BEGIN IMMEDIATE: las transacciones de escritura toman el lock al empezar
+            # y esperan (busy_timeout) en vez de fallar con "database is locked" a mitad
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+    },
+    # Copia de solo lectura para el catálogo (ver gestion/replica.py)
+    # Se actualiza con: python manage.py sincronizar_replica --cada 5
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_replica.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+        },
+        'PRAGMAS': {
+            'query_only': 1,
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
+}
+
+DATABASE_ROUTERS = ['gestion.replica.ReplicaRouter']
+
+# Segundos que las lecturas de un usuario se quedan en 'default' después de que escribe.
+# Debe ser mayor que el intervalo de sincronización de la réplica.
+REPLICA_PIN_SEGUNDOS = 10
+
+# PRAGMA aplicados a cada conexión nueva de SQLite (ver gestion/db.py)
+# - WAL: los lectores no se bloquean mientras se escribe (p. ej. registrar_log)
+# - synchronous=NORMAL: seguro con WAL y mucho más rápido que FULL
+# - busy_timeout: milisegundos que se espera por un lock antes de fallar
+# - mmap_size / cache_size: lecturas desde memoria (cache_size negativo = KiB)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 268435456,
+    'cache_size': -32000,
+    'temp_store': 'MEMORY',
+}
+
+# Caché (ver gestion/cache_catalogo.py)
+# - default: memoria local de cada proceso, primer nivel para los fragmentos
+# - compartida: en disco, común a todos los workers; guarda las versiones del
+#   catálogo y un segundo nivel de los fragmentos
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bibliotech',
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+    'compartida': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
 }
 
+# Segundos que vive un fragmento del catálogo (los cambios lo invalidan antes)
+CACHE_FRAGMENTOS_TIMEOUT = 600
+
+# Con menos coincidencias locales que esto, el autocompletado consulta OpenLibrary
+AUTOCOMPLETAR_MINIMO_LOCAL = 3
+
+# Segundos que se guarda el reporte del año en curso (los años cerrados, un día)
+REPORTES_CACHE_TIMEOUT = 300
+
+# Libros que se pueden consultar a la vez en /api/v1/disponibilidad/
+DISPONIBILIDAD_MAX_IDS = 100
+
+# Stock máximo que admite una carga de inventario por libro (grilla o CSV de /stock/)
+STOCK_MAXIMO_POR_LIBRO = 500
+
 
 # Password validation - Simplificado para desarrollo
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -140,6 +225,45 @@ EMAIL_HOST_PASSWORD = 'tesjgphjtsibfzje'
 
 DEFAULT_FROM_EMAIL = 'BiblioTech <noreply@bibliotech.com>'
 
+# Recordatorios por correo (manage.py enviar_recordatorios): días de anticipación
+# con que se avisa de un préstamo por vencer
+RECORDATORIOS_DIAS_ANTES = 2
+
 # Configuración de archivos media (imágenes de libros, etc.)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Registro de consultas lentas (ver gestion/consultas_lentas.py y /consultas-lentas/)
+# Desactivado por defecto: cuando está apagado el middleware no se carga
+CONSULTAS_LENTAS_ACTIVO = False
+CONSULTAS_LENTAS_UMBRAL_MS = 100
+CONSULTAS_LENTAS_MAX = 500  # entradas que se guardan en memoria
+
+# Cola de tareas (ver gestion/tareas.py y `manage.py runworker`)
+# Con TAREAS_SINCRONAS las tareas se ejecutan al encolarlas, sin worker (solo desarrollo)
+TAREAS_SINCRONAS = False
+TAREAS_BLOQUEO = 300  # segundos que un worker retiene una tarea antes de que otro la rescate
+TAREAS_REINTENTO_BASE = 10  # espera tras el primer fallo; se duplica en cada reintento
+TAREAS_REINTENTO_MAX = 3600
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'consultas_lentas': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': BASE_DIR / 'docs_utiles' / 'consultas_lentas.log',
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 3,
+            'encoding': 'utf-8',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'gestion.consultas_lentas': {
+            'handlers': ['consultas_lentas'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
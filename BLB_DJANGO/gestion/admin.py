@@ -9,7 +9,13 @@ admin.site.unregister(Group)
 admin.site.register(Autor)  #para ver los autores en la pagina de adminstracion, es necesario importar el objeto o modulo tambien con 
 admin.site.register(Prestamo) #asi podemos ver los prestamos en la pagina de administracion, pero no podemos ver los detalles del prestamo
 admin.site.register(Libro)
+admin.site.register(Ejemplar)
+admin.site.register(MovimientoStock)
+admin.site.register(FotoStock)
+admin.site.register(Sucursal)
 admin.site.register(Multa)
 admin.site.register(Perfil)
 admin.site.register(SolicitudPrestamo)
-admin.site.register(RegistroActividad)
\ No newline at end of file
+admin.site.register(RegistroActividad)
+admin.site.register(Tarea)
+admin.site.register(RecordatorioEnviado)
\ No newline at end of file
@@ -0,0 +1,145 @@
+# API JSON de solo lectura (v1) para kioscos y la app móvil
+# Recursos: libros, autores, prestamos, solicitudes.
+#
+#   ?fields=id,titulo       solo esas columnas (el SELECT pide solo esas)
+#   ?include=autor          agrega la relación con un JOIN en la misma consulta
+#   ?limite=50&cursor=...   paginación por cursor sobre el id (WHERE id > n),
+#                           estable aunque se inserten filas y sin OFFSET
+#   filtros                 los mismos de las listas y exportaciones
+#
+# Las respuestas se arman con dicts que salen directo de values(): no se crea
+# ningún objeto del modelo por fila.
+
+from collections import namedtuple
+
+from django.db.models import Q
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .exportaciones import filtrar_libros, filtrar_prestamos
+from .models import Autor, Libro, Prestamo, SolicitudPrestamo
+
+LIMITE_POR_DEFECTO = 50
+LIMITE_MAXIMO = 500
+
+# inclusiones: nombre -> (campos de la relación); privado: solo con sesión
+Recurso = namedtuple('Recurso', 'modelo campos por_defecto inclusiones filtrar privado')
+
+
+def filtrar_autores(autores, params):
+    """?q= (nombre o apellido)"""
+    if params.get('q'):
+        autores = autores.filter(Q(nombre__icontains=params['q']) | Q(apellido__icontains=params['q']))
+    return autores
+
+
+def filtrar_solicitudes(solicitudes, params):
+    """?estado=pendiente|aprobada|rechazada, ?libro=<id>"""
+    if params.get('estado'):
+        solicitudes = solicitudes.filter(estado=params['estado'])
+    if params.get('libro', '').isdigit():
+        solicitudes = solicitudes.filter(libro_id=params['libro'])
+    return solicitudes
+
+
+RECURSOS = {
+    'libros': Recurso(
+        Libro,
+        ('id', 'titulo', 'autor_id', 'isbn', 'descripcion', 'disponible', 'stock', 'anio_publicacion',
+         'es_de_openlibrary', 'updated_at'),
+        ('id', 'titulo', 'autor_id', 'isbn', 'disponible', 'stock', 'anio_publicacion'),
+        {'autor': ('id', 'nombre', 'apellido')},
+        filtrar_libros, False),
+    'autores': Recurso(
+        Autor,
+        ('id', 'nombre', 'apellido', 'bibliografia', 'updated_at'),
+        ('id', 'nombre', 'apellido'),
+        {},
+        filtrar_autores, False),
+    'prestamos': Recurso(
+        Prestamo,
+        ('id', 'libro_id', 'usuario_id', 'fecha_prestamos', 'fecha_max', 'fecha_devolucion'),
+        ('id', 'libro_id', 'usuario_id', 'fecha_prestamos', 'fecha_max', 'fecha_devolucion'),
+        {'libro': ('id', 'titulo'), 'usuario': ('id', 'username')},
+        filtrar_prestamos, True),
+    'solicitudes': Recurso(
+        SolicitudPrestamo,
+        ('id', 'libro_id', 'usuario_id', 'dias_solicitados', 'fecha_solicitud', 'estado', 'fecha_respuesta'),
+        ('id', 'libro_id', 'usuario_id', 'dias_solicitados', 'fecha_solicitud', 'estado'),
+        {'libro': ('id', 'titulo'), 'usuario': ('id', 'username')},
+        filtrar_solicitudes, True),
+}
+
+class ErrorApi(Exception):
+    """Parámetro inválido: se responde con 400 y el mensaje"""
+
+
+def codificar_cursor(ultimo_id):
+    return urlsafe_base64_encode(force_bytes(ultimo_id))
+
+
+def decodificar_cursor(cursor):
+    try:
+        return int(force_str(urlsafe_base64_decode(cursor)))
+    except (ValueError, TypeError):
+        raise ErrorApi('cursor inválido')
+
+
+def _columnas(recurso, params):
+    """Columnas del SELECT según ?fields= e ?include=; devuelve (columnas, inclusiones)"""
+    if params.get('fields'):
+        # Sin repetidos, en el orden pedido
+        campos = list(dict.fromkeys(c.strip() for c in params['fields'].split(',') if c.strip()))
+        desconocidos = [c for c in campos if c not in recurso.campos]
+        if desconocidos:
+            raise ErrorApi(f'campos desconocidos: {", ".join(desconocidos)}')
+        # El id siempre viaja: lo necesita el cursor
+        campos = ['id'] + [c for c in campos if c != 'id']
+    else:
+        campos = list(recurso.por_defecto)
+    inclusiones = list(dict.fromkeys(i.strip() for i in params.get('include', '').split(',') if i.strip()))
+    desconocidas = [i for i in inclusiones if i not in recurso.inclusiones]
+    if desconocidas:
+        raise ErrorApi(f'relaciones desconocidas: {", ".join(desconocidas)}')
+    for relacion in inclusiones:
+        campos += [f'{relacion}__{campo}' for campo in recurso.inclusiones[relacion]]
+    return campos, inclusiones
+
+
+def _anidar(fila, inclusiones, recurso):
+    """{'autor__nombre': ...} -> {'autor': {'nombre': ...}} sobre el mismo dict"""
+    for relacion in inclusiones:
+        datos = {campo: fila.pop(f'{relacion}__{campo}') for campo in recurso.inclusiones[relacion]}
+        fila[relacion] = datos if datos['id'] is not None else None
+    return fila
+
+
+def listar(recurso, consulta, params):
+    """Una página del recurso: {'datos': [...], 'siguiente': cursor o None}"""
+    try:
+        limite = min(max(int(params.get('limite', LIMITE_POR_DEFECTO)), 1), LIMITE_MAXIMO)
+    except ValueError:
+        raise ErrorApi('limite debe ser un número')
+    columnas, inclusiones = _columnas(recurso, params)
+    consulta = recurso.filtrar(consulta, params)
+    if params.get('cursor'):
+        consulta = consulta.filter(id__gt=decodificar_cursor(params['cursor']))
+    filas = list(consulta.order_by('id').values(*columnas)[:limite + 1])
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+    return {
+        'datos': [_anidar(fila, inclusiones, recurso) for fila in filas],
+        'siguiente': codificar_cursor(filas[-1]['id']) if hay_mas else None,
+    }
+
+
+def detalle(recurso, consulta, id, params):
+    """Un objeto por id con las mismas opciones de ?fields= e ?include=; None si no existe"""
+    return buscar(recurso, consulta, params, id=id)
+
+
+def buscar(recurso, consulta, params, **filtro):
+    """Como detalle, pero por cualquier columna única (p. ej. isbn=)"""
+    columnas, inclusiones = _columnas(recurso, params)
+    fila = consulta.filter(**filtro).values(*columnas).first()
+    return _anidar(fila, inclusiones, recurso) if fila else None
@@ -4,3 +4,32 @@ from django.apps import AppConfig
 class GestionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gestion'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save
+        from .autocompletar import actualizar_indice, quitar_del_indice
+        from .cache_catalogo import invalidar_al_guardar, invalidar_modelo
+        from .db import configurar_conexion, instalar_medicion
+        from .models import Autor, Libro, Prestamo, SolicitudPrestamo
+        from .popularidad import al_prestar, al_solicitar
+
+        # Aplicar los PRAGMA de SQLite a cada conexión nueva
+        connection_created.connect(configurar_conexion, dispatch_uid='gestion_configurar_conexion')
+        # Medir el tiempo de las consultas SQL por petición
+        connection_created.connect(instalar_medicion, dispatch_uid='gestion_instalar_medicion')
+        # Invalidar la caché del catálogo cuando cambian libros o autores
+        for modelo in (Libro, Autor):
+            post_save.connect(invalidar_al_guardar, sender=modelo, dispatch_uid=f'cache_guardar_{modelo.__name__}')
+            post_delete.connect(invalidar_al_guardar, sender=modelo, dispatch_uid=f'cache_eliminar_{modelo.__name__}')
+        # La disponibilidad en lote depende de préstamos y solicitudes
+        for modelo in (Prestamo, SolicitudPrestamo):
+            post_save.connect(invalidar_modelo, sender=modelo, dispatch_uid=f'cache_guardar_{modelo.__name__}')
+            post_delete.connect(invalidar_modelo, sender=modelo, dispatch_uid=f'cache_eliminar_{modelo.__name__}')
+        # Parchear el índice de autocompletado (después de subir las versiones)
+        for modelo in (Libro, Autor):
+            post_save.connect(actualizar_indice, sender=modelo, dispatch_uid=f'autocompletar_guardar_{modelo.__name__}')
+            post_delete.connect(quitar_del_indice, sender=modelo, dispatch_uid=f'autocompletar_eliminar_{modelo.__name__}')
+        # Sumar cada préstamo o solicitud nueva a la popularidad del libro
+        post_save.connect(al_prestar, sender=Prestamo, dispatch_uid='popularidad_prestamo')
+        post_save.connect(al_solicitar, sender=SolicitudPrestamo, dispatch_uid='popularidad_solicitud')
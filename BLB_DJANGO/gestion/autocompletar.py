@@ -0,0 +1,186 @@
+# Autocompletado local de títulos y autores
+# Índice de prefijos en memoria: un arreglo ordenado de claves normalizadas
+# (sin tildes, minúsculas, sin signos) donde se busca con bisect. Cada título se
+# indexa completo y desde cada palabra, así "anillos" encuentra "El Señor de los
+# Anillos". Se carga la primera vez que se usa en cada proceso y se parchea con
+# las señales post_save/post_delete de Libro y Autor. Tiene su propia versión
+# (ver:Indice en gestion/cache_catalogo.py), que solo sube cuando cambia un
+# título, un nombre de autor o el autor de un libro: préstamos, stock o
+# descripciones suben ver:Libro pero no obligan a recargar el índice. Si otro
+# proceso cambió ver:Indice se vuelve a cargar.
+
+import threading
+from bisect import bisect_left, insort
+
+from django.db import transaction
+from django.urls import reverse
+
+from .cache_catalogo import incrementar_version, versiones
+from .models import Autor, Libro
+from .normalizacion import normalizar
+
+# Las claves se guardan recortadas; consultas más largas se verifican con el texto completo
+LARGO_CLAVE = 24
+# Entradas que se revisan como máximo por consulta (prefijos muy cortos)
+MAX_REVISAR = 500
+INDICE = 'Indice'  # modelo ficticio: su versión es la clave ver:Indice
+CLAVE_VERSION = f'ver:{INDICE}'
+
+
+def claves_de(texto):
+    """Pares (clave, posición): el texto completo y cada sufijo que empieza en una palabra"""
+    palabras = normalizar(texto).split()
+    return [(' '.join(palabras[i:])[:LARGO_CLAVE], i) for i in range(len(palabras))]
+
+
+class IndicePrefijos:
+    """Arreglo ordenado de (clave, id, posición) con búsqueda por prefijo"""
+
+    def __init__(self, textos):
+        self.textos = dict(textos)
+        self.entradas = sorted(e for id_, texto in self.textos.items() for e in self._entradas(id_, texto))
+
+    @staticmethod
+    def _entradas(id_, texto):
+        return [(clave, id_, posicion) for clave, posicion in claves_de(texto)]
+
+    def poner(self, id_, texto):
+        self.quitar(id_)
+        self.textos[id_] = texto
+        for entrada in self._entradas(id_, texto):
+            insort(self.entradas, entrada)
+
+    def quitar(self, id_):
+        texto = self.textos.pop(id_, None)
+        if texto is None:
+            return
+        for entrada in self._entradas(id_, texto):
+            i = bisect_left(self.entradas, entrada)
+            if i < len(self.entradas) and self.entradas[i] == entrada:
+                del self.entradas[i]
+
+    def buscar(self, consulta, limite=10):
+        """Ids cuyo texto (o alguna de sus palabras) empieza con la consulta; primero los del inicio"""
+        consulta = normalizar(consulta)
+        if len(consulta) < 2:
+            return []
+        prefijo = consulta[:LARGO_CLAVE]
+        verificar = len(consulta) > LARGO_CLAVE
+        entradas = self.entradas
+        inicio = bisect_left(entradas, (prefijo,))
+        fin = min(len(entradas), inicio + MAX_REVISAR)
+        al_inicio, en_medio, vistos = [], [], set()
+        for i in range(inicio, fin):
+            clave, id_, posicion = entradas[i]
+            if not clave.startswith(prefijo):
+                break
+            if id_ in vistos:
+                continue
+            if verificar and consulta not in normalizar(self.textos[id_]):
+                continue
+            vistos.add(id_)
+            (al_inicio if posicion == 0 else en_medio).append(id_)
+            if len(al_inicio) >= limite:
+                break
+        return (al_inicio + en_medio)[:limite]
+
+
+_estado = {'libros': None, 'autores': None, 'autor_de': {}, 'version': None}
+_lock = threading.Lock()
+
+
+def _cargar(actual):
+    libros = {}
+    autor_de = {}
+    for id_, titulo, autor_id in Libro.objects.values_list('id', 'titulo', 'autor_id').iterator(chunk_size=2000):
+        libros[id_] = titulo
+        autor_de[id_] = autor_id
+    autores = {id_: f'{nombre} {apellido}'
+               for id_, nombre, apellido in Autor.objects.values_list('id', 'nombre', 'apellido').iterator(chunk_size=2000)}
+    _estado.update(libros=IndicePrefijos(libros), autores=IndicePrefijos(autores), autor_de=autor_de,
+                   version=actual)
+
+
+def _indices():
+    """Carga el índice la primera vez o cuando otro proceso modificó el catálogo"""
+    # La versión se lee antes de consultar la base: un cambio posterior fuerza otra carga
+    [actual] = versiones(CLAVE_VERSION)
+    if _estado['version'] != actual:
+        with _lock:
+            if _estado['version'] != actual:
+                _cargar(actual)
+    return _estado
+
+
+def autocompletar(tipo, consulta, limite=10):
+    """Sugerencias locales para 'libros' o 'autores'"""
+    estado = _indices()
+    autores = estado['autores']
+    if tipo == 'autores':
+        return [{'id': id_, 'nombre': autores.textos[id_], 'url': reverse('detalle_autor', args=[id_])}
+                for id_ in autores.buscar(consulta, limite)]
+    libros = estado['libros']
+    return [{'id': id_,
+             'titulo': libros.textos[id_],
+             'autor': autores.textos.get(estado['autor_de'].get(id_), ''),
+             'url': reverse('detalle_libro', args=[id_])}
+            for id_ in libros.buscar(consulta, limite)]
+
+
+def _parchear(cambio, sin_cambios=lambda: False):
+    """
+    Aplica un cambio al índice ya cargado y sube ver:Indice para que los demás
+    procesos recarguen. Se hace al confirmar la transacción: antes, otro proceso
+    podría recargar todavía con los datos viejos bajo la versión nueva. Si la
+    versión subió solo por este cambio el índice local queda al día sin recargar.
+    """
+    def al_confirmar():
+        with _lock:
+            if _estado['version'] is None:
+                incrementar_version(INDICE)
+                return
+            if sin_cambios():
+                return  # p. ej. se guardó el libro sin tocar el título ni el autor
+            cambio()
+            esperada = _estado['version'] + 1
+            incrementar_version(INDICE)
+            if versiones(CLAVE_VERSION) == [esperada]:
+                _estado['version'] = esperada
+    transaction.on_commit(al_confirmar)
+
+
+def invalidar_indice():
+    """Para cambios hechos con update() o en bloque: todos los procesos recargan"""
+    transaction.on_commit(lambda: incrementar_version(INDICE))
+
+
+def actualizar_indice(sender, instance, **kwargs):
+    """Receptor de post_save para Libro y Autor"""
+    if sender is Libro:
+        def sin_cambios():
+            return (_estado['libros'].textos.get(instance.pk) == instance.titulo
+                    and _estado['autor_de'].get(instance.pk) == instance.autor_id)
+
+        def cambio():
+            _estado['autor_de'][instance.pk] = instance.autor_id
+            _estado['libros'].poner(instance.pk, instance.titulo)
+    else:
+        nombre = f'{instance.nombre} {instance.apellido}'
+
+        def sin_cambios():
+            return _estado['autores'].textos.get(instance.pk) == nombre
+
+        def cambio():
+            _estado['autores'].poner(instance.pk, nombre)
+    _parchear(cambio, sin_cambios)
+
+
+def quitar_del_indice(sender, instance, **kwargs):
+    """Receptor de post_delete para Libro y Autor"""
+    def cambio():
+        if sender is Libro:
+            _estado['autor_de'].pop(instance.pk, None)
+            _estado['libros'].quitar(instance.pk)
+        else:
+            _estado['autores'].quitar(instance.pk)
+    _parchear(cambio)
@@ -0,0 +1,148 @@
+# Caché del catálogo con invalidación por versiones
+# Cada modelo del catálogo (Libro, Autor) tiene un número de versión, y cada
+# objeto el suyo. Las señales post_save/post_delete (conectadas en
+# GestionConfig.ready) incrementan esas versiones, y como las claves de los
+# fragmentos incluyen las versiones de las que dependen, un cambio hace que las
+# claves viejas dejen de usarse sin tener que borrarlas (caducan solas).
+#
+# Dos niveles:
+#   'default'     memoria local del proceso (rápido, se pierde al reiniciar)
+#   'compartida'  archivos en disco, visible para todos los workers; aquí viven
+#                 las versiones para que un cambio en un proceso invalide a todos
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Model
+from django.utils.safestring import mark_safe
+
+from .metricas import incrementar
+
+MODELOS_CATALOGO = ('Libro', 'Autor', 'Recomendacion')
+
+# Marcador que ocupa el lugar del token CSRF dentro de los fragmentos guardados;
+# se reemplaza por el token real de cada petición al servirlos
+MARCA_CSRF = 'csrf-fragmento-7f3a'
+
+
+def _local():
+    return caches['default']
+
+
+def _compartida():
+    return caches['compartida']
+
+
+def _timeout():
+    return getattr(settings, 'CACHE_FRAGMENTOS_TIMEOUT', 600)
+
+
+def _clave_version(modelo, pk=None):
+    return f'ver:{modelo}' if pk is None else f'ver:{modelo}:{pk}'
+
+
+def _version_inicial():
+    # Milisegundos actuales: si la clave de versión se pierde (reinicio, limpieza
+    # del directorio) la nueva nunca coincide con una versión anterior
+    return int(time.time() * 1000)
+
+
+def versiones(*claves):
+    """Versión actual de cada clave (ver:Libro, ver:Autor:3...), creándolas si no existen"""
+    cache = _compartida()
+    encontradas = cache.get_many(claves)
+    for clave in claves:
+        if clave not in encontradas:
+            cache.add(clave, _version_inicial(), None)
+            encontradas[clave] = cache.get(clave)
+    return [encontradas[clave] for clave in claves]
+
+
+def incrementar_version(modelo, pk=None):
+    """Invalida todo lo que dependa del modelo (y del objeto pk si se indica)"""
+    cache = _compartida()
+    claves = [_clave_version(modelo)]
+    if pk is not None:
+        claves.append(_clave_version(modelo, pk))
+    for clave in claves:
+        try:
+            cache.incr(clave)
+        except ValueError:
+            cache.set(clave, _version_inicial(), None)
+
+
+def invalidar_objetos(modelo, pks):
+    """
+    Invalida el modelo y muchos objetos de una vez (reparaciones en bloque).
+    Borrar la versión basta: al recrearse vale la hora actual, nunca una anterior.
+    """
+    _compartida().delete_many([_clave_version(modelo, pk) for pk in pks])
+    incrementar_version(modelo)
+
+
+def clave_dependencia(dependencia):
+    """
+    Una dependencia puede ser el nombre de un modelo del catálogo ('Libro') o
+    una instancia (depende de la versión de ese objeto). Devuelve None si no es
+    ninguna de las dos (entonces es una variante, ver clave_fragmento).
+    """
+    if isinstance(dependencia, Model):
+        return _clave_version(type(dependencia).__name__, dependencia.pk)
+    if dependencia in MODELOS_CATALOGO:
+        return _clave_version(dependencia)
+    return None
+
+
+def clave_fragmento(nombre, dependencias, variantes=()):
+    """Clave del fragmento: nombre + versiones de sus dependencias + variantes (rol, permisos...)"""
+    claves = []
+    extras = [str(v) for v in variantes]
+    for dependencia in dependencias:
+        clave = clave_dependencia(dependencia)
+        if clave is None:
+            extras.append(str(dependencia))
+        else:
+            claves.append(clave)
+    partes = [f'{c}={v}' for c, v in zip(claves, versiones(*claves))] + extras
+    resumen = hashlib.md5('|'.join(partes).encode()).hexdigest()
+    return f'frag:{nombre}:{resumen}'
+
+
+def obtener_fragmento(clave):
+    """Busca en memoria local y luego en la caché compartida"""
+    html = _local().get(clave)
+    if html is not None:
+        incrementar('blb_cache_aciertos_local_total')
+        return html
+    html = _compartida().get(clave)
+    if html is not None:
+        incrementar('blb_cache_aciertos_compartida_total')
+        _local().set(clave, html, _timeout())
+        return html
+    incrementar('blb_cache_fallos_total')
+    return None
+
+
+def guardar_fragmento(clave, html):
+    _local().set(clave, html, _timeout())
+    _compartida().set(clave, html, _timeout())
+
+
+def con_token(html, token):
+    """Devuelve el fragmento con el token CSRF de la petición actual"""
+    if MARCA_CSRF in html:
+        html = html.replace(MARCA_CSRF, str(token))
+    return mark_safe(html)
+
+
+def invalidar_al_guardar(sender, instance, **kwargs):
+    """Receptor de post_save/post_delete para Libro y Autor"""
+    incrementar_version(sender.__name__, instance.pk)
+
+
+def invalidar_modelo(sender, **kwargs):
+    """Receptor para tablas que solo se versionan completas (Prestamo, SolicitudPrestamo)"""
+    incrementar_version(sender.__name__)
+
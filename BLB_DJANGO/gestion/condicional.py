@@ -0,0 +1,126 @@
+# GET condicional (ETag / Last-Modified) para el catálogo
+# Cada vista declara una función "estado" que, con una o dos consultas sobre los
+# campos updated_at (indexados), devuelve lo que determina su HTML. El decorador
+# @condicional arma con eso el ETag (junto con el usuario, su rol y la versión de
+# las plantillas) y responde 304 Not Modified sin ejecutar la vista cuando el
+# navegador ya tiene esa versión de la página.
+
+import hashlib
+from functools import wraps
+from pathlib import Path
+
+from django.contrib.messages import get_messages
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .cache_catalogo import versiones
+from .disponibilidad import CLAVES_VERSION, parsear_ids
+from .models import Autor, Libro
+
+_plantillas = {}
+
+
+def version_plantillas():
+    """Fecha de la plantilla modificada más recientemente: un despliegue cambia los ETag"""
+    if 'version' not in _plantillas:
+        carpeta = Path(__file__).resolve().parent / 'templates'
+        _plantillas['version'] = max((int(p.stat().st_mtime) for p in carpeta.rglob('*.html')), default=0)
+    return _plantillas['version']
+
+
+def variante_usuario(request):
+    """Lo que hace variar la página entre usuarios (barra de navegación, permisos)"""
+    user = request.user
+    if not user.is_authenticated:
+        return 'anonimo'
+    perfil = getattr(user, 'perfil', None)
+    return f'{user.pk}:{getattr(perfil, "rol", "")}:{user.is_staff}'
+
+
+def calcular_etag(partes):
+    return quote_etag(hashlib.md5('|'.join(map(str, partes)).encode()).hexdigest())
+
+
+def condicional(estado, por_usuario=True):
+    """
+    Decorador para vistas GET. estado(request, *args, **kwargs) devuelve
+    (partes, ultima_modificacion), o None para atender la petición normalmente
+    (por ejemplo si el objeto no existe y la vista debe responder 404).
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def _wrapped_view(request, *args, **kwargs):
+            # len() no marca los mensajes como leídos: se mostrarán en el render
+            if request.method not in ('GET', 'HEAD') or len(get_messages(request)):
+                return vista(request, *args, **kwargs)
+            datos = estado(request, *args, **kwargs)
+            if datos is None:
+                return vista(request, *args, **kwargs)
+
+            partes, modificado = datos
+            partes = [vista.__name__, version_plantillas(), *partes]
+            if por_usuario:
+                partes.append(variante_usuario(request))
+            etag = calcular_etag(partes)
+            # If-Modified-Since no distingue usuarios: solo para páginas iguales para todos
+            ultima = None
+            if modificado and not (por_usuario and request.user.is_authenticated):
+                ultima = int(modificado.timestamp())
+
+            response = get_conditional_response(request, etag=etag, last_modified=ultima)
+            if response is None:
+                response = vista(request, *args, **kwargs)
+                if response.status_code == 200:
+                    response.headers.setdefault('ETag', etag)
+                    if ultima:
+                        response.headers.setdefault('Last-Modified', http_date(ultima))
+            # El navegador guarda la página pero siempre la revalida
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return _wrapped_view
+    return decorador
+
+
+def _mas_reciente(*fechas):
+    return max((f for f in fechas if f), default=None)
+
+
+def estado_lista_libros(request):
+    libros = Libro.objects.aggregate(total=Count('id'), ultima=Max('updated_at'))
+    autores = Autor.objects.aggregate(ultima=Max('updated_at'))
+    # El total detecta eliminaciones, que no cambian el máximo de updated_at
+    return ((libros['total'], libros['ultima'], autores['ultima']),
+            _mas_reciente(libros['ultima'], autores['ultima']))
+
+
+def estado_detalle_libro(request, id):
+    fila = Libro.objects.filter(id=id).values_list('updated_at', 'autor__updated_at').first()
+    if fila is None:
+        return None
+    # Las recomendaciones se recalculan por lotes, fuera de updated_at
+    return (*fila, versiones('ver:Recomendacion')[0]), _mas_reciente(*fila)
+
+
+def estado_detalle_autor(request, id):
+    autor = Autor.objects.filter(id=id).values_list('updated_at', flat=True).first()
+    if autor is None:
+        return None
+    libros = Libro.objects.filter(autor_id=id).aggregate(total=Count('id'), ultima=Max('updated_at'))
+    return ((autor, libros['total'], libros['ultima']),
+            _mas_reciente(autor, libros['ultima']))
+
+
+def estado_busqueda(request):
+    """Búsquedas en OpenLibrary: la misma consulta se considera igual durante el día"""
+    return (request.GET.get('q', ''), timezone.localdate()), None
+
+
+def estado_disponibilidad(request):
+    """Sin consultas: los códigos pedidos (normalizados) y las versiones de las tablas involucradas"""
+    ids = parsear_ids(request.GET.get('ids'), isbn=True)
+    if ids is None:
+        return None
+    return (*ids, *versiones(*CLAVES_VERSION)), None
+
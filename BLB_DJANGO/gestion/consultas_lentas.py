@@ -0,0 +1,146 @@
+# Registro de consultas lentas
+# Opcional (settings.CONSULTAS_LENTAS_ACTIVO). ConsultasLentasMiddleware envuelve
+# las conexiones con connection.execute_wrapper durante cada petición; cuando una
+# consulta supera CONSULTAS_LENTAS_UMBRAL_MS guarda el SQL, los parámetros, la
+# vista, la línea del proyecto que la originó y su EXPLAIN QUERY PLAN.
+# Las entradas van a un buffer circular en memoria (página /consultas-lentas/) y
+# al logger 'gestion.consultas_lentas' (archivo rotativo configurado en LOGGING).
+
+import hashlib
+import logging
+import re
+import traceback
+from collections import deque
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger('gestion.consultas_lentas')
+
+_entradas = deque(maxlen=getattr(settings, 'CONSULTAS_LENTAS_MAX', 500))
+
+_RE_LISTA = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_RE_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_RE_ESPACIOS = re.compile(r'\s+')
+
+
+def huella(sql):
+    """
+    Normaliza el SQL para agrupar consultas iguales con distintos valores:
+    literales y parámetros -> ?, listas IN (?, ?, ?) -> IN (...)
+    """
+    normalizado = sql.replace('%s', '?')
+    normalizado = _RE_LITERAL.sub('?', normalizado)
+    normalizado = _RE_LISTA.sub('(...)', normalizado)
+    normalizado = _RE_ESPACIOS.sub(' ', normalizado).strip()
+    return hashlib.md5(normalizado.encode()).hexdigest()[:12], normalizado
+
+
+def _origen():
+    """Última línea del proyecto (no de Django ni librerías) en la pila"""
+    base = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith(base) and 'site-packages' not in frame.filename \
+                and not frame.filename.endswith('consultas_lentas.py'):
+            return f'{frame.filename[len(base) + 1:]}:{frame.lineno} en {frame.name}()'
+    return '-'
+
+
+def _plan(conexion, sql, params):
+    """
+    EXPLAIN QUERY PLAN de la consulta. Va directo al cursor del backend, sin los
+    execute_wrappers: no se registra a sí misma ni cuenta en las métricas de la petición.
+    """
+    try:
+        with conexion.cursor() as envoltura:
+            cursor = envoltura.cursor
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [fila[-1] for fila in cursor.fetchall()]
+    except Exception as e:
+        return [f'(sin plan: {e})']
+
+
+class Grabador:
+    """execute_wrapper que registra las consultas de una petición que superan el umbral"""
+
+    def __init__(self, request, umbral):
+        self.request = request
+        self.umbral = umbral
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = (perf_counter() - inicio) * 1000
+            if duracion >= self.umbral:
+                self.registrar(sql, params, many, context, duracion)
+
+    def registrar(self, sql, params, many, context, duracion):
+        match = self.request.resolver_match
+        clave, normalizado = huella(sql)
+        conexion = context['connection']
+        entrada = {
+            'fecha': timezone.now(),
+            'duracion_ms': round(duracion, 2),
+            'huella': clave,
+            'sql_normalizado': normalizado,
+            'sql': sql,
+            'params': repr(params)[:500],
+            'vista': match.view_name if match else self.request.path,
+            'origen': _origen(),
+            'alias': conexion.alias,
+            'plan': [] if many else _plan(conexion, sql, params),
+        }
+        _entradas.append(entrada)
+        logger.warning('%.1f ms | %s | %s | %s | %s | plan: %s', duracion, entrada['vista'], entrada['origen'],
+                       sql, entrada['params'], ' / '.join(entrada['plan']))
+
+
+class ConsultasLentasMiddleware:
+    """Activa el Grabador en todas las conexiones durante la petición"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'CONSULTAS_LENTAS_ACTIVO', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.umbral = settings.CONSULTAS_LENTAS_UMBRAL_MS
+
+    def __call__(self, request):
+        grabador = Grabador(request, self.umbral)
+        with ExitStack() as pila:
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(grabador))
+            return self.get_response(request)
+
+
+def peores_consultas(limite=50):
+    """Agrupa el buffer por huella y ordena por tiempo total acumulado"""
+    grupos = {}
+    for entrada in list(_entradas):
+        grupo = grupos.get(entrada['huella'])
+        if grupo is None:
+            grupo = grupos[entrada['huella']] = {
+                'huella': entrada['huella'],
+                'sql': entrada['sql_normalizado'],
+                'veces': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'vistas': set(),
+            }
+        grupo['veces'] += 1
+        grupo['total_ms'] += entrada['duracion_ms']
+        grupo['vistas'].add(entrada['vista'])
+        if entrada['duracion_ms'] >= grupo['max_ms']:
+            # Guardar el ejemplo más lento con su origen y plan
+            grupo['max_ms'] = entrada['duracion_ms']
+            grupo['ejemplo'] = entrada
+    resultado = sorted(grupos.values(), key=lambda g: g['total_ms'], reverse=True)[:limite]
+    for grupo in resultado:
+        grupo['promedio_ms'] = grupo['total_ms'] / grupo['veces']
+        grupo['vistas'] = sorted(grupo['vistas'])
+    return resultado
@@ -14,6 +14,9 @@ def permisos_usuario(request):
         'puede_gestionar_solicitudes': False,
         'puede_ver_usuarios': False,
         'puede_ver_logs': False,
+        'puede_exportar': False,
+        'puede_ver_reportes': False,
+        'puede_ver_sistema': False,  # métricas, consultas lentas, cola de tareas
         'rol_usuario': 'visitante',
         'rol_display': 'Visitante',
     }
@@ -45,6 +48,8 @@ def permisos_usuario(request):
                 permisos['puede_ver_multas'] = True
                 permisos['puede_ver_solicitudes'] = True
                 permisos['puede_gestionar_solicitudes'] = True
+                permisos['puede_exportar'] = True
+                permisos['puede_ver_reportes'] = True
             
             # === ADMIN ===
             elif rol == 'admin':
@@ -55,6 +60,9 @@ def permisos_usuario(request):
                 permisos['puede_gestionar_solicitudes'] = True
                 permisos['puede_ver_usuarios'] = True
                 permisos['puede_ver_logs'] = True
+                permisos['puede_exportar'] = True
+                permisos['puede_ver_reportes'] = True
+                permisos['puede_ver_sistema'] = True
             
             # === SUPERUSUARIO ===
             elif rol == 'superusuario':
@@ -67,6 +75,9 @@ def permisos_usuario(request):
                 permisos['puede_gestionar_solicitudes'] = True
                 permisos['puede_ver_usuarios'] = True
                 permisos['puede_ver_logs'] = True
+                permisos['puede_exportar'] = True
+                permisos['puede_ver_reportes'] = True
+                permisos['puede_ver_sistema'] = True
                 
         except:
             # Si no tiene perfil o error, solo permisos básicos o ninguno
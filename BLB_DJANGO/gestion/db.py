@@ -0,0 +1,39 @@
+# Ajustes de conexión para SQLite
+# Se conecta a la señal connection_created desde GestionConfig.ready(), así cada
+# conexión nueva (una por hilo/proceso, reutilizada gracias a CONN_MAX_AGE)
+# aplica los PRAGMA definidos en settings.SQLITE_PRAGMAS.
+
+from django.conf import settings
+
+from .metricas import medir_consulta
+
+
+def sentencias_pragma(pragmas):
+    """
+    Convierte un diccionario {'journal_mode': 'WAL', ...} en la lista de
+    sentencias PRAGMA a ejecutar, en el mismo orden del diccionario.
+    """
+    return [f"PRAGMA {nombre}={valor}" for nombre, valor in pragmas.items()]
+
+
+def configurar_conexion(sender, connection, **kwargs):
+    """
+    Hook de inicio de conexión: aplica los PRAGMA de SQLite.
+    Cada alias puede sobreescribir los valores globales con
+    DATABASES[alias]['PRAGMAS'] (por ejemplo la réplica de solo lectura).
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = dict(getattr(settings, 'SQLITE_PRAGMAS', {}))
+    pragmas.update(connection.settings_dict.get('PRAGMAS', {}))
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for sentencia in sentencias_pragma(pragmas):
+            cursor.execute(sentencia)
+
+
+def instalar_medicion(sender, connection, **kwargs):
+    """Mide el tiempo de cada consulta para MetricasMiddleware (gestion/metricas.py)"""
+    if medir_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(medir_consulta)
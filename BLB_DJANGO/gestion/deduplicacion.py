@@ -0,0 +1,128 @@
+# Detección y fusión de autores duplicados
+# - Duplicados exactos: misma Autor.clave_normalizada (columna indexada, un GROUP BY).
+# - Casi duplicados ("Gabriel Garcia Marques" / "Gabriel García Márquez"):
+#   similitud de trigramas entre las claves. SQLite no tiene un índice de
+#   trigramas como pg_trgm, así que se arma un índice invertido en memoria
+#   (trigrama -> autores) y solo se comparan los autores que comparten trigramas.
+# Lo usa el comando deduplicar_autores.
+
+from collections import Counter, defaultdict
+from math import ceil
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .autocompletar import invalidar_indice
+from .cache_catalogo import incrementar_version
+from .models import Autor, Libro
+from .normalizacion import similitud, trigramas
+
+# Trigramas presentes en más autores que esto no sirven para distinguir
+# (p. ej. '  j' de todos los Juan, José...) y se ignoran al buscar candidatos
+MAX_POR_TRIGRAMA = 1000
+
+
+def duplicados_exactos():
+    """Listas de ids de autores con la misma clave normalizada"""
+    claves = (Autor.objects.exclude(clave_normalizada='').values('clave_normalizada')
+              .annotate(total=Count('id')).filter(total__gt=1).values_list('clave_normalizada', flat=True))
+    grupos = defaultdict(list)
+    for id_, clave in (Autor.objects.filter(clave_normalizada__in=claves)
+                       .order_by('id').values_list('id', 'clave_normalizada').iterator(chunk_size=2000)):
+        grupos[clave].append(id_)
+    return list(grupos.values())
+
+
+class IndiceTrigramas:
+    """Índice invertido trigrama -> ids, sobre una clave por autor"""
+
+    def __init__(self, claves):
+        # Con varias filas con la misma clave basta comparar una (las demás son duplicados exactos)
+        self.trigramas = {}
+        self.postings = defaultdict(list)
+        vistas = set()
+        for id_, clave in claves:
+            if clave in vistas:
+                continue
+            vistas.add(clave)
+            conjunto = trigramas(clave)
+            self.trigramas[id_] = conjunto
+            for trigrama in conjunto:
+                self.postings[trigrama].append(id_)
+
+    def similares(self, id_, umbral):
+        """Pares (otro_id, similitud) con similitud >= umbral"""
+        propios = self.trigramas[id_]
+        # Jaccard >= umbral implica compartir al menos umbral * |propios| trigramas
+        minimo = ceil(umbral * len(propios))
+        comunes = Counter()
+        for trigrama in propios:
+            lista = self.postings[trigrama]
+            if len(lista) <= MAX_POR_TRIGRAMA:
+                comunes.update(lista)
+        resultado = []
+        for otro, compartidos in comunes.items():
+            if otro != id_ and compartidos >= minimo:
+                valor = similitud(propios, self.trigramas[otro])
+                if valor >= umbral:
+                    resultado.append((otro, valor))
+        return resultado
+
+
+def duplicados_similares(umbral=0.75):
+    """Grupos de ids (componentes conexas) de autores con claves parecidas"""
+    claves = Autor.objects.exclude(clave_normalizada='').order_by('id').values_list('id', 'clave_normalizada')
+    indice = IndiceTrigramas(claves.iterator(chunk_size=2000))
+    padre = {}
+
+    def raiz(x):
+        while padre.get(x, x) != x:
+            x = padre[x]
+        return x
+
+    for id_ in indice.trigramas:
+        for otro, _ in indice.similares(id_, umbral):
+            a, b = raiz(id_), raiz(otro)
+            if a != b:
+                padre[max(a, b)] = min(a, b)
+    grupos = defaultdict(list)
+    for id_ in padre:
+        grupos[raiz(id_)].append(id_)
+    return [sorted({raiz_, *ids}) for raiz_, ids in grupos.items()]
+
+
+def elegir_principal(ids):
+    """El autor que se conserva: el que tiene más libros (y el más antiguo si empatan)"""
+    libros = dict(Libro.objects.filter(autor_id__in=ids).values('autor_id')
+                  .annotate(total=Count('id')).values_list('autor_id', 'total'))
+    return min(ids, key=lambda id_: (-libros.get(id_, 0), id_))
+
+
+def fusionar(grupos, lote=200):
+    """
+    Fusiona cada grupo en su autor principal: mueve los libros, conserva la
+    biografía si el principal no tiene y elimina los demás. Una transacción
+    por lote de grupos. Devuelve (autores eliminados, libros movidos).
+    """
+    eliminados = movidos = 0
+    for inicio in range(0, len(grupos), lote):
+        with transaction.atomic():
+            for ids in grupos[inicio:inicio + lote]:
+                principal = elegir_principal(ids)
+                otros = [id_ for id_ in ids if id_ != principal]
+                movidos += Libro.objects.filter(autor_id__in=otros).update(autor_id=principal,
+                                                                           updated_at=timezone.now())
+                autor = Autor.objects.get(id=principal)
+                if not autor.bibliografia:
+                    bibliografia = (Autor.objects.filter(id__in=otros).exclude(bibliografia__isnull=True)
+                                    .exclude(bibliografia='').values_list('bibliografia', flat=True).first())
+                    if bibliografia:
+                        autor.bibliografia = bibliografia
+                        autor.save(update_fields=['bibliografia', 'updated_at'])
+                eliminados += Autor.objects.filter(id__in=otros).delete()[0]
+    # Libro.update() no envía señales: invalidar la caché del catálogo
+    incrementar_version('Libro')
+    incrementar_version('Autor')
+    invalidar_indice()  # los libros movidos cambian de autor en el autocompletado
+    return eliminados, movidos
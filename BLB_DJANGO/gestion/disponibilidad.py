@@ -0,0 +1,93 @@
+# Disponibilidad de varios libros en una sola petición (kioscos)
+# Para cada libro: stock, disponible, solicitudes pendientes (cola de reserva)
+# y la próxima fecha de devolución de sus préstamos activos. Todo sale de una
+# sola consulta con subconsultas correlacionadas, sin importar cuántos ids se pidan.
+# Los libros también se pueden pedir por ISBN (10 o 13, con o sin guiones): se
+# normalizan a ISBN-13 y se resuelven en la misma consulta.
+#
+# El resultado se guarda en la caché compartida con una clave que incluye los
+# códigos normalizados y las versiones de Libro, Prestamo y SolicitudPrestamo (gestion/cache_catalogo.py);
+# las mismas versiones forman el ETag, así que un 304 no consulta la base.
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, IntegerField, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .cache_catalogo import versiones
+from .models import Libro, Prestamo, SolicitudPrestamo
+from .normalizacion import normalizar_isbn
+
+CLAVES_VERSION = ('ver:Libro', 'ver:Prestamo', 'ver:SolicitudPrestamo')
+# Mayor id que cabe en la columna (entero de 64 bits con signo)
+MAX_ID = 2 ** 63 - 1
+
+
+def _codigo(parte, isbn):
+    """Id (int) o ISBN-13 normalizado (str) de una parte de ?ids=; None si no es ninguno"""
+    parte = parte.strip()
+    # Con 10 o 13 dígitos y control válido se toma como ISBN, no como id
+    if isbn and (not parte.isdigit() or len(parte) >= 10):
+        codigo = normalizar_isbn(parte)
+        if codigo:
+            return codigo
+    if parte.isdigit() and int(parte) <= MAX_ID:
+        return int(parte)
+    return None
+
+
+def parsear_ids(texto, isbn=False):
+    """
+    '3,1,3,x' -> [1, 3]; None si hay más códigos que DISPONIBILIDAD_MAX_IDS o
+    ninguno válido. Con isbn también acepta ISBN, que vienen después de los
+    ids como ISBN-13: '2,84-376-0494-X' -> [2, '9788437604947'].
+    """
+    codigos = {_codigo(parte, isbn) for parte in (texto or '').split(',')} - {None}
+    if not codigos or len(codigos) > getattr(settings, 'DISPONIBILIDAD_MAX_IDS', 100):
+        return None
+    return sorted(codigos, key=lambda c: (isinstance(c, str), c))
+
+
+def _por_libro(consulta, agregado):
+    """Subconsulta correlacionada con un agregado por libro"""
+    return Subquery(consulta.filter(libro_id=OuterRef('id')).order_by().values('libro_id')
+                    .annotate(valor=agregado).values('valor')[:1])
+
+
+def consultar(codigos):
+    """{código: {...}} de los libros que existen (por id o por ISBN), en una sola consulta"""
+    ids = [c for c in codigos if isinstance(c, int)]
+    isbns = [c for c in codigos if isinstance(c, str)]
+    pendientes = SolicitudPrestamo.objects.filter(estado='pendiente')
+    activos = Prestamo.objects.filter(fecha_devolucion__isnull=True)
+    filas = (Libro.objects.filter(Q(id__in=ids) | Q(isbn__in=isbns))
+             .annotate(cola=Coalesce(_por_libro(pendientes, Count('id')), 0, output_field=IntegerField()),
+                       prestados=Coalesce(_por_libro(activos, Count('id')), 0, output_field=IntegerField()),
+                       proxima_devolucion=_por_libro(activos, Min('fecha_max')))
+             .values('id', 'isbn', 'titulo', 'stock', 'disponible', 'cola', 'prestados', 'proxima_devolucion'))
+    resultado = {}
+    for fila in filas:
+        # Un libro pedido por id y por ISBN aparece con los dos códigos
+        if fila['id'] in ids:
+            resultado[fila['id']] = fila
+        if fila['isbn'] in isbns:
+            resultado[fila['isbn']] = fila
+    return resultado
+
+
+def disponibilidad(codigos):
+    """Respuesta para los códigos de parsear_ids(), desde la caché si no cambió nada"""
+    partes = [*codigos, *versiones(*CLAVES_VERSION)]
+    clave = 'disp:' + hashlib.md5('|'.join(map(str, partes)).encode()).hexdigest()
+    cache = caches['compartida']
+    datos = cache.get(clave)
+    if datos is None:
+        libros = consultar(codigos)
+        datos = {
+            'libros': {str(codigo): libro for codigo, libro in libros.items()},
+            'no_encontrados': [codigo for codigo in codigos if codigo not in libros],
+        }
+        cache.set(clave, datos, getattr(settings, 'CACHE_FRAGMENTOS_TIMEOUT', 600))
+    return datos
@@ -0,0 +1,150 @@
+# Exportaciones en streaming (CSV y JSONL) del catálogo, préstamos y multas
+# Las filas se leen con values_list (con los JOIN de las relaciones en la misma
+# consulta) y .iterator(): la base entrega bloques de TAMANO_BLOQUE filas y cada
+# una se escribe en la respuesta apenas se lee, así que la memoria no crece con
+# el tamaño de la tabla y el primer byte sale sin esperar al resto.
+# Los filtros (filtrar_*) son los mismos que aceptan las vistas de lista.
+
+import csv
+import json
+from datetime import date
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import Libro, Multa, Prestamo
+from .normalizacion import normalizar_isbn
+
+TAMANO_BLOQUE = 2000
+FORMATOS = {'csv': 'text/csv; charset=utf-8', 'jsonl': 'application/x-ndjson; charset=utf-8'}
+
+
+def _fecha(valor):
+    try:
+        return date.fromisoformat(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _si_no(valor):
+    """'1'/'si' -> True, '0'/'no' -> False, cualquier otra cosa -> None (sin filtro)"""
+    return {'1': True, 'si': True, 'true': True, '0': False, 'no': False, 'false': False}.get((valor or '').lower())
+
+
+def filtrar_libros(libros, params):
+    """?q= (título), ?isbn=, ?autor=<id>, ?disponible=1|0"""
+    if params.get('isbn'):
+        # Un ISBN inválido no coincide con ningún libro
+        libros = libros.filter(isbn=normalizar_isbn(params['isbn']) or '')
+    if params.get('q'):
+        libros = libros.filter(titulo__icontains=params['q'])
+    if params.get('autor', '').isdigit():
+        libros = libros.filter(autor_id=params['autor'])
+    if _si_no(params.get('disponible')) is not None:
+        libros = libros.filter(disponible=_si_no(params['disponible']))
+    return libros
+
+
+def filtrar_prestamos(prestamos, params):
+    """?estado=activos|devueltos|vencidos, ?usuario=<id>, ?sucursal=<id>, ?desde= / ?hasta= (fecha del préstamo)"""
+    estado = params.get('estado')
+    if estado == 'activos':
+        prestamos = prestamos.filter(fecha_devolucion__isnull=True)
+    elif estado == 'devueltos':
+        prestamos = prestamos.filter(fecha_devolucion__isnull=False)
+    elif estado == 'vencidos':
+        prestamos = prestamos.filter(fecha_devolucion__isnull=True, fecha_max__lt=timezone.localdate())
+    if params.get('usuario', '').isdigit():
+        prestamos = prestamos.filter(usuario_id=params['usuario'])
+    if params.get('sucursal', '').isdigit():
+        prestamos = prestamos.filter(sucursal_id=params['sucursal'])
+    if _fecha(params.get('desde')):
+        prestamos = prestamos.filter(fecha_prestamos__gte=_fecha(params['desde']))
+    if _fecha(params.get('hasta')):
+        prestamos = prestamos.filter(fecha_prestamos__lte=_fecha(params['hasta']))
+    return prestamos
+
+
+def filtrar_multas(multas, params):
+    """?tipo=r|p|d, ?pagada=1|0, ?sucursal=<id>, ?desde= / ?hasta= (fecha de la multa)"""
+    if params.get('tipo'):
+        multas = multas.filter(tipo=params['tipo'])
+    if params.get('sucursal', '').isdigit():
+        multas = multas.filter(prestamo__sucursal_id=params['sucursal'])
+    if _si_no(params.get('pagada')) is not None:
+        multas = multas.filter(pagada=_si_no(params['pagada']))
+    if _fecha(params.get('desde')):
+        multas = multas.filter(fecha__gte=_fecha(params['desde']))
+    if _fecha(params.get('hasta')):
+        multas = multas.filter(fecha__lte=_fecha(params['hasta']))
+    return multas
+
+
+def filas_libros(libros):
+    columnas = ('id', 'titulo', 'autor__nombre', 'autor__apellido', 'isbn', 'anio_publicacion', 'stock',
+                'disponible', 'es_de_openlibrary', 'updated_at')
+    yield ('id', 'titulo', 'autor_nombre', 'autor_apellido', 'isbn', 'anio_publicacion', 'stock', 'disponible',
+           'openlibrary', 'actualizado')
+    yield from libros.order_by('id').values_list(*columnas).iterator(chunk_size=TAMANO_BLOQUE)
+
+
+def filas_prestamos(prestamos):
+    hoy = timezone.localdate()
+    yield ('id', 'libro_id', 'libro', 'usuario', 'fecha_prestamo', 'fecha_max', 'fecha_devolucion', 'dias_retraso')
+    filas = prestamos.order_by('id').values_list('id', 'libro_id', 'libro__titulo', 'usuario__username',
+                                                 'fecha_prestamos', 'fecha_max', 'fecha_devolucion')
+    for fila in filas.iterator(chunk_size=TAMANO_BLOQUE):
+        # Igual que Prestamo.dias_retraso, sin instanciar el modelo
+        retraso = max(((fila[6] or hoy) - fila[5]).days, 0)
+        yield fila + (retraso,)
+
+
+def filas_multas(multas):
+    yield ('id', 'prestamo_id', 'usuario', 'libro', 'tipo', 'monto', 'pagada', 'fecha')
+    yield from (multas.order_by('id')
+                .values_list('id', 'prestamo_id', 'prestamo__usuario__username', 'prestamo__libro__titulo',
+                             'tipo', 'monto', 'pagada', 'fecha')
+                .iterator(chunk_size=TAMANO_BLOQUE))
+
+
+# nombre -> (queryset base, filtro, generador de filas)
+EXPORTACIONES = {
+    'libros': (Libro.objects.all, filtrar_libros, filas_libros),
+    'prestamos': (Prestamo.objects.all, filtrar_prestamos, filas_prestamos),
+    'multas': (Multa.objects.all, filtrar_multas, filas_multas),
+}
+
+
+class _Eco:
+    """Archivo falso para csv.writer: devuelve lo escrito en vez de guardarlo"""
+
+    def write(self, valor):
+        return valor
+
+
+def _csv(filas):
+    escritor = csv.writer(_Eco())
+    for fila in filas:
+        yield escritor.writerow(fila)
+
+
+def _jsonl(filas):
+    columnas = next(filas)
+    for fila in filas:
+        yield json.dumps(dict(zip(columnas, fila)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def exportar(nombre, params, formato='csv'):
+    """StreamingHttpResponse con la exportación filtrada; None si no existe"""
+    if nombre not in EXPORTACIONES or formato not in FORMATOS:
+        return None
+    base, filtrar, generar = EXPORTACIONES[nombre]
+    consulta = filtrar(base(), params)
+    # Fijar la base ahora: el generador corre después de la vista (fuera de solo_lectura)
+    consulta = consulta.using(consulta.db)
+    contenido = (_csv if formato == 'csv' else _jsonl)(generar(consulta))
+    respuesta = StreamingHttpResponse(contenido, content_type=FORMATOS[formato])
+    fecha = timezone.localdate().isoformat()
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre}_{fecha}.{formato}"'
+    return respuesta
@@ -0,0 +1,412 @@
+# Inventario por ejemplar
+# Cada copia física es una fila de Ejemplar con su código de barras y su estado.
+# Libro.stock queda como contador desnormalizado de ejemplares disponibles (lo
+# leen el catálogo, la API y la disponibilidad en lote) y solo se modifica desde
+# aquí, en la misma transacción que cambia los ejemplares y que anota el
+# movimiento en el kardex (gestion/kardex.py).
+#
+# Prestar reclama una copia con un único UPDATE condicional sobre el índice
+# (libro, estado) con RETURNING (SQLite >= 3.35 / PostgreSQL): dos préstamos
+# simultáneos nunca se llevan el mismo ejemplar ni hace falta bloquear el libro.
+#
+# Con varias sucursales cada ejemplar pertenece a una (NULL = sin sucursal):
+# Libro.stock sigue siendo el total y los conteos por sede salen de agrupar los
+# ejemplares sobre el índice (libro, estado, sucursal).
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Case, Count, Exists, F, IntegerField, Max, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache_catalogo import incrementar_version, invalidar_objetos
+from .kardex import anotar, movimiento
+from .models import Ejemplar, Libro, Prestamo
+from .normalizacion import normalizar_isbn
+
+DISPONIBLE, PRESTADO, BAJA = 'disponible', 'prestado', 'baja'
+
+
+def es_codigo_ejemplar(codigo):
+    """True si el código escaneado es el de una copia (EJ-...) y no un ISBN o id"""
+    return (codigo or '').strip().upper().startswith('EJ-')
+
+
+def _mover_stock(libro_id, delta, motivo, actor=None):
+    """Suma delta al contador y recalcula disponible en el mismo UPDATE; lo anota en el kardex"""
+    Libro.objects.filter(id=libro_id).update(
+        stock=F('stock') + delta,
+        disponible=Case(When(stock__gt=-delta, then=Value(True)), default=Value(False)),
+        updated_at=timezone.now())
+    anotar([movimiento(libro_id, delta, motivo, actor)])
+    # update() no envía post_save: invalidar la caché del catálogo como lo haría libro.save(),
+    # al confirmar para que nadie vuelva a guardar en caché el valor anterior
+    transaction.on_commit(lambda: incrementar_version('Libro', libro_id))
+
+
+def _reclamar(libro_id=None, codigo=None, sucursal_id=None):
+    """
+    Pasa a prestado un ejemplar disponible (el del código, o el de menor id del
+    libro en la sucursal si se indica) y devuelve (ejemplar_id, libro_id,
+    sucursal_id), o None si no queda ninguno.
+    """
+    conexion = connections[router.db_for_write(Ejemplar)]
+    tabla = conexion.ops.quote_name(Ejemplar._meta.db_table)
+    if codigo:
+        condicion, parametros = 'codigo_barras = %s', [codigo.strip().upper()]
+    else:
+        en_sucursal = ' AND sucursal_id = %s' if sucursal_id else ''
+        condicion = (f'id = (SELECT id FROM {tabla} WHERE libro_id = %s AND estado = %s{en_sucursal} '
+                     f'ORDER BY id LIMIT 1)')
+        parametros = [libro_id, DISPONIBLE] + ([sucursal_id] if sucursal_id else [])
+    # El estado se vuelve a comprobar en el propio UPDATE: si otra transacción
+    # se llevó la copia entre medio no se actualiza ninguna fila
+    sql = (f'UPDATE {tabla} SET estado = %s, updated_at = %s '
+           f'WHERE {condicion} AND estado = %s RETURNING id, libro_id, sucursal_id')
+    ahora = conexion.ops.adapt_datetimefield_value(timezone.now())
+    with conexion.cursor() as cursor:
+        cursor.execute(sql, [PRESTADO, ahora, *parametros, DISPONIBLE])
+        return cursor.fetchone()
+
+
+def prestar(usuario, fecha_max, libro_id=None, codigo=None, fecha_prestamo=None, sucursal_id=None, actor=None):
+    """
+    Crea el préstamo de un ejemplar disponible: uno concreto si se escaneó su
+    código, o cualquiera del libro (de la sucursal, si se indica). Devuelve el
+    Prestamo, o None si no hay copias. actor es quien lo registra (para el kardex).
+    """
+    with transaction.atomic():
+        fila = _reclamar(libro_id, codigo, sucursal_id)
+        if fila is None:
+            return None
+        ejemplar_id, libro_id, sucursal_id = fila
+        prestamo = Prestamo.objects.create(libro_id=libro_id, ejemplar_id=ejemplar_id, sucursal_id=sucursal_id,
+                                           usuario=usuario,
+                                           fecha_prestamos=fecha_prestamo or timezone.now().date(),
+                                           fecha_max=fecha_max)
+        _mover_stock(libro_id, -1, 'prestamo', actor)
+    return prestamo
+
+
+def devolver(prestamo, perdido=False, actor=None):
+    """
+    Cierra el préstamo y devuelve su ejemplar al estante (o lo da de baja si se
+    perdió). False si ya estaba devuelto, así un doble envío no suma stock dos veces.
+    """
+    hoy = timezone.now().date()
+    with transaction.atomic():
+        if not Prestamo.objects.filter(pk=prestamo.pk, fecha_devolucion__isnull=True).update(fecha_devolucion=hoy):
+            return False
+        prestamo.fecha_devolucion = hoy
+        # Sin post_save: invalidar lo que depende de los préstamos (disponibilidad en lote)
+        transaction.on_commit(lambda: incrementar_version('Prestamo'))
+        if prestamo.ejemplar_id is None:
+            # Préstamo sin ejemplar (cargado en bloque): la copia devuelta entra al inventario
+            if not perdido:
+                agregar(prestamo.libro_id, 1, prestamo.sucursal_id, actor, 'devolucion')
+            return True
+        movidos = Ejemplar.objects.filter(id=prestamo.ejemplar_id, estado=PRESTADO).update(
+            estado=BAJA if perdido else DISPONIBLE, updated_at=timezone.now())
+        if movidos and not perdido:
+            _mover_stock(prestamo.libro_id, 1, 'devolucion', actor)
+    return True
+
+
+def _crear_ejemplares(libro_id, cantidad, sucursal_id=None):
+    ultimo = Ejemplar.objects.filter(libro_id=libro_id).aggregate(ultimo=Max('numero'))['ultimo'] or 0
+    return Ejemplar.objects.bulk_create([
+        Ejemplar(libro_id=libro_id, numero=n, codigo_barras=Ejemplar.codigo(libro_id, n), sucursal_id=sucursal_id)
+        for n in range(ultimo + 1, ultimo + cantidad + 1)])
+
+
+def _disponibles(libro_ids, sucursal_id=None):
+    ejemplares = Ejemplar.objects.filter(libro_id__in=libro_ids, estado=DISPONIBLE)
+    return ejemplares.filter(sucursal_id=sucursal_id) if sucursal_id else ejemplares
+
+
+def _dar_de_baja(libro_id, cantidad, sucursal_id=None):
+    ids = list(_disponibles([libro_id], sucursal_id).order_by('-numero').values_list('id', flat=True)[:cantidad])
+    return Ejemplar.objects.filter(id__in=ids, estado=DISPONIBLE).update(estado=BAJA, updated_at=timezone.now())
+
+
+def agregar(libro_id, cantidad, sucursal_id=None, actor=None, motivo='alta'):
+    """Da de alta cantidad ejemplares nuevos del libro (en la sucursal), con los números siguientes"""
+    if cantidad <= 0:
+        return []
+    with transaction.atomic():
+        ejemplares = _crear_ejemplares(libro_id, cantidad, sucursal_id)
+        _mover_stock(libro_id, cantidad, motivo, actor)
+    return ejemplares
+
+
+def retirar(libro_id, cantidad, sucursal_id=None, actor=None):
+    """Da de baja hasta cantidad ejemplares disponibles (nunca los prestados); devuelve cuántos"""
+    if cantidad <= 0:
+        return 0
+    with transaction.atomic():
+        retirados = _dar_de_baja(libro_id, cantidad, sucursal_id)
+        if retirados:
+            _mover_stock(libro_id, -retirados, 'baja', actor)
+    return retirados
+
+
+def ajustar_stock(libro, objetivo, sucursal_id=None, actor=None):
+    """
+    Deja objetivo ejemplares disponibles (en la sucursal, si se indica)
+    agregando o dando de baja copias. Los prestados no se tocan: el stock nunca
+    puede pisar préstamos en curso. El contador total se fija al conteo real,
+    así también corrige desvíos anteriores. Devuelve los disponibles resultantes.
+    """
+    disponibles = ajustar_en_bloque({libro.id: objetivo}, sucursal_id, actor)[libro.id]
+    libro.refresh_from_db(fields=['stock', 'disponible', 'updated_at'])
+    return disponibles
+
+
+def ajustar_en_bloque(objetivos, sucursal_id=None, actor=None):
+    """
+    ajustar_stock para muchos libros ({libro_id: objetivo}) en una transacción
+    y con un número fijo de consultas: conteo agrupado, un bulk_create de las
+    copias nuevas, un UPDATE de las bajas y el recuento de los contadores.
+    Devuelve {libro_id: disponibles}.
+    """
+    ids = list(objetivos)
+    with transaction.atomic():
+        actuales = _conteo_disponibles(ids, sucursal_id)
+        ultimos = dict(Ejemplar.objects.filter(libro_id__in=ids).order_by().values('libro_id')
+                       .annotate(ultimo=Max('numero')).values_list('libro_id', 'ultimo'))
+        nuevos, sobrantes = [], {}
+        for libro_id in ids:
+            objetivo, actual = max(0, objetivos[libro_id]), actuales.get(libro_id, 0)
+            if objetivo > actual:
+                ultimo = ultimos.get(libro_id) or 0
+                nuevos += [Ejemplar(libro_id=libro_id, numero=n, codigo_barras=Ejemplar.codigo(libro_id, n),
+                                    sucursal_id=sucursal_id)
+                           for n in range(ultimo + 1, ultimo + objetivo - actual + 1)]
+            elif objetivo < actual:
+                sobrantes[libro_id] = actual - objetivo
+        Ejemplar.objects.bulk_create(nuevos, batch_size=1000)
+        if sobrantes:
+            # Se retiran las copias de número más alto de cada libro
+            bajas = []
+            for libro_id, ejemplar_id in (_disponibles(list(sobrantes), sucursal_id)
+                                          .order_by('libro_id', '-numero').values_list('libro_id', 'id')):
+                if sobrantes[libro_id]:
+                    bajas.append(ejemplar_id)
+                    sobrantes[libro_id] -= 1
+            for inicio in range(0, len(bajas), 500):
+                Ejemplar.objects.filter(id__in=bajas[inicio:inicio + 500], estado=DISPONIBLE).update(
+                    estado=BAJA, updated_at=timezone.now())
+        _recontar(Libro.objects.filter(id__in=ids), 'ajuste', actor)
+        resultado = _conteo_disponibles(ids, sucursal_id)
+        transaction.on_commit(lambda: invalidar_objetos('Libro', ids))
+    return {libro_id: resultado.get(libro_id, 0) for libro_id in ids}
+
+
+def _conteo_disponibles(libro_ids, sucursal_id=None):
+    return dict(_disponibles(libro_ids, sucursal_id).order_by().values('libro_id')
+                .annotate(n=Count('id')).values_list('libro_id', 'n'))
+
+
+def _recontar(libros, motivo, actor=None):
+    """
+    Fija stock y disponible de los libros al conteo real, calculado dentro del
+    propio UPDATE, y anota las diferencias en el kardex con un solo INSERT.
+    No invalida la caché: lo hace quien llama, al confirmar.
+    """
+    antes = dict(libros.values_list('id', 'stock'))
+    disponibles = Ejemplar.objects.filter(libro_id=OuterRef('pk'), estado=DISPONIBLE)
+    cambiados = libros.update(stock=_esperado(), disponible=Exists(disponibles), updated_at=timezone.now())
+    anotar(movimiento(libro_id, stock - antes[libro_id], motivo, actor)
+           for libro_id, stock in Libro.objects.filter(id__in=antes).values_list('id', 'stock'))
+    return cambiados
+
+
+def validar_objetivos(filas):
+    """
+    Valida una carga de inventario: filas (etiqueta, código, stock) donde el
+    código es el id o el ISBN del libro y el stock un entero entre 0 y
+    STOCK_MAXIMO_POR_LIBRO (cada unidad es una fila de Ejemplar). Resuelve
+    todos los códigos con dos consultas. Devuelve ({libro_id: stock}, errores);
+    si hay errores no debe aplicarse nada.
+    """
+    maximo = settings.STOCK_MAXIMO_POR_LIBRO
+    filas = [(etiqueta, (codigo or '').strip(), (stock or '').strip()) for etiqueta, codigo, stock in filas]
+    isbns = {codigo: normalizar_isbn(codigo) for _, codigo, _ in filas}
+    por_isbn = dict(Libro.objects.filter(isbn__in={i for i in isbns.values() if i}).values_list('isbn', 'id'))
+    por_id = set(Libro.objects.filter(id__in={int(c) for c, i in isbns.items() if not i and c.isdigit()})
+                 .values_list('id', flat=True))
+    objetivos, errores, vistas = {}, [], {}
+    for etiqueta, codigo, stock in filas:
+        if isbns[codigo]:
+            libro_id = por_isbn.get(isbns[codigo])
+        else:
+            libro_id = int(codigo) if codigo.isdigit() and int(codigo) in por_id else None
+        if libro_id is None:
+            errores.append(f'{etiqueta}: no hay ningún libro con el id o ISBN "{codigo}"')
+        elif not stock.isdigit():
+            errores.append(f'{etiqueta}: el stock "{stock}" no es un entero mayor o igual a 0')
+        elif int(stock) > maximo:
+            errores.append(f'{etiqueta}: el stock {stock} supera el máximo de {maximo} por libro')
+        elif libro_id in vistas:
+            errores.append(f'{etiqueta}: el libro "{codigo}" ya aparece en {vistas[libro_id]}')
+        else:
+            vistas[libro_id] = etiqueta
+            objetivos[libro_id] = int(stock)
+    return objetivos, errores
+
+
+def por_sucursal(libro_ids):
+    """
+    Ejemplares disponibles de cada libro en cada sucursal con un solo GROUP BY
+    sobre el índice (libro, estado, sucursal): {libro_id: [(sucursal_id, nombre, n)]}.
+    Los libros sin copias disponibles no aparecen.
+    """
+    filas = (Ejemplar.objects.filter(libro_id__in=libro_ids, estado=DISPONIBLE).order_by()
+             .values_list('libro_id', 'sucursal_id', 'sucursal__nombre').annotate(n=Count('id')))
+    resultado = defaultdict(list)
+    for libro_id, sucursal_id, nombre, n in filas:
+        resultado[libro_id].append((sucursal_id, nombre, n))
+    return dict(resultado)
+
+
+# Conciliación (comando conciliar_stock)
+# Todo se calcula en consultas de conjunto sobre el índice (libro, estado, ...)
+# y se repara con UPDATE que vuelven a evaluar la condición. Para poder correr
+# con el sitio en uso, lo tocado en los últimos minutos (updated_at) no se
+# repara: puede ser un préstamo o devolución a medio confirmar; la siguiente
+# pasada lo recoge si de verdad quedó descuadrado.
+
+def _esperado():
+    """Ejemplares disponibles del libro de la fila externa (0 si no tiene)"""
+    conteo = (Ejemplar.objects.filter(libro_id=OuterRef('pk'), estado=DISPONIBLE).order_by()
+              .values('libro_id').annotate(n=Count('id')).values('n'))
+    return Coalesce(Subquery(conteo, output_field=IntegerField()), 0)
+
+
+def _prestamo_abierto():
+    return Prestamo.objects.filter(ejemplar_id=OuterRef('pk'), fecha_devolucion__isnull=True)
+
+
+def libros_descuadrados():
+    """
+    Libros cuyo stock o disponible no coincide con las copias disponibles, en
+    una sola consulta: (id, titulo, stock, disponible, esperado). Un libro sin
+    ejemplares espera 0; si tiene stock positivo no se cuenta aquí sino en
+    libros_sin_ejemplares (hay que crear sus copias, no poner el stock en 0).
+    """
+    con_ejemplares = Exists(Ejemplar.objects.filter(libro_id=OuterRef('pk')))
+    return (Libro.objects.annotate(esperado=_esperado()).filter(con_ejemplares | Q(stock__lte=0))
+            .filter(~Q(stock=F('esperado')) | Q(disponible=True, esperado=0) | Q(disponible=False, esperado__gt=0))
+            .order_by('id').values_list('id', 'titulo', 'stock', 'disponible', 'esperado'))
+
+
+def libros_sin_ejemplares():
+    """Libros con stock pero sin ninguna fila de Ejemplar (cargados en bloque)"""
+    return Libro.objects.filter(stock__gt=0).exclude(Exists(Ejemplar.objects.filter(libro_id=OuterRef('pk'))))
+
+
+def prestados_sin_prestamo():
+    """Ejemplares marcados como prestados sin ningún préstamo abierto que los use"""
+    return Ejemplar.objects.filter(estado=PRESTADO).exclude(Exists(_prestamo_abierto()))
+
+
+def prestamos_sin_copia():
+    """Ejemplares de préstamos abiertos que no están marcados como prestados"""
+    return Ejemplar.objects.exclude(estado=PRESTADO).filter(Exists(_prestamo_abierto()))
+
+
+def revisar(muestra=50):
+    """Resumen de descuadres: conteos por tipo y los primeros libros descuadrados"""
+    descuadrados = libros_descuadrados()
+    return {
+        'libros': descuadrados.count(),
+        'muestra': list(descuadrados[:muestra]),
+        'sin_ejemplares': libros_sin_ejemplares().count(),
+        'prestados_sin_prestamo': prestados_sin_prestamo().count(),
+        'prestamos_sin_copia': prestamos_sin_copia().count(),
+    }
+
+
+def reparar(margen=timedelta(minutes=5), lote=1000):
+    """
+    Corrige los descuadres en bloque: crea los ejemplares que falten, ajusta el
+    estado de las copias a los préstamos abiertos y recalcula stock y disponible
+    en el propio UPDATE. Cada paso va en su propia transacción corta y no toca
+    lo modificado dentro del margen. Devuelve lo corregido por tipo.
+    """
+    limite = timezone.now() - margen
+    ahora = timezone.now()
+    reparados = {'sin_ejemplares': 0, 'prestados_sin_prestamo': 0, 'prestamos_sin_copia': 0, 'libros': 0}
+    if libros_sin_ejemplares().exists():
+        with transaction.atomic():
+            reparados['sin_ejemplares'] = expandir_stock(Libro, Prestamo, Ejemplar, lote)
+    with transaction.atomic():
+        reparados['prestados_sin_prestamo'] = (prestados_sin_prestamo().filter(updated_at__lt=limite)
+                                               .update(estado=DISPONIBLE, updated_at=ahora))
+    with transaction.atomic():
+        reparados['prestamos_sin_copia'] = (prestamos_sin_copia().filter(updated_at__lt=limite)
+                                            .update(estado=PRESTADO, updated_at=ahora))
+
+    ids = list(libros_descuadrados().filter(updated_at__lt=limite).values_list('id', flat=True))
+    for inicio in range(0, len(ids), lote):
+        with transaction.atomic():
+            # El conteo se hace dentro del UPDATE: no hay ventana entre leer y escribir
+            reparados['libros'] += _recontar(Libro.objects.filter(id__in=ids[inicio:inicio + lote],
+                                                                  updated_at__lt=limite), 'conciliacion')
+    # update() no envía post_save: invalidar catálogo, fichas y disponibilidad en lote
+    # (dentro de una transacción externa, recién cuando se confirme)
+    if any(reparados.values()):
+        transaction.on_commit(lambda: (invalidar_objetos('Libro', ids), incrementar_version('Prestamo')))
+    return reparados
+
+
+def expandir_stock(Libro, Prestamo, Ejemplar, lote=2000):
+    """
+    Crea los ejemplares de los libros que aún no tienen: uno disponible por
+    unidad de stock y uno prestado por cada préstamo abierto, que queda enlazado.
+    Recibe los modelos como la migración 0018 (que tiene su propia copia).
+    Devuelve los creados.
+    """
+    con_ejemplares = set(Ejemplar.objects.values_list('libro_id', flat=True).distinct())
+    Libro.objects.filter(stock__lt=0).update(stock=0, disponible=False)
+    numeros = defaultdict(int)
+    creados = 0
+
+    def guardar(filas):
+        Ejemplar.objects.bulk_create(filas, batch_size=lote)
+        return len(filas)
+
+    filas = []
+    for libro_id, stock in Libro.objects.order_by('id').values_list('id', 'stock').iterator(chunk_size=lote):
+        if libro_id in con_ejemplares:
+            continue
+        for _ in range(stock):
+            numeros[libro_id] += 1
+            n = numeros[libro_id]
+            filas.append(Ejemplar(libro_id=libro_id, numero=n, codigo_barras=f'EJ-{libro_id}-{n}',
+                                  estado=DISPONIBLE))
+        if len(filas) >= lote:
+            creados += guardar(filas)
+            filas = []
+    creados += guardar(filas)
+
+    abiertos = (Prestamo.objects.filter(fecha_devolucion__isnull=True, ejemplar__isnull=True)
+                .exclude(libro_id__in=con_ejemplares).order_by('id').values_list('id', 'libro_id'))
+    pendientes = list(abiertos)
+    for inicio in range(0, len(pendientes), lote):
+        bloque = pendientes[inicio:inicio + lote]
+        filas = []
+        for _, libro_id in bloque:
+            numeros[libro_id] += 1
+            n = numeros[libro_id]
+            filas.append(Ejemplar(libro_id=libro_id, numero=n, codigo_barras=f'EJ-{libro_id}-{n}', estado=PRESTADO))
+        # bulk_create devuelve los ids (RETURNING) en el mismo orden
+        ejemplares = Ejemplar.objects.bulk_create(filas, batch_size=lote)
+        Prestamo.objects.bulk_update([Prestamo(id=prestamo_id, ejemplar_id=ejemplar.id)
+                                      for (prestamo_id, _), ejemplar in zip(bloque, ejemplares)],
+                                     ['ejemplar'], batch_size=lote)
+        creados += len(ejemplares)
+    return creados
@@ -0,0 +1,100 @@
+# Kardex de stock
+# MovimientoStock guarda cada cambio de Libro.stock (libro, delta, motivo,
+# usuario, fecha) y nunca se edita ni se borra. Lo escribe inventario.py en la
+# misma transacción que mueve el contador: un INSERT por préstamo/devolución y
+# un único bulk_create por lote en los ajustes masivos.
+#
+# Para responder "stock del libro X el día D" sin sumar toda la historia, el
+# comando compactar_kardex guarda periódicamente FotoStock (stock al cierre de
+# un día) solo de los libros con movimientos nuevos desde la pasada anterior:
+# la consulta es la foto más reciente <= D más los movimientos posteriores
+# hasta el fin de D, sobre el índice (libro, fecha).
+
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from .models import FotoStock, MarcaProceso, MovimientoStock
+
+MARCA = 'kardex'
+
+
+def movimiento(libro_id, delta, motivo, actor=None):
+    """MovimientoStock sin guardar (actor: usuario que hizo el cambio, o None si fue un proceso)"""
+    usuario = actor if actor is not None and actor.is_authenticated else None
+    return MovimientoStock(libro_id=libro_id, delta=delta, motivo=motivo, usuario=usuario)
+
+
+def anotar(movimientos):
+    """Guarda los movimientos de una vez, descartando los que no cambian el stock"""
+    return MovimientoStock.objects.bulk_create([m for m in movimientos if m.delta], batch_size=1000)
+
+
+def _fin_del_dia(fecha):
+    """Primer instante del día siguiente (hora local): los movimientos de fecha son los < a este"""
+    return timezone.make_aware(datetime.combine(fecha + timedelta(days=1), time.min))
+
+
+def stock_en(libro_id, fecha):
+    """Stock del libro al final del día fecha: la foto anterior más los movimientos desde ella"""
+    foto = FotoStock.objects.filter(libro_id=libro_id, fecha__lte=fecha).order_by('-fecha').first()
+    movimientos = MovimientoStock.objects.filter(libro_id=libro_id, fecha__lt=_fin_del_dia(fecha))
+    if foto:
+        movimientos = movimientos.filter(fecha__gte=_fin_del_dia(foto.fecha))
+    return (foto.stock if foto else 0) + (movimientos.aggregate(total=Sum('delta'))['total'] or 0)
+
+
+def compactar(hasta=None, lote=1000):
+    """
+    Guarda la foto del día hasta (por defecto ayer) de cada libro con
+    movimientos nuevos desde la marca (MarcaProceso 'kardex' = último
+    movimiento ya incluido en alguna foto). Devuelve las fotos escritas.
+    La foto nueva es la última más lo nuevo, así que hasta no puede ser
+    anterior a la foto más reciente.
+    """
+    hasta = hasta or timezone.localdate() - timedelta(days=1)
+    ultima_foto = FotoStock.objects.aggregate(fecha=Max('fecha'))['fecha']
+    if ultima_foto and hasta < ultima_foto:
+        raise ValueError(f'Ya hay fotos del {ultima_foto.isoformat()}: no se puede compactar hasta una fecha anterior')
+    marca, _ = MarcaProceso.objects.get_or_create(nombre=MARCA)
+    nuevos = MovimientoStock.objects.filter(id__gt=marca.ultimo_id, fecha__lt=_fin_del_dia(hasta))
+    sumas = dict(nuevos.order_by().values('libro_id').annotate(total=Sum('delta')).values_list('libro_id', 'total'))
+    if not sumas:
+        return 0
+    ultimo = nuevos.aggregate(ultimo=Max('id'))['ultimo']
+    escritas = 0
+    ids = sorted(sumas)
+    with transaction.atomic():
+        for inicio in range(0, len(ids), lote):
+            bloque = ids[inicio:inicio + lote]
+            # Foto anterior de cada libro del bloque (ordenadas por fecha: la última pisa a las demás)
+            base = dict(FotoStock.objects.filter(libro_id__in=bloque).order_by('libro_id', 'fecha')
+                        .values_list('libro_id', 'stock'))
+            escritas += len(FotoStock.objects.bulk_create(
+                [FotoStock(libro_id=libro_id, fecha=hasta, stock=base.get(libro_id, 0) + sumas[libro_id])
+                 for libro_id in bloque],
+                update_conflicts=True, unique_fields=['libro', 'fecha'], update_fields=['stock']))
+        marca.ultimo_id = ultimo
+        marca.save()
+    return escritas
+
+
+def sembrar_fotos(Libro, FotoStock, MovimientoStock, fecha, lote=2000):
+    """
+    Foto inicial con el stock actual de los libros sin historia en el kardex
+    (anteriores a él o cargados con bulk_create, que no anotan el alta).
+    """
+    sin_historia = (Libro.objects.exclude(id__in=FotoStock.objects.values('libro_id'))
+                    .exclude(id__in=MovimientoStock.objects.values('libro_id')))
+    filas = (FotoStock(libro_id=libro_id, fecha=fecha, stock=stock) for libro_id, stock in
+             sin_historia.order_by('id').values_list('id', 'stock').iterator(chunk_size=lote))
+    creadas = 0
+    pendientes = []
+    for fila in filas:
+        pendientes.append(fila)
+        if len(pendientes) >= lote:
+            creadas += len(FotoStock.objects.bulk_create(pendientes))
+            pendientes = []
+    return creadas + len(FotoStock.objects.bulk_create(pendientes))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Calcula las recomendaciones "otros lectores también pidieron" a partir del historial de préstamos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--completo', action='store_true',
+                            help='Recalcular todos los libros (por defecto solo los afectados por préstamos nuevos)')
+        parser.add_argument('--top', type=int, default=10, help='Recomendaciones que se guardan por libro')
+        parser.add_argument('--max-por-usuario', type=int, default=50,
+                            help='Libros más recientes de cada usuario que se consideran')
+        parser.add_argument('--minimo', type=int, default=1,
+                            help='Lectores en común mínimos para recomendar un libro')
+
+    def handle(self, *args, **options):
+        try:
+            from gestion.recomendaciones import calcular
+            inicio = time.perf_counter()
+            libros, filas = calcular(completo=options['completo'], top=options['top'],
+                                     max_por_usuario=options['max_por_usuario'], minimo=options['minimo'])
+        except ImportError:
+            raise CommandError('Este comando necesita NumPy (pip install numpy)')
+        if not libros:
+            self.stdout.write('No hay préstamos nuevos desde el último cálculo')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'{filas} recomendaciones para {libros} libros en {time.perf_counter() - inicio:.1f} s'))
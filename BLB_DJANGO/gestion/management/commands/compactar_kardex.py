@@ -0,0 +1,26 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion.kardex import compactar
+
+
+class Command(BaseCommand):
+    help = 'Guarda la foto de stock de los libros con movimientos nuevos en el kardex (pensado para correr a diario)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hasta', help='Día de la foto, AAAA-MM-DD (por defecto ayer)')
+        parser.add_argument('--lote', type=int, default=1000, help='Libros por bulk_create')
+
+    def handle(self, *args, **options):
+        try:
+            hasta = date.fromisoformat(options['hasta']) if options['hasta'] else None
+        except ValueError:
+            raise CommandError('--hasta debe tener el formato AAAA-MM-DD')
+        inicio = time.perf_counter()
+        try:
+            fotos = compactar(hasta, options['lote'])
+        except ValueError as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(f'{fotos} fotos de stock en {time.perf_counter() - inicio:.1f} s'))
@@ -0,0 +1,47 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from gestion.inventario import reparar, revisar
+
+DESCRIPCIONES = {
+    'libros': 'libros con stock/disponible distinto de sus copias disponibles',
+    'sin_ejemplares': 'libros con stock pero sin ejemplares',
+    'prestados_sin_prestamo': 'ejemplares prestados sin préstamo abierto',
+    'prestamos_sin_copia': 'préstamos abiertos cuyo ejemplar no figura como prestado',
+}
+
+
+class Command(BaseCommand):
+    help = 'Compara Libro.stock/disponible con los ejemplares y los préstamos abiertos y opcionalmente lo corrige'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reparar', action='store_true',
+                            help='Corregir los descuadres en bloque (sin esta opción solo se informan)')
+        parser.add_argument('--margen', type=int, default=5,
+                            help='Minutos: lo modificado más recientemente no se repara (puede estar en curso)')
+        parser.add_argument('--lote', type=int, default=1000, help='Libros por transacción al reparar')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        resumen = revisar()
+        for clave, descripcion in DESCRIPCIONES.items():
+            self.stdout.write(f'{resumen[clave]:>8}  {descripcion}')
+        for id_, titulo, stock, disponible, esperado in resumen['muestra']:
+            self.stdout.write(f'  #{id_} {titulo}: stock={stock} disponible={disponible} -> {esperado} disponibles')
+        if resumen['libros'] > len(resumen['muestra']):
+            self.stdout.write(f'  ... y {resumen["libros"] - len(resumen["muestra"])} libros más')
+        self.stdout.write(f'Revisión en {time.perf_counter() - inicio:.1f} s')
+
+        pendientes = any(resumen[clave] for clave in DESCRIPCIONES)
+        if options['reparar'] and pendientes:
+            inicio = time.perf_counter()
+            reparados = reparar(timedelta(minutes=options['margen']), options['lote'])
+            self.stdout.write(self.style.SUCCESS(
+                'Reparado: ' + ', '.join(f'{clave}={n}' for clave, n in reparados.items())
+                + f' en {time.perf_counter() - inicio:.1f} s'))
+        elif pendientes:
+            self.stdout.write('Usa --reparar para aplicar los cambios')
+        else:
+            self.stdout.write(self.style.SUCCESS('Stock conciliado'))
@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from gestion.deduplicacion import duplicados_exactos, duplicados_similares, fusionar
+from gestion.models import Autor
+
+
+class Command(BaseCommand):
+    help = 'Busca autores duplicados (misma clave normalizada o nombres parecidos) y opcionalmente los fusiona'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--similares', action='store_true',
+                            help='Incluir casi duplicados por similitud de trigramas (revisar antes de fusionar)')
+        parser.add_argument('--umbral', type=float, default=0.75,
+                            help='Similitud mínima (0 a 1) para --similares')
+        parser.add_argument('--fusionar', action='store_true',
+                            help='Fusionar los grupos encontrados (sin esta opción solo se listan)')
+        parser.add_argument('--lote', type=int, default=200, help='Grupos por transacción al fusionar')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        grupos = duplicados_exactos()
+        self.stdout.write(f'Duplicados exactos: {len(grupos)} grupos')
+        if options['similares']:
+            similares = duplicados_similares(options['umbral'])
+            self.stdout.write(f'Nombres parecidos (>= {options["umbral"]}): {len(similares)} grupos')
+            grupos = self._unir(grupos + similares)
+
+        nombres = dict((id_, f'{nombre} {apellido}') for id_, nombre, apellido in
+                       Autor.objects.filter(id__in={i for g in grupos for i in g})
+                       .values_list('id', 'nombre', 'apellido'))
+        for ids in grupos[:50]:
+            self.stdout.write('  ' + ' | '.join(f'#{id_} {nombres.get(id_, "?")}' for id_ in ids))
+        if len(grupos) > 50:
+            self.stdout.write(f'  ... y {len(grupos) - 50} grupos más')
+        self.stdout.write(f'Búsqueda en {time.perf_counter() - inicio:.1f} s')
+
+        if options['fusionar'] and grupos:
+            inicio = time.perf_counter()
+            eliminados, movidos = fusionar(grupos, options['lote'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{eliminados} autores fusionados, {movidos} libros reasignados en {time.perf_counter() - inicio:.1f} s'))
+        elif grupos:
+            self.stdout.write('Usa --fusionar para aplicar los cambios')
+
+    @staticmethod
+    def _unir(grupos):
+        """Une grupos que comparten algún autor (un exacto puede ser también parecido a otro)"""
+        de = {}
+        for ids in grupos:
+            actual = set(ids)
+            for id_ in ids:
+                if id_ in de:
+                    actual |= de[id_]
+            for id_ in actual:
+                de[id_] = actual
+        unicos = {id(g): g for g in de.values()}
+        return [sorted(g) for g in unicos.values()]
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from gestion.recordatorios import enviar
+
+
+class Command(BaseCommand):
+    help = 'Envía por correo los avisos de préstamos por vencer y vencidos, uno por usuario (pensado para correr a diario)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, help='Avisar de lo que vence en estos días (por defecto RECORDATORIOS_DIAS_ANTES)')
+        parser.add_argument('--lote', type=int, default=200, help='Correos por envío')
+        parser.add_argument('--simular', action='store_true', help='Solo contar, sin enviar ni anotar')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        totales = enviar(dias=options['dias'], lote=options['lote'], simular=options['simular'])
+        accion = 'por enviar' if options['simular'] else 'enviados'
+        self.stdout.write(self.style.SUCCESS(
+            f"{totales['correos']} correos {accion} ({totales['prestamos']} préstamos) "
+            f"en {time.perf_counter() - inicio:.1f} s"))
+        if totales['fallidos']:
+            self.stdout.write(self.style.WARNING(
+                f"{totales['fallidos']} correos rechazados; quedan pendientes para la próxima corrida"))
@@ -0,0 +1,216 @@
+import random
+import time
+from array import array
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from gestion.inventario import expandir_stock
+from gestion.kardex import sembrar_fotos
+from gestion.models import (Autor, Ejemplar, FotoStock, Libro, MovimientoStock, Multa, Perfil, Prestamo, RegistroActividad,
+                            SolicitudPrestamo)
+from gestion.normalizacion import clave_autor, digito_isbn13
+from gestion.popularidad import recalcular
+
+# Cantidades con --escala 1 (un catálogo grande de biblioteca)
+CANTIDADES = {
+    'autores': 20_000,
+    'libros': 100_000,
+    'usuarios': 50_000,
+    'prestamos': 1_000_000,
+    'multas': 1_000_000,
+    'solicitudes': 1_000_000,
+    'registros': 5_000_000,
+}
+
+NOMBRES = ['Gabriel', 'Isabel', 'Julio', 'Mario', 'Laura', 'Pablo', 'Rosa', 'Jorge', 'Elena', 'Carlos',
+           'Ana', 'Miguel', 'Lucía', 'Juan', 'Sofía', 'Andrés', 'Clara', 'Diego', 'Teresa', 'Luis']
+APELLIDOS = ['García', 'Allende', 'Cortázar', 'Vargas', 'Esquivel', 'Neruda', 'Castellanos', 'Borges',
+             'Poniatowska', 'Fuentes', 'Mistral', 'Benedetti', 'Rulfo', 'Storni', 'Onetti', 'Montalvo']
+PALABRAS = ['amor', 'tiempo', 'ciudad', 'sombra', 'mar', 'noche', 'memoria', 'río', 'casa', 'viento',
+            'guerra', 'silencio', 'luz', 'montaña', 'sueño', 'camino', 'fuego', 'jardín', 'isla', 'voz']
+ROLES = ['usuario'] * 96 + ['bodeguero', 'bibliotecario', 'bibliotecario', 'admin']
+TIPOS_LOG = ['login'] * 40 + ['logout'] * 20 + ['ver'] * 15 + ['crear'] * 8 + ['solicitud'] * 6 + \
+            ['editar'] * 4 + ['aprobar'] * 3 + ['devolucion'] * 2 + ['pago', 'rechazar']
+
+
+class Command(BaseCommand):
+    help = 'Genera un conjunto de datos sintético (bulk_create) para pruebas de rendimiento'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escala', type=float, default=1.0,
+                            help='Multiplica todas las cantidades (0.01 = 1.000 libros, 10.000 préstamos...)')
+        for nombre, cantidad in CANTIDADES.items():
+            parser.add_argument(f'--{nombre}', type=int, default=None,
+                                help=f'Cantidad de {nombre} (por defecto {cantidad:,} x escala)')
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por bulk_create')
+        parser.add_argument('--semilla', type=int, default=42, help='Semilla del generador aleatorio')
+
+    def handle(self, *args, **options):
+        self.rnd = random.Random(options['semilla'])
+        self.lote = options['lote']
+        cantidades = {}
+        for nombre, cantidad in CANTIDADES.items():
+            valor = options[nombre]
+            cantidades[nombre] = valor if valor is not None else max(1, int(cantidad * options['escala']))
+
+        self.hoy = timezone.now().date()
+        inicio = time.perf_counter()
+        autores = self._etapa('autores', cantidades['autores'], self.generar_autores)
+        libros = self._etapa('libros', cantidades['libros'], self.generar_libros, autores)
+        usuarios = self._etapa('usuarios', cantidades['usuarios'], self.generar_usuarios)
+        prestamos = self._etapa('prestamos', cantidades['prestamos'], self.generar_prestamos, libros, usuarios)
+        # Ejemplares: uno por unidad de stock y uno por préstamo abierto (bulk_create no pasa por Libro.save)
+        self._etapa('ejemplares', len(libros), lambda cantidad: expandir_stock(Libro, Prestamo, Ejemplar, self.lote))
+        # Tampoco anotan el alta en el kardex: su stock inicial queda como foto de ayer
+        self._etapa('kardex', len(libros), lambda cantidad: sembrar_fotos(Libro, FotoStock, MovimientoStock,
+                                                                         self.hoy - timedelta(days=1), self.lote))
+        self._etapa('multas', cantidades['multas'], self.generar_multas, prestamos)
+        self._etapa('solicitudes', cantidades['solicitudes'], self.generar_solicitudes, libros, usuarios)
+        self._etapa('registros', cantidades['registros'], self.generar_registros, usuarios)
+        # Tampoco llegan las señales de Prestamo/SolicitudPrestamo: popularidad desde el historial
+        self._etapa('popularidad', len(libros), lambda cantidad: recalcular())
+        # bulk_create no envía post_save: descartar las versiones del catálogo
+        # (gestion/cache_catalogo.py) para que ningún worker sirva fragmentos viejos
+        caches['compartida'].clear()
+        self.stdout.write(self.style.SUCCESS(f'Datos generados en {time.perf_counter() - inicio:.1f} s'))
+
+    def _etapa(self, nombre, cantidad, generador, *args):
+        """Ejecuta un generador dentro de una transacción y muestra el tiempo"""
+        inicio = time.perf_counter()
+        with transaction.atomic():
+            ids = generador(cantidad, *args)
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(f'{nombre:>12}: {cantidad:>10,} filas en {segundos:6.1f} s')
+        return ids
+
+    def _insertar(self, modelo, filas, ids=None):
+        """bulk_create por lotes; si se pasa un array guarda los ids creados"""
+        objetos = []
+        for fila in filas:
+            objetos.append(fila)
+            if len(objetos) >= self.lote:
+                self._guardar_lote(modelo, objetos, ids)
+                objetos = []
+        if objetos:
+            self._guardar_lote(modelo, objetos, ids)
+        return ids
+
+    def _guardar_lote(self, modelo, objetos, ids):
+        creados = modelo.objects.bulk_create(objetos, batch_size=self.lote)
+        if ids is not None:
+            ids.extend(obj.pk for obj in creados)
+
+    def _fecha(self, dias_atras=730):
+        return self.hoy - timedelta(days=self.rnd.randint(0, dias_atras))
+
+    def generar_autores(self, cantidad):
+        rnd = self.rnd
+
+        def filas():
+            for i in range(cantidad):
+                nombre = f'{rnd.choice(NOMBRES)} {rnd.choice(NOMBRES)}'
+                apellido = rnd.choice(APELLIDOS)
+                # bulk_create no llama a Autor.save(): la clave normalizada se calcula aquí
+                yield Autor(nombre=nombre, apellido=apellido, clave_normalizada=clave_autor(nombre, apellido),
+                            bibliografia=f'Autor sintético #{i}')
+        return self._insertar(Autor, filas(), array('q'))
+
+    def generar_libros(self, cantidad, autores):
+        rnd = self.rnd
+        # ISBN-13 sintéticos con prefijo 979, consecutivos desde el último generado (índice único)
+        ultimo = Libro.objects.filter(isbn__startswith='979').order_by('-isbn').values_list('isbn', flat=True).first()
+        base = int(ultimo[3:12]) + 1 if ultimo else 0
+
+        def isbn(i):
+            doce = f'979{base + i:09d}'
+            return doce + digito_isbn13(doce)
+
+        filas = (Libro(titulo=f'{rnd.choice(PALABRAS).capitalize()} de {rnd.choice(PALABRAS)} {i}',
+                       autor_id=rnd.choice(autores),
+                       isbn=isbn(i),
+                       descripcion='Libro generado para pruebas de rendimiento.',
+                       stock=rnd.randint(0, 5),
+                       disponible=True,
+                       anio_publicacion=rnd.randint(1900, self.hoy.year))
+                 for i in range(cantidad))
+        return self._insertar(Libro, filas, array('q'))
+
+    def generar_usuarios(self, cantidad):
+        # Calcular el hash una sola vez: con PBKDF2 por usuario tardaría horas
+        clave = make_password('bench12345')
+        sufijo = int(time.time())
+        ids = self._insertar(User, (User(username=f'bench_{sufijo}_{i}', password=clave,
+                                         first_name=self.rnd.choice(NOMBRES),
+                                         last_name=self.rnd.choice(APELLIDOS),
+                                         email=f'bench_{sufijo}_{i}@bibliotech.com')
+                                    for i in range(cantidad)), array('q'))
+        rnd = self.rnd
+        self._insertar(Perfil, (Perfil(usuario_id=usuario_id,
+                                       cedula=f'{rnd.randint(0, 9999999999):010d}',
+                                       telefono=f'09{rnd.randint(0, 99999999):08d}',
+                                       rol=rnd.choice(ROLES))
+                                for usuario_id in ids))
+        return ids
+
+    def generar_prestamos(self, cantidad, libros, usuarios):
+        rnd = self.rnd
+
+        def filas():
+            for _ in range(cantidad):
+                fecha = self._fecha()
+                fecha_max = fecha + timedelta(days=rnd.choice((7, 14, 21)))
+                # Los préstamos antiguos casi siempre están devueltos
+                devuelto = (self.hoy - fecha).days > 30 or rnd.random() < 0.5
+                devolucion = fecha + timedelta(days=rnd.randint(1, 30)) if devuelto else None
+                if devolucion and devolucion > self.hoy:
+                    devolucion = self.hoy
+                yield Prestamo(libro_id=rnd.choice(libros), usuario_id=rnd.choice(usuarios),
+                               fecha_prestamos=fecha, fecha_max=fecha_max, fecha_devolucion=devolucion)
+        return self._insertar(Prestamo, filas(), array('q'))
+
+    def generar_multas(self, cantidad, prestamos):
+        rnd = self.rnd
+        montos = {'r': None, 'p': Decimal('20.00'), 'd': Decimal('10.00')}
+
+        def filas():
+            for _ in range(cantidad):
+                tipo = rnd.choice('rrrrrrpd')
+                monto = montos[tipo] or Decimal(2 * rnd.randint(1, 20))
+                yield Multa(prestamo_id=rnd.choice(prestamos), tipo=tipo, monto=monto,
+                            pagada=rnd.random() < 0.7, fecha=self._fecha())
+        self._insertar(Multa, filas())
+
+    def generar_solicitudes(self, cantidad, libros, usuarios):
+        rnd = self.rnd
+        ahora = timezone.now()
+
+        def filas():
+            for _ in range(cantidad):
+                fecha = ahora - timedelta(minutes=rnd.randint(0, 730 * 24 * 60))
+                estado = rnd.choice(('aprobada', 'aprobada', 'aprobada', 'rechazada', 'pendiente'))
+                yield SolicitudPrestamo(libro_id=rnd.choice(libros), usuario_id=rnd.choice(usuarios),
+                                        dias_solicitados=rnd.choice((7, 14, 21)), fecha_solicitud=fecha,
+                                        estado=estado,
+                                        fecha_respuesta=None if estado == 'pendiente' else fecha + timedelta(hours=4))
+        self._insertar(SolicitudPrestamo, filas())
+
+    def generar_registros(self, cantidad, usuarios):
+        rnd = self.rnd
+        ahora = timezone.now()
+
+        def filas():
+            for _ in range(cantidad):
+                tipo = rnd.choice(TIPOS_LOG)
+                yield RegistroActividad(usuario_id=rnd.choice(usuarios), tipo_accion=tipo,
+                                        fecha_hora=ahora - timedelta(seconds=rnd.randint(0, 730 * 86400)),
+                                        descripcion=f'Acción sintética: {tipo}',
+                                        direccion_ip=f'192.168.{rnd.randint(0, 255)}.{rnd.randint(1, 254)}',
+                                        url='/')
+        self._insertar(RegistroActividad, filas())
@@ -0,0 +1,265 @@
+import json
+import math
+import os
+import re
+import resource
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from gestion import urls as gestion_urls
+from gestion.models import Autor, Libro, Multa, Perfil, Prestamo, SolicitudPrestamo
+from gestion.replica import REPLICA, replica_disponible
+
+# Rutas que modifican datos con GET, cierran la sesión o dependen de OpenLibrary
+EXCLUIDAS = {'logout', 'pagar_multa', 'renovar_prestamo'}
+EXTERNAS = {'api_buscar_libros', 'api_buscar_autores'}
+
+# Modelo del que se toma un id existente para cada parámetro de la URL
+PARAMETROS = {
+    'prestamo_id': Prestamo,
+    'multa_id': Multa,
+    'solicitud_id': SolicitudPrestamo,
+    'user_id': User,
+}
+# Parámetros que no son un id: (modelo, campo) de donde se toma un valor existente, o un valor fijo
+CAMPOS = {'codigo': (Libro, 'isbn')}
+FIJOS = {'tipo': 'libros'}
+# Rutas que sin parámetros GET responden 400: {libro} es el último libro, {libros} los últimos 20
+CONSULTAS = {
+    'api_v1_disponibilidad': 'ids={libros}',
+    'api_v1_disponibilidad_sucursales': 'ids={libros}',
+    'escanear_codigo': 'libro={libro}',
+}
+PREFIJOS = {
+    'libros/': Libro,
+    'autores/': Autor,
+    'prestamos/': Prestamo,
+    'api/v1/libros/': Libro,
+    'api/v1/autores/': Autor,
+    'api/v1/prestamos/': Prestamo,
+    'api/v1/solicitudes/': SolicitudPrestamo,
+}
+# Ruta de la API v1 -> vista HTML con los mismos datos (para comparar el rendimiento)
+EQUIVALENTES = {
+    'api_v1_libros': 'lista_libros',
+    'api_v1_libros_detalle': 'detalle_libro',
+    'api_v1_autores': 'lista_autores',
+    'api_v1_autores_detalle': 'detalle_autor',
+    'api_v1_prestamos': 'lista_prestamos',
+    'api_v1_prestamos_detalle': 'detalle_prestamo',
+    'api_v1_solicitudes': 'lista_solicitudes',
+}
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano sobre una lista ya ordenada"""
+    if not valores:
+        return 0.0
+    indice = max(0, min(len(valores) - 1, math.ceil(p / 100 * len(valores)) - 1))
+    return valores[indice]
+
+
+def rss_kb():
+    """Memoria residente actual del proceso (KiB)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Command(BaseCommand):
+    help = 'Recorre todas las URL de gestion con el cliente de pruebas y mide latencia, consultas y memoria'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrencia', default='1,4,8',
+                            help='Niveles de concurrencia separados por coma')
+        parser.add_argument('--repeticiones', type=int, default=20,
+                            help='Peticiones por URL y por hilo en cada nivel')
+        parser.add_argument('--rol', default='superusuario',
+                            help="Rol del usuario con el que se navega ('anonimo' para visitante)")
+        parser.add_argument('--solo', default='',
+                            help='Medir solo estas rutas (nombres separados por coma)')
+        parser.add_argument('--incluir-externas', action='store_true',
+                            help='Incluir las rutas que consultan OpenLibrary')
+        parser.add_argument('--salida', default='benchmark.json', help='Archivo JSON de resultados')
+        parser.add_argument('--comparar', default='', help='JSON de una ejecución anterior para comparar')
+
+    def handle(self, *args, **options):
+        niveles = [int(n) for n in options['concurrencia'].split(',') if n]
+        solo = {n for n in options['solo'].split(',') if n}
+        self.usuario, creado = self.usuario_de_prueba(options['rol'])
+        try:
+            resultados = self.recorrer(options, niveles, solo)
+        finally:
+            # La cuenta de prueba no queda en la base en la que se midió
+            if creado:
+                self.usuario.delete()
+
+        informe = {
+            'fecha': timezone.now().isoformat(),
+            'rol': options['rol'],
+            'repeticiones': options['repeticiones'],
+            'conteos': {m.__name__: m.objects.count() for m in (Libro, Autor, Prestamo, Multa, SolicitudPrestamo)},
+            'resultados': resultados,
+        }
+        with open(options['salida'], 'w', encoding='utf-8') as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['salida']}"))
+
+        self.comparar_api(resultados)
+        if options['comparar']:
+            self.comparar(options['comparar'], informe)
+
+    def recorrer(self, options, niveles, solo):
+        """Mide cada URL en cada nivel de concurrencia: {nombre: {'url', 'niveles'}}"""
+        resultados = {}
+        for nombre, url in self.urls(options['incluir_externas'], solo):
+            resultados[nombre] = {'url': url, 'niveles': {}}
+            for nivel in niveles:
+                medida = self.medir(url, nivel, options['repeticiones'])
+                resultados[nombre]['niveles'][str(nivel)] = medida
+                self.stdout.write(f"{nombre:<24} c={nivel:<3} p50={medida['p50_ms']:8.2f} ms "
+                                  f"p95={medida['p95_ms']:8.2f} ms p99={medida['p99_ms']:8.2f} ms "
+                                  f"q={medida['consultas']:6.1f} rps={medida['rps']:8.1f} "
+                                  f"rss={medida['rss_kb'] // 1024} MiB")
+        return resultados
+
+    def usuario_de_prueba(self, rol):
+        """(usuario, creado); el cliente entra con force_login, así que no necesita contraseña"""
+        if rol == 'anonimo':
+            return None, False
+        usuario, creado = User.objects.get_or_create(username=f'bench_{rol}')
+        if usuario.has_usable_password():
+            usuario.set_unusable_password()
+            usuario.save(update_fields=['password'])
+        Perfil.objects.update_or_create(usuario=usuario, defaults={'cedula': '0000000000',
+                                                                   'telefono': '0000000000', 'rol': rol})
+        return usuario, creado
+
+    def urls(self, incluir_externas, solo):
+        """Construye la URL de cada patrón de gestion/urls.py con ids existentes"""
+        ultimos = list(Libro.objects.order_by('-pk').values_list('pk', flat=True)[:20])
+        consulta = {'libro': ultimos[0] if ultimos else '', 'libros': ','.join(map(str, ultimos))}
+        for patron in gestion_urls.urlpatterns:
+            nombre = patron.name
+            if nombre in EXCLUIDAS or (nombre in EXTERNAS and not incluir_externas):
+                continue
+            if solo and nombre not in solo:
+                continue
+            ruta = str(patron.pattern)
+            valores = {}
+            for parametro in patron.pattern.converters:
+                if parametro in FIJOS:
+                    valores[parametro] = FIJOS[parametro]
+                    continue
+                if parametro in CAMPOS:
+                    modelo, campo = CAMPOS[parametro]
+                else:
+                    modelo, campo = PARAMETROS.get(parametro), 'pk'
+                    if modelo is None:
+                        modelo = next((m for prefijo, m in PREFIJOS.items() if ruta.startswith(prefijo)), None)
+                valor = (modelo.objects.exclude(**{f'{campo}__isnull': True}).order_by('-pk')
+                         .values_list(campo, flat=True).first() if modelo else None)
+                if valor is None:
+                    break
+                valores[parametro] = valor
+            else:
+                # Cualquier conversor: <int:id>, <str:codigo>, <slug:...>
+                url = '/' + re.sub(r'<(?:\w+:)?(\w+)>', lambda m: str(valores[m.group(1)]), ruta)
+                if nombre in EXTERNAS:
+                    url += '?q=quijote'
+                elif nombre in CONSULTAS:
+                    url += '?' + CONSULTAS[nombre].format(**consulta)
+                yield nombre, url
+
+    def cliente(self):
+        cliente = Client(HTTP_HOST='localhost')
+        if self.usuario is not None:
+            cliente.force_login(self.usuario)
+        return cliente
+
+    def trabajador(self, url, repeticiones, en_hilo=True):
+        """Hace las peticiones de un hilo; retorna latencias, consultas y errores"""
+        cliente = self.cliente()
+        # No abrir la réplica si todavía no existe (se crearía un archivo vacío)
+        aliases = [DEFAULT_DB_ALIAS] + ([REPLICA] if replica_disponible() else [])
+        latencias, consultas, errores = [], 0, 0
+        for _ in range(repeticiones):
+            # El registro de consultas tiene un tope (9000): si se llena, la captura cuenta 0
+            for alias in aliases:
+                connections[alias].queries_log.clear()
+            capturas = [CaptureQueriesContext(connections[alias]) for alias in aliases]
+            for captura in capturas:
+                captura.__enter__()
+            inicio = time.perf_counter()
+            respuesta = cliente.get(url)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            for captura in capturas:
+                captura.__exit__(None, None, None)
+            consultas += sum(len(captura) for captura in capturas)
+            # Una respuesta 4xx tampoco mide la página: cuenta como error
+            if respuesta.status_code >= 400:
+                errores += 1
+        if en_hilo:
+            for alias in aliases:
+                connections[alias].close()
+        return latencias, consultas, errores
+
+    def medir(self, url, nivel, repeticiones):
+        inicio = time.perf_counter()
+        if nivel == 1:
+            partes = [self.trabajador(url, repeticiones, en_hilo=False)]
+        else:
+            with ThreadPoolExecutor(max_workers=nivel) as ejecutor:
+                partes = list(ejecutor.map(lambda _: self.trabajador(url, repeticiones), range(nivel)))
+        total = time.perf_counter() - inicio
+
+        latencias = sorted(l for parte in partes for l in parte[0])
+        return {
+            'peticiones': len(latencias),
+            'p50_ms': round(percentil(latencias, 50), 3),
+            'p95_ms': round(percentil(latencias, 95), 3),
+            'p99_ms': round(percentil(latencias, 99), 3),
+            'rps': round(len(latencias) / total, 1) if total else 0.0,
+            'consultas': round(sum(p[1] for p in partes) / len(latencias), 1) if latencias else 0.0,
+            'errores': sum(p[2] for p in partes),
+            'rss_kb': rss_kb(),
+        }
+
+    def comparar(self, archivo, actual):
+        with open(archivo, encoding='utf-8') as f:
+            anterior = json.load(f)
+        self.stdout.write(f'\nComparación con {archivo} (p95, negativo = más rápido):')
+        for nombre, datos in actual['resultados'].items():
+            previos = anterior.get('resultados', {}).get(nombre, {}).get('niveles', {})
+            for nivel, medida in datos['niveles'].items():
+                if nivel not in previos:
+                    continue
+                antes = previos[nivel]['p95_ms']
+                cambio = (medida['p95_ms'] - antes) / antes * 100 if antes else 0.0
+                self.stdout.write(f"{nombre:<24} c={nivel:<3} {antes:8.2f} -> {medida['p95_ms']:8.2f} ms "
+                                  f"({cambio:+.1f}%)  consultas {previos[nivel]['consultas']} -> {medida['consultas']}")
+
+    def comparar_api(self, resultados):
+        """Peticiones por segundo de cada ruta de la API frente a su vista HTML"""
+        pares = [(api, html) for api, html in EQUIVALENTES.items() if api in resultados and html in resultados]
+        if not pares:
+            return
+        self.stdout.write('\nAPI v1 frente a HTML (rps, p95):')
+        for api, html in pares:
+            for nivel, medida in resultados[api]['niveles'].items():
+                referencia = resultados[html]['niveles'].get(nivel)
+                if not referencia:
+                    continue
+                veces = medida['rps'] / referencia['rps'] if referencia['rps'] else 0.0
+                self.stdout.write(f"{api:<26} c={nivel:<3} {referencia['rps']:8.1f} -> {medida['rps']:8.1f} rps "
+                                  f"(x{veces:.1f})  p95 {referencia['p95_ms']:.2f} -> {medida['p95_ms']:.2f} ms")
+
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from gestion.resumenes import reiniciar, resumir
+
+
+class Command(BaseCommand):
+    help = 'Suma las filas nuevas (préstamos, actividad, multas...) a los resúmenes diarios'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reiniciar', action='store_true',
+                            help='Borrar los resúmenes y recalcular todo el historial')
+        parser.add_argument('--lote', type=int, default=50000, help='Ids por bloque (una transacción por bloque)')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        if options['reiniciar']:
+            reiniciar()
+        for fuente, filas in resumir(options['lote']).items():
+            self.stdout.write(f'{fuente:>12}: {filas:>10,} filas nuevas')
+        self.stdout.write(self.style.SUCCESS(f'Resúmenes actualizados en {time.perf_counter() - inicio:.1f} s'))
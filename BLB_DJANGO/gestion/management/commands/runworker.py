@@ -0,0 +1,56 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from gestion.tareas import nombre_trabajador, purgar, trabajar
+
+
+def _proceso(una_vez, espera):
+    """Un worker: termina la tarea en curso y sale al recibir SIGTERM/SIGINT"""
+    import django
+    from django.apps import apps
+    if not apps.ready:  # con spawn el hijo arranca sin Django cargado
+        django.setup()
+    detener = []
+    for senal in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(senal, lambda *_: detener.append(True))
+    return trabajar(nombre_trabajador(), una_vez=una_vez, espera=espera, seguir=lambda: not detener)
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta las tareas de la cola (gestion/tareas.py) con N procesos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=1, help='Procesos worker en paralelo')
+        parser.add_argument('--una-vez', action='store_true', help='Salir cuando la cola quede vacía')
+        parser.add_argument('--espera', type=float, default=1.0, help='Segundos entre consultas con la cola vacía')
+        parser.add_argument('--conservar-dias', type=int, default=7,
+                            help='Al arrancar, borra las tareas terminadas hace más de estos días')
+
+    def handle(self, *args, **options):
+        if options['procesos'] < 1:
+            raise CommandError('--procesos debe ser al menos 1')
+        borradas = purgar(options['conservar_dias'])
+        if borradas:
+            self.stdout.write(f'{borradas} tareas terminadas borradas')
+        self.stdout.write(f"Worker con {options['procesos']} proceso(s) (Ctrl+C para detener)")
+
+        if options['procesos'] == 1:
+            ejecutadas = _proceso(options['una_vez'], options['espera'])
+            self.stdout.write(self.style.SUCCESS(f'{ejecutadas} tareas ejecutadas'))
+            return
+
+        # Los hijos no deben heredar la conexión abierta del padre
+        connections.close_all()
+        hijos = [multiprocessing.Process(target=_proceso, args=(options['una_vez'], options['espera']))
+                 for _ in range(options['procesos'])]
+        for hijo in hijos:
+            hijo.start()
+        # El padre solo reenvía la señal; cada hijo acaba su tarea antes de salir
+        signal.signal(signal.SIGTERM, lambda *_: [hijo.terminate() for hijo in hijos if hijo.is_alive()])
+        signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C ya llega a todo el grupo de procesos
+        for hijo in hijos:
+            hijo.join()
+        self.stdout.write(self.style.SUCCESS('Workers detenidos'))
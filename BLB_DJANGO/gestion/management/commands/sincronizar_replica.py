@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from gestion.replica import sincronizar_replica
+
+
+class Command(BaseCommand):
+    help = 'Copia db.sqlite3 sobre la réplica de solo lectura (una vez o cada N segundos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cada', type=float, default=0,
+                            help='Repetir la sincronización cada N segundos (0 = una sola vez)')
+
+    def handle(self, *args, **options):
+        cada = options['cada']
+        while True:
+            segundos = sincronizar_replica()
+            self.stdout.write(f'Réplica sincronizada en {segundos * 1000:.1f} ms')
+            if not cada:
+                break
+            time.sleep(cada)
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:43
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# Copia de gestion.normalizacion (normalizar y clave_autor) tal como era al
+# escribir la migración: el código vivo puede cambiar y la migración no debe hacerlo.
+_RE_SEPARADORES = re.compile(r'[\W_]+')
+
+
+def normalizar(texto):
+    texto = unicodedata.normalize('NFKD', (texto or '').casefold())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return _RE_SEPARADORES.sub(' ', texto).strip()
+
+
+def clave_autor(nombre, apellido=''):
+    palabras = []
+    iniciales = ''
+    for palabra in normalizar(f'{nombre} {apellido}').split():
+        if len(palabra) == 1:
+            iniciales += palabra
+            continue
+        if iniciales:
+            palabras.append(iniciales)
+            iniciales = ''
+        palabras.append(palabra)
+    if iniciales:
+        palabras.append(iniciales)
+    return ' '.join(sorted(palabras))
+
+
+def calcular_claves(apps, schema_editor):
+    """Llena clave_normalizada de los autores existentes, por lotes"""
+    Autor = apps.get_model('gestion', 'Autor')
+    lote = []
+    for autor in Autor.objects.only('id', 'nombre', 'apellido').iterator(chunk_size=2000):
+        autor.clave_normalizada = clave_autor(autor.nombre, autor.apellido)
+        lote.append(autor)
+        if len(lote) >= 2000:
+            Autor.objects.bulk_update(lote, ['clave_normalizada'])
+            lote = []
+    if lote:
+        Autor.objects.bulk_update(lote, ['clave_normalizada'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0012_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='autor',
+            name='clave_normalizada',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=200),
+        ),
+        migrations.RunPython(calcular_claves, migrations.RunPython.noop),
+    ]
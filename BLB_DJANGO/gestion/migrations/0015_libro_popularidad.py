@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:49
+
+import math
+from datetime import datetime, time
+
+from django.db import migrations, models
+from django.utils import timezone
+
+# Copia de gestion.popularidad tal como era al escribir la migración: el código
+# vivo (y su modelo Libro) puede cambiar y la migración no debe hacerlo.
+EPOCA = datetime(2024, 1, 1, tzinfo=timezone.get_fixed_timezone(0))
+ESCALAS = {'popularidad': 30.0, 'tendencia': 3.0}
+PESO_PRESTAMO = 1.0
+PESO_SOLICITUD = 0.5
+
+
+def logaritmo(peso, cuando, vida_media):
+    if not isinstance(cuando, datetime):
+        cuando = datetime.combine(cuando, time(12), tzinfo=timezone.get_current_timezone())
+    dias = (cuando - EPOCA).total_seconds() / 86400
+    return math.log(peso) + math.log(2) * dias / vida_media
+
+
+def calcular_puntajes(apps, schema_editor, lote=2000):
+    """Puntajes iniciales a partir de los préstamos y solicitudes existentes"""
+    Libro = apps.get_model('gestion', 'Libro')
+    Prestamo = apps.get_model('gestion', 'Prestamo')
+    SolicitudPrestamo = apps.get_model('gestion', 'SolicitudPrestamo')
+    eventos = [(Prestamo.objects.order_by().values_list('libro_id', 'fecha_prestamos'), PESO_PRESTAMO),
+               (SolicitudPrestamo.objects.order_by().values_list('libro_id', 'fecha_solicitud'), PESO_SOLICITUD)]
+    puntajes = {}
+    for filas, peso in eventos:
+        for libro_id, cuando in filas.iterator(chunk_size=5000):
+            actuales = puntajes.setdefault(libro_id, {})
+            for campo, vida_media in ESCALAS.items():
+                nuevo = logaritmo(peso, cuando, vida_media)
+                previo = actuales.get(campo)
+                # ln(e^a + e^b) = max(a, b) + ln(1 + e^-|a - b|)
+                actuales[campo] = nuevo if previo is None else (
+                    max(previo, nuevo) + math.log1p(math.exp(-abs(previo - nuevo))))
+    Libro.objects.update(**{campo: 0.0 for campo in ESCALAS})
+    Libro.objects.bulk_update([Libro(id=libro_id, **valores) for libro_id, valores in puntajes.items()],
+                              list(ESCALAS), batch_size=lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0014_recomendaciones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='libro',
+            name='popularidad',
+            field=models.FloatField(db_index=True, default=0.0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='libro',
+            name='tendencia',
+            field=models.FloatField(db_index=True, default=0.0, editable=False),
+        ),
+        migrations.RunPython(calcular_puntajes, migrations.RunPython.noop),
+    ]
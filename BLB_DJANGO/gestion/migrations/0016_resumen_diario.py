@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0015_libro_popularidad'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('metrica', models.CharField(max_length=30)),
+                ('dimension', models.CharField(blank=True, default='', max_length=50)),
+                ('valor', models.FloatField(default=0)),
+            ],
+            options={
+                'ordering': ['fecha'],
+                'constraints': [models.UniqueConstraint(fields=('metrica', 'dimension', 'fecha'), name='resumen_metrica_dimension_fecha')],
+            },
+        ),
+    ]
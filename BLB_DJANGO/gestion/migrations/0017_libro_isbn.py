@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0016_resumen_diario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='libro',
+            name='isbn',
+            field=models.CharField(blank=True, max_length=13, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='perfil',
+            name='cedula',
+            field=models.CharField(db_index=True, max_length=13),
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:12
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def crear_ejemplares(apps, schema_editor, lote=2000):
+    """
+    Un ejemplar por unidad de stock y uno prestado por cada préstamo abierto.
+    Copia de gestion.inventario.expandir_stock tal como era al escribir la
+    migración: el código vivo puede cambiar y la migración no debe hacerlo.
+    """
+    Libro = apps.get_model('gestion', 'Libro')
+    Prestamo = apps.get_model('gestion', 'Prestamo')
+    Ejemplar = apps.get_model('gestion', 'Ejemplar')
+    con_ejemplares = set(Ejemplar.objects.values_list('libro_id', flat=True).distinct())
+    Libro.objects.filter(stock__lt=0).update(stock=0)
+    # disponible pasa a seguir al stock (antes se editaban por separado)
+    Libro.objects.update(disponible=models.Case(models.When(stock__gt=0, then=models.Value(True)),
+                                                default=models.Value(False)))
+    numeros = defaultdict(int)
+
+    filas = []
+    for libro_id, stock in Libro.objects.order_by('id').values_list('id', 'stock').iterator(chunk_size=lote):
+        if libro_id in con_ejemplares:
+            continue
+        for _ in range(stock):
+            numeros[libro_id] += 1
+            n = numeros[libro_id]
+            filas.append(Ejemplar(libro_id=libro_id, numero=n, codigo_barras=f'EJ-{libro_id}-{n}',
+                                  estado='disponible'))
+        if len(filas) >= lote:
+            Ejemplar.objects.bulk_create(filas, batch_size=lote)
+            filas = []
+    Ejemplar.objects.bulk_create(filas, batch_size=lote)
+
+    pendientes = list(Prestamo.objects.filter(fecha_devolucion__isnull=True, ejemplar__isnull=True)
+                      .exclude(libro_id__in=con_ejemplares).order_by('id').values_list('id', 'libro_id'))
+    for inicio in range(0, len(pendientes), lote):
+        bloque = pendientes[inicio:inicio + lote]
+        filas = []
+        for _, libro_id in bloque:
+            numeros[libro_id] += 1
+            n = numeros[libro_id]
+            filas.append(Ejemplar(libro_id=libro_id, numero=n, codigo_barras=f'EJ-{libro_id}-{n}',
+                                  estado='prestado'))
+        # bulk_create devuelve los ids (RETURNING) en el mismo orden
+        ejemplares = Ejemplar.objects.bulk_create(filas, batch_size=lote)
+        Prestamo.objects.bulk_update([Prestamo(id=prestamo_id, ejemplar_id=ejemplar.id)
+                                      for (prestamo_id, _), ejemplar in zip(bloque, ejemplares)],
+                                     ['ejemplar'], batch_size=lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0017_libro_isbn'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ejemplar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.PositiveIntegerField()),
+                ('codigo_barras', models.CharField(max_length=30, unique=True)),
+                ('estado', models.CharField(choices=[('disponible', 'Disponible'), ('prestado', 'Prestado'), ('baja', 'Dado de baja')], default='disponible', max_length=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('libro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ejemplares', to='gestion.libro')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='prestamo',
+            name='ejemplar',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='prestamos', to='gestion.ejemplar'),
+        ),
+        migrations.AddIndex(
+            model_name='ejemplar',
+            index=models.Index(fields=['libro', 'estado'], name='ejemplar_libro_estado'),
+        ),
+        migrations.AddConstraint(
+            model_name='ejemplar',
+            constraint=models.UniqueConstraint(fields=('libro', 'numero'), name='ejemplar_libro_numero'),
+        ),
+        migrations.RunPython(crear_ejemplares, migrations.RunPython.noop),
+    ]
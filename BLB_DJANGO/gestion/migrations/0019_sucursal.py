@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0018_ejemplar'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sucursal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True)),
+                ('direccion', models.CharField(blank=True, max_length=200)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='ejemplar',
+            name='ejemplar_libro_estado',
+        ),
+        migrations.AddField(
+            model_name='ejemplar',
+            name='sucursal',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ejemplares', to='gestion.sucursal'),
+        ),
+        migrations.AddField(
+            model_name='perfil',
+            name='sucursal',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='perfiles', to='gestion.sucursal'),
+        ),
+        migrations.AddField(
+            model_name='prestamo',
+            name='sucursal',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='prestamos', to='gestion.sucursal'),
+        ),
+        migrations.AddField(
+            model_name='solicitudprestamo',
+            name='sucursal',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='solicitudes', to='gestion.sucursal'),
+        ),
+        migrations.AddIndex(
+            model_name='ejemplar',
+            index=models.Index(fields=['libro', 'estado', 'sucursal'], name='ejemplar_libro_estado_suc'),
+        ),
+        migrations.AddIndex(
+            model_name='prestamo',
+            index=models.Index(fields=['sucursal', 'fecha_devolucion'], name='prestamo_sucursal_devolucion'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitudprestamo',
+            index=models.Index(fields=['sucursal', 'estado'], name='solicitud_sucursal_estado'),
+        ),
+    ]
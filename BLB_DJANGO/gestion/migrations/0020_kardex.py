@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:36
+
+from datetime import timedelta
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def foto_inicial(apps, schema_editor, lote=2000):
+    """El stock actual como foto de ayer: el kardex empieza a contar desde aquí"""
+    # Copia de gestion.kardex.sembrar_fotos tal como era al escribir la migración:
+    # el código vivo puede cambiar y la migración no debe hacerlo.
+    Libro = apps.get_model('gestion', 'Libro')
+    FotoStock = apps.get_model('gestion', 'FotoStock')
+    MovimientoStock = apps.get_model('gestion', 'MovimientoStock')
+    fecha = timezone.localdate() - timedelta(days=1)
+    sin_historia = (Libro.objects.exclude(id__in=FotoStock.objects.values('libro_id'))
+                    .exclude(id__in=MovimientoStock.objects.values('libro_id')))
+    pendientes = []
+    for libro_id, stock in sin_historia.order_by('id').values_list('id', 'stock').iterator(chunk_size=lote):
+        pendientes.append(FotoStock(libro_id=libro_id, fecha=fecha, stock=stock))
+        if len(pendientes) >= lote:
+            FotoStock.objects.bulk_create(pendientes)
+            pendientes = []
+    FotoStock.objects.bulk_create(pendientes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0019_sucursal'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FotoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('stock', models.IntegerField()),
+                ('libro', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='fotos_stock', to='gestion.libro')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('libro', 'fecha'), name='foto_libro_fecha')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MovimientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField()),
+                ('motivo', models.CharField(choices=[('prestamo', 'Préstamo'), ('devolucion', 'Devolución'), ('alta', 'Alta de ejemplares'), ('baja', 'Baja de ejemplares'), ('ajuste', 'Ajuste de inventario'), ('conciliacion', 'Conciliación')], max_length=15)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('libro', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='gestion.libro')),
+                ('usuario', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos_stock', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['libro', 'fecha'], name='movimiento_libro_fecha'), models.Index(fields=['fecha'], name='movimiento_fecha')],
+            },
+        ),
+        migrations.RunPython(foto_inicial, migrations.RunPython.noop),
+    ]
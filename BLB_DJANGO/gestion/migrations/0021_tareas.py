@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:43
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def marcar_logs(apps, schema_editor):
+    """Lo registrado hasta ahora ya está en logs.txt: la tarea volcar_logs sigue desde aquí"""
+    ultimo = apps.get_model('gestion', 'RegistroActividad').objects.aggregate(ultimo=Max('id'))['ultimo']
+    apps.get_model('gestion', 'MarcaProceso').objects.update_or_create(nombre='logs.txt',
+                                                                       defaults={'ultimo_id': ultimo or 0})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0020_kardex'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100)),
+                ('argumentos', models.JSONField(default=dict)),
+                ('clave', models.CharField(blank=True, max_length=100, null=True)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_curso', 'En curso'), ('hecha', 'Hecha'), ('fallida', 'Fallida')], default='pendiente', max_length=10)),
+                ('ejecutar_en', models.DateTimeField(default=django.utils.timezone.now)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('max_intentos', models.PositiveIntegerField(default=5)),
+                ('trabajador', models.CharField(blank=True, default='', max_length=100)),
+                ('bloqueada_hasta', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('creada', models.DateTimeField(default=django.utils.timezone.now)),
+                ('terminada', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'ejecutar_en'], name='tarea_estado_ejecutar')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('estado', 'pendiente')), fields=('clave',), name='tarea_clave_pendiente')],
+            },
+        ),
+        migrations.RunPython(marcar_logs, migrations.RunPython.noop),
+    ]
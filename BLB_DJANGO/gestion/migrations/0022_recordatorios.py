@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:46
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0021_tareas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordatorioEnviado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('proximo', 'Por vencer'), ('vencido', 'Vencido')], max_length=10)),
+                ('vence', models.DateField()),
+                ('enviado', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='prestamo',
+            index=models.Index(condition=models.Q(('fecha_devolucion__isnull', True)), fields=['fecha_max'], name='prestamo_abierto_vence'),
+        ),
+        migrations.AddField(
+            model_name='recordatorioenviado',
+            name='prestamo',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recordatorios', to='gestion.prestamo'),
+        ),
+        migrations.AddConstraint(
+            model_name='recordatorioenviado',
+            constraint=models.UniqueConstraint(fields=('prestamo', 'tipo', 'vence'), name='recordatorio_unico'),
+        ),
+    ]
@@ -3,6 +3,8 @@ from django.conf import settings
 from django.utils import timezone
 from django.contrib.auth.models import User
 
+from .normalizacion import clave_autor, normalizar_isbn
+
 # Create your models here.
 
 #clases
@@ -17,11 +19,30 @@ class Autor(models.Model):
     nombre = models.CharField(max_length=150)
     apellido = models.CharField(max_length=50)
     bibliografia = models.CharField(max_length=200, blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # Para ETag / Last-Modified
+    # Nombre normalizado para encontrar duplicados ("J.R.R. Tolkien" = "J. R. R. Tolkien")
+    clave_normalizada = models.CharField(max_length=200, db_index=True, editable=False, default='')
     
     # definir el nombre del objeto osea el que se va a mostrar cuando se consulte un objeto de esta clase
     def __str__(self): #definimos que sea tipo string
         return f"{self.nombre} {self.apellido}" #devolvemos el nombre y apellido del autor como nombre del objeto
+
+    def save(self, *args, **kwargs):
+        self.clave_normalizada = clave_autor(self.nombre, self.apellido)
+        campos = kwargs.get('update_fields')
+        if campos is not None and {'nombre', 'apellido'} & set(campos):
+            kwargs['update_fields'] = {*campos, 'clave_normalizada'}
+        super().save(*args, **kwargs)
     
+class Sucursal(models.Model):
+    """Sede de la biblioteca. Sin sucursales (o con NULL) todo es de una sola sede"""
+    nombre = models.CharField(max_length=100, unique=True)
+    direccion = models.CharField(max_length=200, blank=True)
+
+    def __str__(self):
+        return self.nombre
+
+
 class Libro(models.Model):
     titulo = models.CharField(max_length=200)
     autor = models.ForeignKey(Autor, related_name="libros", on_delete=models.PROTECT)
@@ -31,13 +52,111 @@ class Libro(models.Model):
     stock = models.IntegerField(default=1)
     anio_publicacion = models.IntegerField(blank=True, null=True)  # Año de publicación
     es_de_openlibrary = models.BooleanField(default=False)  # Si viene de OpenLibrary
+    # ISBN-13 normalizado (los ISBN-10 se convierten); índice único para buscar por código escaneado
+    isbn = models.CharField(max_length=13, unique=True, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # Para ETag / Last-Modified
+    # Puntajes con decaimiento en escala logarítmica (ver gestion/popularidad.py)
+    popularidad = models.FloatField(default=0.0, db_index=True, editable=False)
+    tendencia = models.FloatField(default=0.0, db_index=True, editable=False)
     
     def __str__(self):
         return f"{self.titulo} - {self.autor.nombre} {self.autor.apellido}" #devolvemos el titulo del libro y el nombre del autor como nombre del objeto
+
+    def save(self, *args, **kwargs):
+        # Sin ISBN (o inválido) queda NULL: el índice único admite varios NULL
+        self.isbn = normalizar_isbn(self.isbn)
+        nuevo = self._state.adding
+        super().save(*args, **kwargs)
+        # Un libro nuevo nace con un ejemplar por unidad de stock; después el
+        # stock solo cambia desde gestion/inventario.py
+        if nuevo and self.stock > 0:
+            Ejemplar.objects.bulk_create([Ejemplar(libro=self, numero=n, codigo_barras=Ejemplar.codigo(self.pk, n))
+                                          for n in range(1, self.stock + 1)])
+            MovimientoStock.objects.create(libro=self, delta=self.stock, motivo='alta')
+
+
+class Ejemplar(models.Model):
+    """Copia física de un libro; Libro.stock cuenta las que están disponibles"""
+    ESTADOS = (
+        ('disponible', 'Disponible'),
+        ('prestado', 'Prestado'),
+        ('baja', 'Dado de baja'),
+    )
+
+    libro = models.ForeignKey(Libro, related_name="ejemplares", on_delete=models.CASCADE)
+    # Sede donde está la copia (el índice compuesto de abajo la cubre)
+    sucursal = models.ForeignKey(Sucursal, related_name="ejemplares", on_delete=models.PROTECT,
+                                 blank=True, null=True, db_index=False)
+    numero = models.PositiveIntegerField()  # correlativo dentro del libro
+    codigo_barras = models.CharField(max_length=30, unique=True)
+    estado = models.CharField(max_length=10, choices=ESTADOS, default='disponible')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['libro', 'numero'], name='ejemplar_libro_numero')]
+        # Prestar busca "un ejemplar disponible de este libro (en esta sucursal)" y la
+        # disponibilidad por sucursal agrupa por las mismas columnas
+        indexes = [models.Index(fields=['libro', 'estado', 'sucursal'], name='ejemplar_libro_estado_suc')]
+
+    def __str__(self):
+        return f"{self.codigo_barras} ({self.get_estado_display()})"
+
+    @staticmethod
+    def codigo(libro_id, numero):
+        """Código de barras de la copia; el prefijo evita confundirlo con un ISBN o un id"""
+        return f"EJ-{libro_id}-{numero}"
+
+
+class MovimientoStock(models.Model):
+    """
+    Kardex: cada cambio de Libro.stock con su motivo y quién lo hizo. Solo se
+    agregan filas (gestion/kardex.py); el stock a una fecha sale de FotoStock.
+    """
+    MOTIVOS = (
+        ('prestamo', 'Préstamo'),
+        ('devolucion', 'Devolución'),
+        ('alta', 'Alta de ejemplares'),
+        ('baja', 'Baja de ejemplares'),
+        ('ajuste', 'Ajuste de inventario'),
+        ('conciliacion', 'Conciliación'),
+    )
+
+    libro = models.ForeignKey(Libro, related_name="movimientos", on_delete=models.CASCADE, db_index=False)
+    delta = models.IntegerField()
+    motivo = models.CharField(max_length=15, choices=MOTIVOS)
+    usuario = models.ForeignKey(User, related_name="movimientos_stock", on_delete=models.SET_NULL,
+                                blank=True, null=True, db_index=False)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # Stock de un libro a una fecha: foto más reciente + los movimientos desde entonces
+        indexes = [models.Index(fields=['libro', 'fecha'], name='movimiento_libro_fecha'),
+                   models.Index(fields=['fecha'], name='movimiento_fecha')]
+
+    def __str__(self):
+        return f"{self.libro_id} {self.delta:+d} ({self.motivo})"
+
+
+class FotoStock(models.Model):
+    """Stock de un libro al final de un día, para no recorrer todo el kardex (comando compactar_kardex)"""
+    libro = models.ForeignKey(Libro, related_name="fotos_stock", on_delete=models.CASCADE, db_index=False)
+    fecha = models.DateField()
+    stock = models.IntegerField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['libro', 'fecha'], name='foto_libro_fecha')]
+
+    def __str__(self):
+        return f"{self.libro_id} @ {self.fecha}: {self.stock}"
     
 class Prestamo(models.Model):
     # la relacion es muchos a uno, muchos prestamos pueden tener un libro
     libro = models.ForeignKey(Libro, related_name="prestamos", on_delete=models.PROTECT)
+    # Copia concreta que se llevó el usuario (NULL en préstamos cargados en bloque sin inventario)
+    ejemplar = models.ForeignKey(Ejemplar, related_name="prestamos", on_delete=models.PROTECT, blank=True, null=True)
+    # Sede del ejemplar prestado; las listas del personal de una sede filtran por aquí
+    sucursal = models.ForeignKey(Sucursal, related_name="prestamos", on_delete=models.PROTECT,
+                                 blank=True, null=True, db_index=False)
     usuario = models.ForeignKey(settings.AUTH_USER_MODEL, related_name="prestamos", on_delete=models.PROTECT)
     #settins.AUTH_USER_MODEL, es para referirse al modelo de usuario que este usando el proyecto, puede ser el default o uno custom
     fecha_prestamos = models.DateField(default=timezone.now)
@@ -50,6 +169,10 @@ class Prestamo(models.Model):
             ("Ver_prestamos", "Puede ver prestamos"),
             ("gestionar_prestamos", "Puede gestionar prestamos"),
         )
+        indexes = [models.Index(fields=['sucursal', 'fecha_devolucion'], name='prestamo_sucursal_devolucion'),
+                   # Préstamos abiertos por vencimiento (recordatorios): solo indexa los no devueltos
+                   models.Index(fields=['fecha_max'], condition=models.Q(fecha_devolucion__isnull=True),
+                                name='prestamo_abierto_vence')]
     
     def __str__(self):
         return f"prestamo de {self.libro} a {self.usuario}"
@@ -115,12 +238,16 @@ class SolicitudPrestamo(models.Model):
     respondido_por = models.ForeignKey(settings.AUTH_USER_MODEL, related_name="solicitudes_respondidas", 
                                         on_delete=models.SET_NULL, blank=True, null=True)
     motivo_rechazo = models.TextField(blank=True, null=True)
+    # Sede donde se retirará el libro (la del usuario por defecto)
+    sucursal = models.ForeignKey(Sucursal, related_name="solicitudes", on_delete=models.PROTECT,
+                                 blank=True, null=True, db_index=False)
     
     def __str__(self):
         return f"Solicitud de {self.usuario.username} - {self.libro.titulo} ({self.get_estado_display()})"
     
     class Meta:
         ordering = ['-fecha_solicitud']  # Las más recientes primero
+        indexes = [models.Index(fields=['sucursal', 'estado'], name='solicitud_sucursal_estado')]
 
 
 class Perfil(models.Model):
@@ -133,9 +260,11 @@ class Perfil(models.Model):
     )
     
     usuario = models.OneToOneField(User, on_delete=models.CASCADE)
-    cedula = models.CharField(max_length=13)
+    cedula = models.CharField(max_length=13, db_index=True)  # Se busca al escanear el carnet
     telefono = models.CharField(max_length=10)
     rol = models.CharField(max_length=20, choices=ROLES, default='usuario')
+    # Sede del usuario: el personal con sucursal solo ve los datos de esa sede
+    sucursal = models.ForeignKey(Sucursal, related_name="perfiles", on_delete=models.SET_NULL, blank=True, null=True)
     
     def __str__(self):
         return f"{self.usuario.username} - {self.get_rol_display()}"
@@ -184,10 +313,9 @@ def registrar_log(usuario, tipo_accion, descripcion, request=None, modelo=None,
     """
     Función auxiliar para registrar una actividad en el log.
     Uso: registrar_log(request.user, 'crear', 'Creó el libro: El Quijote', request, 'Libro', 1)
-    Guarda en la base de datos Y en el archivo logs.txt
+    Guarda en la base de datos; el worker lo añade a logs.txt unos segundos después
     """
-    import os
-    from datetime import datetime
+    from .tareas import encolar
     
     ip = None
     url = None
@@ -212,20 +340,123 @@ def registrar_log(usuario, tipo_accion, descripcion, request=None, modelo=None,
         objeto_id=objeto_id
     )
     
-    # Guardar en archivo de texto
-    try:
-        # Ruta al archivo de logs
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        logs_file = os.path.join(base_dir, 'docs_utiles', 'logs.txt')
-        
-        # Formatear la línea de log
-        fecha_hora = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
-        usuario_str = usuario.username if usuario and hasattr(usuario, 'username') else 'Anónimo'
-        linea_log = f"[{fecha_hora}] | Usuario: {usuario_str} | Acción: {tipo_accion.upper()} | {descripcion} | IP: {ip or '-'} | URL: {url or '-'}\n"
-        
-        # Escribir al archivo (append mode)
-        with open(logs_file, 'a', encoding='utf-8') as f:
-            f.write(linea_log)
-    except Exception as e:
-        # Si falla la escritura al archivo, no interrumpir el flujo
-        pass
\ No newline at end of file
+    # El archivo de texto lo escribe la tarea volcar_logs: una sola pendiente
+    # (misma clave) agrupa todos los registros de esos segundos en una escritura
+    encolar('volcar_logs', clave='volcar_logs', retraso=5)
+
+# =====================================================
+# RECOMENDACIONES ("otros lectores también pidieron")
+# =====================================================
+class Recomendacion(models.Model):
+    """Vecinos precalculados de cada libro (comando calcular_recomendaciones)"""
+    libro = models.ForeignKey(Libro, related_name="recomendaciones", on_delete=models.CASCADE)
+    recomendado = models.ForeignKey(Libro, related_name="+", on_delete=models.CASCADE)
+    puntaje = models.FloatField()
+    posicion = models.PositiveSmallIntegerField()  # 0 = el más parecido
+
+    class Meta:
+        ordering = ['libro', 'posicion']
+        constraints = [
+            # También es el índice con el que detalle_libro lee los vecinos en orden
+            models.UniqueConstraint(fields=['libro', 'posicion'], name='recomendacion_libro_posicion'),
+        ]
+
+    def __str__(self):
+        return f"{self.libro_id} -> {self.recomendado_id} ({self.puntaje:.3f})"
+
+
+class MarcaProceso(models.Model):
+    """Hasta dónde llegó un proceso por lotes (último id procesado) para continuar desde ahí"""
+    nombre = models.CharField(max_length=50, unique=True)
+    ultimo_id = models.BigIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.nombre}: {self.ultimo_id}"
+
+
+# =====================================================
+# RESÚMENES DIARIOS
+# =====================================================
+# Totales por (día, métrica, dimensión) que mantiene el comando resumir_actividad
+# a partir de las filas nuevas de cada tabla (ver gestion/resumenes.py)
+
+class ResumenDiario(models.Model):
+    fecha = models.DateField()
+    metrica = models.CharField(max_length=30)  # 'actividad', 'prestamos', 'multas_monto'...
+    dimension = models.CharField(max_length=50, blank=True, default='')  # p. ej. el tipo de acción
+    valor = models.FloatField(default=0)
+
+    class Meta:
+        ordering = ['fecha']
+        constraints = [
+            models.UniqueConstraint(fields=['metrica', 'dimension', 'fecha'], name='resumen_metrica_dimension_fecha'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.metrica}/{self.dimension}: {self.valor}"
+
+
+
+# =====================================================
+# COLA DE TAREAS
+# =====================================================
+# Trabajo que no debe hacerse dentro de la petición (descargas, escritura del
+# archivo de logs...). Los procesos del comando runworker reclaman las tareas
+# con un UPDATE condicional (ver gestion/tareas.py); no hace falta otro servidor.
+
+class Tarea(models.Model):
+    ESTADOS = (
+        ('pendiente', 'Pendiente'),
+        ('en_curso', 'En curso'),
+        ('hecha', 'Hecha'),
+        ('fallida', 'Fallida'),
+    )
+
+    nombre = models.CharField(max_length=100)  # función registrada con @tarea
+    argumentos = models.JSONField(default=dict)  # {'args': [...], 'kwargs': {...}}
+    # Con clave, solo puede haber una tarea pendiente igual (las demás se descartan al encolar)
+    clave = models.CharField(max_length=100, blank=True, null=True)
+    estado = models.CharField(max_length=10, choices=ESTADOS, default='pendiente')
+    ejecutar_en = models.DateTimeField(default=timezone.now)
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=5)
+    trabajador = models.CharField(max_length=100, blank=True, default='')
+    # Si el proceso muere con la tarea en curso, pasado este momento vuelve a la cola
+    bloqueada_hasta = models.DateTimeField(blank=True, null=True)
+    error = models.TextField(blank=True, default='')
+    creada = models.DateTimeField(default=timezone.now)
+    terminada = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        # Reclamar = la pendiente más antigua ya vencida
+        indexes = [models.Index(fields=['estado', 'ejecutar_en'], name='tarea_estado_ejecutar')]
+        constraints = [models.UniqueConstraint(fields=['clave'], condition=models.Q(estado='pendiente'),
+                                               name='tarea_clave_pendiente')]
+
+    def __str__(self):
+        return f"{self.nombre} #{self.id} ({self.get_estado_display()})"
+
+
+# =====================================================
+# RECORDATORIOS DE VENCIMIENTO
+# =====================================================
+
+class RecordatorioEnviado(models.Model):
+    """Aviso ya enviado por correo (ver gestion/recordatorios.py): evita repetirlo al volver a correr el envío"""
+    TIPOS = (
+        ('proximo', 'Por vencer'),
+        ('vencido', 'Vencido'),
+    )
+
+    # Sin índice propio: la restricción única (prestamo, tipo, vence) ya lo cubre
+    prestamo = models.ForeignKey(Prestamo, related_name='recordatorios', on_delete=models.CASCADE, db_index=False)
+    tipo = models.CharField(max_length=10, choices=TIPOS)
+    vence = models.DateField()  # fecha_max avisada: si se renueva el préstamo, se vuelve a avisar
+    enviado = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['prestamo', 'tipo', 'vence'], name='recordatorio_unico')]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} del préstamo {self.prestamo_id} ({self.vence})"
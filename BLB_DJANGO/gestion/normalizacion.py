@@ -0,0 +1,76 @@
+# Normalización de textos para búsquedas y comparación de nombres
+# Sin dependencias de los modelos para poder usarse desde models.py.
+
+import re
+import unicodedata
+
+_RE_SEPARADORES = re.compile(r'[\W_]+')
+
+
+def normalizar(texto):
+    """'¡Cien Años de Soledad!' -> 'cien anos de soledad'"""
+    texto = unicodedata.normalize('NFKD', (texto or '').casefold())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return _RE_SEPARADORES.sub(' ', texto).strip()
+
+
+def clave_autor(nombre, apellido=''):
+    """
+    Clave para reconocer al mismo autor escrito de distintas formas:
+    'J. R. R. Tolkien', 'J.R.R. Tolkien' y 'Tolkien, JRR' -> 'jrr tolkien'.
+    Las iniciales seguidas se juntan y las palabras se ordenan, así no
+    importa si viene como 'Nombre Apellido' o 'Apellido, Nombre'.
+    """
+    palabras = []
+    iniciales = ''
+    for palabra in normalizar(f'{nombre} {apellido}').split():
+        if len(palabra) == 1:
+            iniciales += palabra
+            continue
+        if iniciales:
+            palabras.append(iniciales)
+            iniciales = ''
+        palabras.append(palabra)
+    if iniciales:
+        palabras.append(iniciales)
+    return ' '.join(sorted(palabras))
+
+
+def trigramas(texto):
+    """Conjunto de trigramas de la clave (con bordes), como pg_trgm"""
+    trigramas_ = set()
+    for palabra in texto.split():
+        palabra = f'  {palabra} '
+        trigramas_.update(palabra[i:i + 3] for i in range(len(palabra) - 2))
+    return trigramas_
+
+
+def similitud(a, b):
+    """Coeficiente de Jaccard entre dos conjuntos de trigramas (0 a 1)"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def digito_isbn13(doce):
+    """Dígito de control de un ISBN-13 a partir de sus 12 primeros dígitos"""
+    suma = sum(int(c) * (3 if i % 2 else 1) for i, c in enumerate(doce))
+    return str((10 - suma % 10) % 10)
+
+
+def normalizar_isbn(codigo):
+    """
+    ISBN-10 o ISBN-13 (con o sin guiones/espacios, como lo entrega un lector
+    de códigos) -> ISBN-13 de solo dígitos: '84-376-0494-X' -> '9788437604947'.
+    None si está vacío o el dígito de control no cuadra.
+    """
+    codigo = re.sub(r'[\s-]', '', codigo or '').upper()
+    if len(codigo) == 10 and codigo[:9].isdigit() and (codigo[9].isdigit() or codigo[9] == 'X'):
+        suma = sum(int(c) * (10 - i) for i, c in enumerate(codigo[:9]))
+        control = 10 if codigo[9] == 'X' else int(codigo[9])
+        if (suma + control) % 11:
+            return None
+        return f'978{codigo[:9]}' + digito_isbn13(f'978{codigo[:9]}')
+    if len(codigo) == 13 and codigo.isdigit() and codigo[:3] in ('978', '979'):
+        return codigo if digito_isbn13(codigo[:12]) == codigo[12] else None
+    return None
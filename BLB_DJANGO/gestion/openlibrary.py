@@ -1,12 +1,15 @@
 import requests
 
+from .metricas import medir_openlibrary
+
 def buscar_libros(query):
     """
     Busca libros en la API de Open Library
     """
     url = f"https://openlibrary.org/search.json?q={query}&limit=10"
 
-    respuesta = requests.get(url)
+    with medir_openlibrary():
+        respuesta = requests.get(url)
 
     if respuesta.status_code == 200:
         datos = respuesta.json()
@@ -20,10 +23,46 @@ def buscar_autores(query):
     """
     url = f"https://openlibrary.org/search/authors.json?q={query}&limit=10"
 
-    respuesta = requests.get(url)
+    with medir_openlibrary():
+        respuesta = requests.get(url)
 
     if respuesta.status_code == 200:
         datos = respuesta.json()
         return datos.get('docs', [])
     else:
-        return []
\ No newline at end of file
+        return []
+
+def _texto(valor):
+    """OpenLibrary devuelve descripciones como texto o como {'type': ..., 'value': ...}"""
+    if isinstance(valor, dict):
+        return valor.get('value', '')
+    elif isinstance(valor, str):
+        return valor
+    return ''
+
+def obtener_descripcion(work_key):
+    """
+    Descripción de una obra (endpoint Works), '' si no hay o falla
+    """
+    try:
+        with medir_openlibrary():
+            respuesta = requests.get(f'https://openlibrary.org{work_key}.json', timeout=5)
+        if respuesta.status_code == 200:
+            return _texto(respuesta.json().get('description', ''))
+    except Exception:
+        pass
+    return ''
+
+def obtener_biografia(autor_key):
+    """
+    Biografía de un autor, '' si no hay o falla
+    """
+    # El search de autores devuelve keys como "OL123A", la URL requiere "/authors/OL123A.json"
+    try:
+        with medir_openlibrary():
+            respuesta = requests.get(f'https://openlibrary.org/authors/{autor_key}.json', timeout=3)
+        if respuesta.status_code == 200:
+            return _texto(respuesta.json().get('bio', ''))
+    except Exception:
+        pass
+    return ''
@@ -0,0 +1,167 @@
+# Perfilado bajo demanda para el personal
+# Agregando ?_profile=1 a cualquier URL (usuario is_staff) la petición se ejecuta
+# con cProfile y en lugar de la página se devuelve un informe HTML con el tiempo
+# por categoría (vista, ORM, plantillas, context processors) y las funciones
+# más costosas. Otros formatos:
+#   ?_profile=prof        archivo .prof (pstats / snakeviz)
+#   ?_profile=speedscope  JSON para https://www.speedscope.app (línea de tiempo)
+# Las peticiones sin el parámetro solo pagan una búsqueda en request.GET.
+
+import cProfile
+import marshal
+import pstats
+import sys
+from time import perf_counter
+
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import render
+
+PARAMETRO = '_profile'
+
+# Categorías por ruta del archivo (la primera que coincide gana)
+CATEGORIAS = (
+    ('Context processors', ('context_processors',)),
+    ('ORM / SQL', ('django/db/', 'sqlite3')),
+    ('Plantillas', ('django/template/', 'django/templatetags/')),
+    ('Vista (gestion)', ('gestion/',)),
+    ('Django (resto)', ('django/',)),
+)
+
+
+def categoria(archivo, funcion):
+    ruta = archivo.replace('\\', '/')
+    for nombre, patrones in CATEGORIAS:
+        if any(p in ruta or p in funcion for p in patrones):
+            return nombre
+    return 'Python / otros'
+
+
+def resumen(stats):
+    """Tiempo propio (tottime) agrupado por categoría y las funciones más costosas"""
+    por_categoria = {}
+    funciones = []
+    for (archivo, linea, funcion), (cc, llamadas, propio, acumulado, callers) in stats.stats.items():
+        nombre = categoria(archivo, funcion)
+        por_categoria[nombre] = por_categoria.get(nombre, 0.0) + propio
+        funciones.append({
+            'funcion': funcion,
+            'ubicacion': f'{archivo}:{linea}',
+            'llamadas': llamadas,
+            'propio_ms': propio * 1000,
+            'acumulado_ms': acumulado * 1000,
+            'categoria': nombre,
+        })
+    total = sum(por_categoria.values()) or 1.0
+    categorias = sorted(({'nombre': n, 'ms': t * 1000, 'porcentaje': t / total * 100}
+                         for n, t in por_categoria.items()), key=lambda c: c['ms'], reverse=True)
+    return {
+        'categorias': categorias,
+        'por_acumulado': sorted(funciones, key=lambda f: f['acumulado_ms'], reverse=True)[:30],
+        'por_propio': sorted(funciones, key=lambda f: f['propio_ms'], reverse=True)[:30],
+        # Las funciones del proyecto, para ver si domina permisos_usuario, registrar_log...
+        'proyecto': sorted((f for f in funciones if 'gestion/' in f['ubicacion'].replace('\\', '/')),
+                           key=lambda f: f['acumulado_ms'], reverse=True)[:20],
+    }
+
+
+class TrazaSpeedscope:
+    """Registra eventos de entrada/salida de funciones (formato 'evented' de speedscope)"""
+
+    def __init__(self):
+        self.frames = []
+        self.indices = {}
+        self.eventos = []
+        self.pila = []
+        self.inicio = perf_counter()
+
+    def _frame(self, clave, nombre, archivo, linea):
+        indice = self.indices.get(clave)
+        if indice is None:
+            indice = self.indices[clave] = len(self.frames)
+            self.frames.append({'name': nombre, 'file': archivo, 'line': linea})
+        return indice
+
+    def __call__(self, frame, evento, arg):
+        ahora = (perf_counter() - self.inicio) * 1000
+        if evento == 'call':
+            codigo = frame.f_code
+            indice = self._frame(codigo, codigo.co_name, codigo.co_filename, codigo.co_firstlineno)
+        elif evento == 'c_call':
+            indice = self._frame(arg, getattr(arg, '__qualname__', repr(arg)), '<builtin>', 0)
+        elif self.pila:  # return, c_return, c_exception
+            self.eventos.append({'type': 'C', 'frame': self.pila.pop(), 'at': ahora})
+            return
+        else:
+            return
+        self.pila.append(indice)
+        self.eventos.append({'type': 'O', 'frame': indice, 'at': ahora})
+
+    def exportar(self, nombre):
+        fin = (perf_counter() - self.inicio) * 1000
+        while self.pila:
+            self.eventos.append({'type': 'C', 'frame': self.pila.pop(), 'at': fin})
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': nombre,
+            'exporter': 'BiblioTech',
+            'shared': {'frames': self.frames},
+            'profiles': [{
+                'type': 'evented', 'name': nombre, 'unit': 'milliseconds',
+                'startValue': 0, 'endValue': fin, 'events': self.eventos,
+            }],
+        }
+
+
+class PerfiladoMiddleware:
+    """Perfila la petición cuando un usuario del personal agrega ?_profile="""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        formato = request.GET.get(PARAMETRO)
+        if not formato or not request.user.is_staff:
+            return self.get_response(request)
+
+        nombre = f'{request.method} {request.path}'
+        if formato == 'speedscope':
+            traza = TrazaSpeedscope()
+            sys.setprofile(traza)
+            try:
+                self.get_response(request)
+            finally:
+                sys.setprofile(None)
+            response = JsonResponse(traza.exportar(nombre))
+            response['Content-Disposition'] = 'attachment; filename="perfil.speedscope.json"'
+            return response
+
+        perfil = cProfile.Profile()
+        inicio = perf_counter()
+        perfil.enable()
+        try:
+            original = self.get_response(request)
+        finally:
+            perfil.disable()
+        total_ms = (perf_counter() - inicio) * 1000
+        stats = pstats.Stats(perfil)
+
+        if formato == 'prof':
+            response = HttpResponse(marshal.dumps(stats.stats), content_type='application/octet-stream')
+            response['Content-Disposition'] = 'attachment; filename="perfil.prof"'
+            return response
+
+        contexto = resumen(stats)
+        contexto.update({
+            'ruta': nombre,
+            'total_ms': total_ms,
+            'estado': original.status_code,
+            'url_prof': _url_con_formato(request, 'prof'),
+            'url_speedscope': _url_con_formato(request, 'speedscope'),
+        })
+        return render(request, 'gestion/templates/perfil.html', contexto)
+
+
+def _url_con_formato(request, formato):
+    parametros = request.GET.copy()
+    parametros[PARAMETRO] = formato
+    return f'{request.path}?{parametros.urlencode()}'
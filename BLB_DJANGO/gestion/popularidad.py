@@ -0,0 +1,131 @@
+# Popularidad de los libros con decaimiento exponencial
+# Cada préstamo o solicitud suma un peso que pierde la mitad de su valor cada
+# VIDA_MEDIA días. En vez de guardar el valor actual (que habría que bajar todos
+# los días para todos los libros) se guarda su logaritmo referido a una fecha fija:
+#
+#     puntaje = ln( sum peso_i * 2^(t_i / vida_media) )     (t en días desde EPOCA)
+#
+# El valor de hoy es exp(puntaje - ln2 * hoy / vida_media): el mismo factor para
+# todos los libros, así que ordenar por la columna (indexada) ya es ordenar por
+# popularidad actual. Un evento nuevo se suma en O(1) con un UPDATE atómico
+# (logaritmo de una suma, sin desbordar) y sin leer el préstamo de nadie más.
+#
+# Dos escalas: popularidad (vida media de 30 días) para "destacados" y tendencia
+# (3 días) para "tendencias de la semana".
+
+import math
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db.models import F, Value
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+from django.utils import timezone
+
+from .models import Libro
+
+EPOCA = datetime(2024, 1, 1, tzinfo=timezone.get_fixed_timezone(0))
+ESCALAS = {'popularidad': 30.0, 'tendencia': 3.0}  # campo -> vida media en días
+PESO_PRESTAMO = 1.0
+PESO_SOLICITUD = 0.5
+
+
+def dias(cuando=None):
+    """Días (con decimales) entre EPOCA y cuando"""
+    cuando = cuando or timezone.now()
+    if not isinstance(cuando, datetime):
+        cuando = datetime.combine(cuando, time(12), tzinfo=timezone.get_current_timezone())
+    return (cuando - EPOCA).total_seconds() / 86400
+
+
+def logaritmo(peso, cuando, vida_media):
+    """Aporte de un evento en la escala logarítmica del campo"""
+    return math.log(peso) + math.log(2) * dias(cuando) / vida_media
+
+
+def valor_actual(puntaje, vida_media, cuando=None):
+    """Suma de pesos decaída a la fecha indicada (por defecto ahora)"""
+    if not puntaje:
+        return 0.0
+    return math.exp(puntaje - math.log(2) * dias(cuando) / vida_media)
+
+
+def registrar(libro_id, peso, cuando=None):
+    """Suma un evento a los puntajes del libro con un único UPDATE"""
+    cambios = {}
+    for campo, vida_media in ESCALAS.items():
+        nuevo = Value(logaritmo(peso, cuando, vida_media))
+        # ln(e^a + e^b) = max(a, b) + ln(1 + e^-|a - b|)
+        cambios[campo] = Greatest(F(campo), nuevo) + Ln(Value(1.0) + Exp(-Abs(F(campo) - nuevo)))
+    # update() no toca updated_at: un préstamo no cambia el HTML del libro ni su ETag
+    Libro.objects.filter(id=libro_id).update(**cambios)
+
+
+def populares(limite=8):
+    """Los libros más populares (recorrido del índice de popularidad)"""
+    return Libro.objects.select_related('autor').order_by('-popularidad', '-id')[:limite]
+
+
+def tendencias(limite=20, ventana=7):
+    """
+    Libros con más actividad reciente. Se exige el equivalente a al menos un
+    préstamo dentro de la ventana, lo que en la escala logarítmica es un umbral
+    fijo: el filtro y el orden son un rango del índice de tendencia.
+    """
+    vida_media = ESCALAS['tendencia']
+    corte = logaritmo(PESO_PRESTAMO, timezone.now() - timedelta(days=ventana), vida_media)
+    return (Libro.objects.select_related('autor').filter(tendencia__gte=corte)
+            .order_by('-tendencia', '-id')[:limite])
+
+
+def acumular(eventos):
+    """
+    Puntajes por libro a partir de (libro_id, peso, fecha), para recalcular
+    todo desde el historial. Devuelve {libro_id: {campo: puntaje}}.
+    """
+    puntajes = defaultdict(dict)
+    for libro_id, peso, cuando in eventos:
+        actuales = puntajes[libro_id]
+        for campo, vida_media in ESCALAS.items():
+            nuevo = logaritmo(peso, cuando, vida_media)
+            previo = actuales.get(campo)
+            if previo is None:
+                actuales[campo] = nuevo
+            else:
+                mayor = max(previo, nuevo)
+                actuales[campo] = mayor + math.log1p(math.exp(-abs(previo - nuevo)))
+    return puntajes
+
+
+def eventos_historial(Prestamo, SolicitudPrestamo):
+    """Préstamos y solicitudes existentes como eventos de acumular()"""
+    for libro_id, fecha in Prestamo.objects.values_list('libro_id', 'fecha_prestamos').iterator(chunk_size=5000):
+        yield libro_id, PESO_PRESTAMO, fecha
+    for libro_id, fecha in (SolicitudPrestamo.objects.order_by().values_list('libro_id', 'fecha_solicitud')
+                            .iterator(chunk_size=5000)):
+        yield libro_id, PESO_SOLICITUD, fecha
+
+
+def guardar_puntajes(Libro, puntajes, lote=2000):
+    """Reemplaza los puntajes de todos los libros por los de acumular()"""
+    Libro.objects.update(**{campo: 0.0 for campo in ESCALAS})
+    filas = [Libro(id=libro_id, **valores) for libro_id, valores in puntajes.items()]
+    Libro.objects.bulk_update(filas, list(ESCALAS), batch_size=lote)
+    return len(filas)
+
+
+def recalcular():
+    """Vuelve a calcular los puntajes de todos los libros desde el historial"""
+    from .models import Prestamo, SolicitudPrestamo
+    return guardar_puntajes(Libro, acumular(eventos_historial(Prestamo, SolicitudPrestamo)))
+
+
+def al_prestar(sender, instance, created, **kwargs):
+    """Receptor de post_save de Prestamo"""
+    if created:
+        registrar(instance.libro_id, PESO_PRESTAMO)
+
+
+def al_solicitar(sender, instance, created, **kwargs):
+    """Receptor de post_save de SolicitudPrestamo"""
+    if created:
+        registrar(instance.libro_id, PESO_SOLICITUD)
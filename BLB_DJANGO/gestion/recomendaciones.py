@@ -0,0 +1,194 @@
+# Recomendaciones "otros lectores también pidieron"
+# Proceso por lotes (comando calcular_recomendaciones) que arma con NumPy la
+# matriz dispersa libro x libro de co-préstamos (dos libros pedidos por el mismo
+# usuario), la normaliza con similitud coseno y guarda los K vecinos de cada
+# libro en la tabla Recomendacion. detalle_libro solo lee esa tabla.
+#
+# La matriz nunca se materializa: se generan los pares (a, b) de cada usuario
+# con operaciones vectorizadas, por bloques, y se cuentan con np.unique.
+# En modo incremental (MarcaProceso 'recomendaciones' = último préstamo visto)
+# solo se recalculan las filas de los libros de usuarios con préstamos nuevos,
+# y solo se lee el historial de los lectores de esos libros; los lectores por
+# libro (para normalizar) se cuentan en la base con un GROUP BY.
+#
+# NumPy solo se importa aquí; el resto de la aplicación no lo necesita.
+
+from itertools import chain
+
+from django.db import transaction
+from django.db.models import Count, Max
+
+from .cache_catalogo import incrementar_version
+from .models import MarcaProceso, Prestamo, Recomendacion
+
+MARCA = 'recomendaciones'
+# Pares (a, b) que se generan por bloque; acota la memoria (~16 bytes por par)
+PARES_POR_BLOQUE = 2_000_000
+
+
+def _numpy():
+    import numpy
+    return numpy
+
+
+def cargar_historial(usuarios=None):
+    """
+    Arreglos (id, usuario, libro) de los préstamos, sin pasar por objetos del
+    ORM. usuarios (subconsulta de ids) limita la lectura a esos usuarios.
+    """
+    np = _numpy()
+    filas = Prestamo.objects.order_by()
+    if usuarios is not None:
+        filas = filas.filter(usuario_id__in=usuarios)
+    filas = filas.values_list('id', 'usuario_id', 'libro_id')
+    datos = np.fromiter(chain.from_iterable(filas.iterator(chunk_size=20000)), dtype=np.int64)
+    datos = datos.reshape(-1, 3)
+    return datos[:, 0], datos[:, 1], datos[:, 2]
+
+
+def _grupos(valores):
+    """Inicio y tamaño de cada tramo de valores iguales (el arreglo debe estar ordenado)"""
+    np = _numpy()
+    inicios = np.concatenate(([0], np.flatnonzero(np.diff(valores)) + 1))
+    tamanos = np.diff(np.append(inicios, len(valores)))
+    return inicios, tamanos
+
+
+def lectores_por_libro(libros=None):
+    """Arreglo indexado por libro_id con los lectores distintos de cada libro (libros: subconsulta de ids)"""
+    np = _numpy()
+    filas = Prestamo.objects.order_by()
+    if libros is not None:
+        filas = filas.filter(libro_id__in=libros)
+    filas = filas.values('libro_id').annotate(n=Count('usuario_id', distinct=True)).values_list('libro_id', 'n')
+    datos = np.fromiter(chain.from_iterable(filas), dtype=np.int64).reshape(-1, 2)
+    popularidad = np.zeros(int(datos[:, 0].max()) + 1 if len(datos) else 1, dtype=np.float64)
+    popularidad[datos[:, 0]] = datos[:, 1]
+    return popularidad
+
+
+def historiales(ids, usuarios, libros, max_por_usuario):
+    """
+    Pares (usuario, libro) sin repetir, ordenados por usuario, con solo los
+    max_por_usuario libros más recientes de cada usuario (los lectores muy
+    activos generan k² pares y aportan poca señal).
+    """
+    np = _numpy()
+    orden = np.lexsort((-ids, libros, usuarios))
+    usuarios, libros = usuarios[orden], libros[orden]
+    # Quitar préstamos repetidos del mismo libro (queda el más reciente)
+    unicos = np.ones(len(usuarios), dtype=bool)
+    unicos[1:] = (usuarios[1:] != usuarios[:-1]) | (libros[1:] != libros[:-1])
+    usuarios, libros, ids = usuarios[unicos], libros[unicos], ids[orden][unicos]
+    # Los más recientes primero dentro de cada usuario
+    orden = np.lexsort((-ids, usuarios))
+    usuarios, libros = usuarios[orden], libros[orden]
+    inicios, tamanos = _grupos(usuarios)
+    rango = np.arange(len(usuarios)) - np.repeat(inicios, tamanos)
+    recientes = rango < max_por_usuario
+    return usuarios[recientes], libros[recientes]
+
+
+def coocurrencias(usuarios, libros, objetivo=None):
+    """
+    Cuenta cuántos usuarios pidieron cada par de libros (a, b), a != b.
+    Si se indica objetivo (arreglo de ids) solo se calculan las filas a de esos libros.
+    Devuelve tres arreglos: a, b, cuenta.
+    """
+    np = _numpy()
+    if len(libros) == 0:
+        vacio = np.array([], dtype=np.int64)
+        return vacio, vacio, vacio
+    factor = int(libros.max()) + 1
+    inicios, tamanos = _grupos(usuarios)
+    acumulado = np.cumsum(tamanos.astype(np.int64) ** 2)
+    claves, cuentas = [], []
+    g = 0
+    while g < len(inicios):
+        base = acumulado[g - 1] if g else 0
+        h = max(g + 1, int(np.searchsorted(acumulado, base + PARES_POR_BLOQUE, side='right')))
+        tam = tamanos[g:h]
+        # Para cada libro del bloque, repetirlo tantas veces como libros tiene su usuario...
+        tam_elemento = np.repeat(tam, tam)
+        a_idx = np.repeat(np.arange(inicios[g], inicios[g] + tam.sum()), tam_elemento)
+        # ...y emparejarlo con cada libro del mismo usuario
+        desplazamiento = np.arange(len(a_idx)) - np.repeat(np.cumsum(tam_elemento) - tam_elemento, tam_elemento)
+        b_idx = np.repeat(np.repeat(inicios[g:h], tam), tam_elemento) + desplazamiento
+        a, b = libros[a_idx], libros[b_idx]
+        mascara = a != b
+        if objetivo is not None:
+            mascara &= np.isin(a, objetivo)
+        clave, cuenta = np.unique(a[mascara] * factor + b[mascara], return_counts=True)
+        claves.append(clave)
+        cuentas.append(cuenta)
+        g = h
+    clave, inversa = np.unique(np.concatenate(claves), return_inverse=True)
+    cuenta = np.bincount(inversa, weights=np.concatenate(cuentas)).astype(np.int64)
+    return clave // factor, clave % factor, cuenta
+
+
+def vecinos(a, b, cuenta, popularidad, top, minimo=1):
+    """Top-K de cada libro por similitud coseno: cuenta / sqrt(lectores(a) * lectores(b))"""
+    np = _numpy()
+    mascara = cuenta >= minimo
+    a, b, cuenta = a[mascara], b[mascara], cuenta[mascara]
+    puntaje = cuenta / np.sqrt(popularidad[a] * popularidad[b])
+    orden = np.lexsort((b, -puntaje, a))
+    a, b, puntaje = a[orden], b[orden], puntaje[orden]
+    inicios, tamanos = _grupos(a)
+    posicion = np.arange(len(a)) - np.repeat(inicios, tamanos)
+    mascara = posicion < top
+    return a[mascara], b[mascara], puntaje[mascara], posicion[mascara]
+
+
+def _hasta(ultimo, ids, usuarios, libros):
+    """Descarta los préstamos creados después de leer la marca (quedan para la próxima corrida)"""
+    mascara = ids <= ultimo
+    return ids[mascara], usuarios[mascara], libros[mascara]
+
+
+def calcular(completo=False, top=10, max_por_usuario=50, minimo=1, lote=2000):
+    """
+    Recalcula la tabla Recomendacion. Sin completo solo procesa los libros
+    afectados por préstamos posteriores a la marca. Devuelve (libros, filas escritas).
+    """
+    np = _numpy()
+    marca, _ = MarcaProceso.objects.get_or_create(nombre=MARCA)
+    ultimo = Prestamo.objects.aggregate(m=Max('id'))['m'] or 0
+
+    objetivo = None
+    if not completo and marca.ultimo_id:
+        if ultimo <= marca.ultimo_id:
+            return 0, 0
+        # Las filas que cambian son las de los libros de usuarios con préstamos nuevos...
+        nuevos = Prestamo.objects.filter(id__gt=marca.ultimo_id, id__lte=ultimo).values('usuario_id')
+        afectados = Prestamo.objects.filter(usuario_id__in=nuevos).values('libro_id')
+        # ...y para contarlas basta el historial de los lectores de esos libros
+        relevantes = Prestamo.objects.filter(libro_id__in=afectados).values('usuario_id')
+        ids, usuarios, libros = _hasta(ultimo, *cargar_historial(relevantes))
+        objetivo = np.unique(libros[np.isin(usuarios, np.unique(usuarios[ids > marca.ultimo_id]))])
+        popularidad = lectores_por_libro(Prestamo.objects.filter(usuario_id__in=relevantes).values('libro_id'))
+    else:
+        ids, usuarios, libros = _hasta(ultimo, *cargar_historial())
+        popularidad = lectores_por_libro()
+
+    usuarios, libros = historiales(ids, usuarios, libros, max_por_usuario)
+    a, b, cuenta = coocurrencias(usuarios, libros, objetivo)
+    a, b, puntaje, posicion = vecinos(a, b, cuenta, popularidad, top, minimo)
+
+    with transaction.atomic():
+        if objetivo is None:
+            Recomendacion.objects.all().delete()
+        else:
+            for inicio in range(0, len(objetivo), 500):
+                Recomendacion.objects.filter(libro_id__in=objetivo[inicio:inicio + 500].tolist()).delete()
+        filas = Recomendacion.objects.bulk_create(
+            [Recomendacion(libro_id=x, recomendado_id=y, puntaje=p, posicion=r)
+             for x, y, p, r in zip(a.tolist(), b.tolist(), puntaje.tolist(), posicion.tolist())],
+            batch_size=lote)
+        marca.ultimo_id = ultimo
+        marca.save()
+    # Los fragmentos y ETag de detalle_libro dependen de esta versión
+    incrementar_version('Recomendacion')
+    procesados = len(objetivo) if objetivo is not None else len(np.unique(a))
+    return procesados, len(filas)
@@ -0,0 +1,104 @@
+# Recordatorios de vencimiento por correo
+# El comando enviar_recordatorios (pensado para correr a diario) busca con una
+# sola consulta los préstamos abiertos que vencen en los próximos días o ya
+# vencieron (índice parcial prestamo_abierto_vence) y manda a cada usuario un
+# único correo con todos los suyos. La plantilla se compila una vez, los
+# correos salen sobre la misma conexión SMTP y los enviados se anotan por lotes
+# en RecordatorioEnviado, así volver a correrlo no repite avisos: cada
+# préstamo recibe como mucho un "por vencer" y un "vencido" por fecha_max.
+# Un destinatario rechazado se registra en el log y queda pendiente para la
+# próxima corrida, sin frenar al resto.
+
+import logging
+from contextlib import nullcontext
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Case, Exists, OuterRef, Value, When
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .models import Prestamo, RecordatorioEnviado
+
+logger = logging.getLogger(__name__)
+
+PROXIMO, VENCIDO = 'proximo', 'vencido'
+PLANTILLA = 'gestion/templates/correo_recordatorio.txt'
+
+
+def pendientes(hoy, dias):
+    """
+    Préstamos abiertos con vencimiento hasta hoy + dias, de usuarios con
+    correo y sin el aviso de su tipo ya enviado, ordenados por usuario:
+    (prestamo_id, usuario_id, email, nombre, username, titulo, fecha_max, tipo)
+    """
+    tipo = Case(When(fecha_max__lt=hoy, then=Value(VENCIDO)), default=Value(PROXIMO))
+    enviados = RecordatorioEnviado.objects.filter(prestamo=OuterRef('pk'), tipo=OuterRef('tipo'),
+                                                  vence=OuterRef('fecha_max'))
+    return (Prestamo.objects.filter(fecha_devolucion__isnull=True, fecha_max__lte=hoy + timedelta(days=dias))
+            .exclude(usuario__email='')
+            .annotate(tipo=tipo).filter(~Exists(enviados))
+            .order_by('usuario_id', 'fecha_max', 'id')
+            .values_list('id', 'usuario_id', 'usuario__email', 'usuario__first_name', 'usuario__username',
+                         'libro__titulo', 'fecha_max', 'tipo'))
+
+
+def _correo(filas, hoy, plantilla):
+    """Un correo con todos los préstamos de un usuario (filas de pendientes())"""
+    _, _, email, nombre, username = filas[0][:5]
+    vencidos = [{'titulo': f[5], 'vence': f[6], 'dias': (hoy - f[6]).days} for f in filas if f[7] == VENCIDO]
+    proximos = [{'titulo': f[5], 'vence': f[6], 'dias': (f[6] - hoy).days} for f in filas if f[7] == PROXIMO]
+    asunto = 'Tienes préstamos vencidos' if vencidos else 'Recordatorio: préstamos por vencer'
+    cuerpo = plantilla.render({'nombre': nombre or username, 'vencidos': vencidos, 'proximos': proximos})
+    return EmailMessage(f'BiblioTech - {asunto}', cuerpo, settings.DEFAULT_FROM_EMAIL, [email])
+
+
+def enviar(hoy=None, dias=None, lote=200, simular=False):
+    """
+    Envía los avisos pendientes, anotándolos en lotes de lote correos, y
+    devuelve {'correos': usuarios avisados, 'prestamos': préstamos incluidos,
+    'fallidos': correos que el servidor rechazó}.
+    Con simular solo cuenta, sin enviar ni anotar nada.
+    """
+    hoy = hoy or timezone.localdate()
+    dias = settings.RECORDATORIOS_DIAS_ANTES if dias is None else dias
+    plantilla = get_template(PLANTILLA)
+    # Todo en memoria antes de escribir: en SQLite no conviene insertar en
+    # recordatorios mientras sigue abierta la lectura que los consulta
+    filas = list(pendientes(hoy, dias))
+    totales = {'correos': 0, 'prestamos': 0, 'fallidos': 0}
+    conexion = get_connection()
+    lote_actual = []  # (correo, avisos del usuario)
+
+    def despachar():
+        anotados = []
+        for correo, avisos in lote_actual:
+            if not simular:
+                try:
+                    conexion.send_messages([correo])
+                except Exception:
+                    # Un destinatario rechazado no frena al resto; el suyo queda pendiente
+                    logger.exception('No se pudo enviar el recordatorio a %s', correo.to[0])
+                    totales['fallidos'] += 1
+                    continue
+            anotados.extend(avisos)
+            totales['correos'] += 1
+        # Se anota después de enviar y solo lo enviado
+        if anotados and not simular:
+            RecordatorioEnviado.objects.bulk_create(anotados, ignore_conflicts=True)
+        totales['prestamos'] += len(anotados)
+        lote_actual.clear()
+
+    # Una sola conexión (un login SMTP) para todos los lotes
+    with nullcontext() if simular else conexion:
+        for _, grupo in groupby(filas, key=itemgetter(1)):
+            grupo = list(grupo)
+            lote_actual.append((_correo(grupo, hoy, plantilla),
+                                [RecordatorioEnviado(prestamo_id=f[0], tipo=f[7], vence=f[6]) for f in grupo]))
+            if len(lote_actual) >= lote:
+                despachar()
+        despachar()
+    return totales
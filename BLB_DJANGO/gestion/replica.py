@@ -0,0 +1,131 @@
+# Réplica de solo lectura para el catálogo
+# Las vistas de consulta (lista de libros, autores, detalle...) leen de la base
+# 'replica', una copia de db.sqlite3 que se sincroniza con la API de backup de
+# SQLite (comando: python manage.py sincronizar_replica --cada 5).
+# Las escrituras siempre van a 'default'. Después de un POST el navegador recibe
+# una cookie corta que "fija" sus lecturas a 'default' durante unos segundos,
+# para que el usuario vea de inmediato lo que acaba de guardar.
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+COOKIE_PIN = 'replica_pin'
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS')
+
+# Solo los modelos de estas apps se leen de la réplica; sesiones y usuarios
+# siempre desde 'default' (un login recién hecho todavía no está en la copia)
+APPS_EN_REPLICA = {'gestion'}
+
+_estado = threading.local()
+_disponible = {'ok': False, 'revisado': 0.0}
+
+
+def replica_disponible():
+    """Indica si el alias 'replica' existe y su archivo ya fue sincronizado"""
+    if _disponible['ok']:
+        return True
+    if REPLICA not in settings.DATABASES:
+        return False
+    ahora = time.monotonic()
+    if ahora - _disponible['revisado'] < 5:
+        return False
+    _disponible['revisado'] = ahora
+    nombre = str(connections[REPLICA].settings_dict['NAME'])
+    # En los tests la réplica es un espejo de 'default' (TEST MIRROR): no hay nada que enrutar
+    if nombre != str(connections[DEFAULT_DB_ALIAS].settings_dict['NAME']) and os.path.exists(nombre):
+        _disponible['ok'] = True
+    return _disponible['ok']
+
+
+@contextmanager
+def lectura_replica():
+    """Las consultas de solo lectura dentro del bloque se envían a la réplica"""
+    anterior = getattr(_estado, 'lectura', False)
+    _estado.lectura = True
+    try:
+        yield
+    finally:
+        _estado.lectura = anterior
+
+
+def esta_fijado(request):
+    """El usuario escribió hace poco: sus lecturas deben ir a 'default'"""
+    return COOKIE_PIN in request.COOKIES
+
+
+def solo_lectura(view_func):
+    """Decorador para vistas que solo consultan el catálogo"""
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        if request.method not in METODOS_SEGUROS or esta_fijado(request):
+            return view_func(request, *args, **kwargs)
+        with lectura_replica():
+            return view_func(request, *args, **kwargs)
+    return _wrapped_view
+
+
+class ReplicaRouter:
+    """Envía las lecturas marcadas a la réplica y todo lo demás a 'default'"""
+
+    def db_for_read(self, model, **hints):
+        if (getattr(_estado, 'lectura', False)
+                and model._meta.app_label in APPS_EN_REPLICA
+                and replica_disponible()):
+            return REPLICA
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Ambas bases tienen los mismos datos, las relaciones son válidas
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La réplica recibe el esquema con la copia, nunca se migra directamente
+        return db != REPLICA
+
+
+class ReplicaMiddleware:
+    """Después de una escritura fija las lecturas del usuario a 'default'"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in METODOS_SEGUROS:
+            response.set_cookie(COOKIE_PIN, '1', max_age=settings.REPLICA_PIN_SEGUNDOS,
+                                httponly=True, samesite='Lax')
+        return response
+
+
+def sincronizar_replica(destino=None):
+    """
+    Copia la base 'default' sobre el archivo de la réplica usando la API de
+    backup de SQLite (copia consistente aunque haya escrituras en curso).
+    Retorna el número de segundos que tomó.
+    """
+    es_replica = destino is None
+    if es_replica:
+        destino = str(settings.DATABASES[REPLICA]['NAME'])
+    inicio = time.perf_counter()
+    origen = connections[DEFAULT_DB_ALIAS]
+    origen.ensure_connection()
+    copia = sqlite3.connect(destino, timeout=20)
+    try:
+        # Copiar por bloques para no retener el lock de lectura mucho tiempo
+        origen.connection.backup(copia, pages=1024)
+    finally:
+        copia.close()
+    if es_replica:
+        _disponible['ok'] = True
+    return time.perf_counter() - inicio
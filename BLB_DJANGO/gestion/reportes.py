@@ -0,0 +1,157 @@
+# Reportes de circulación para el personal
+# Los préstamos y multas del período se leen en columnas (values_list) y se
+# pasan a arreglos de NumPy; todos los indicadores se calculan con operaciones
+# vectorizadas (bincount, unique, digitize) sin recorrer objetos del ORM.
+# El resultado (solo números y textos) se guarda en la caché compartida por
+# período: un año cerrado no cambia, el año en curso se recalcula cada
+# REPORTES_CACHE_TIMEOUT segundos.
+#
+# NumPy solo se importa aquí y en gestion/recomendaciones.py.
+
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Case, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import Multa, Perfil, Prestamo
+
+# Tramos de días de retraso (el último incluye todo lo que supere 30 días)
+TRAMOS_RETRASO = (0, 1, 4, 8, 15, 31)
+ETIQUETAS_RETRASO = ('A tiempo', '1-3 días', '4-7 días', '8-14 días', '15-30 días', 'Más de 30 días')
+ROLES = [codigo for codigo, _ in Perfil.ROLES] + ['sin perfil']
+TIPOS_MULTA = [codigo for codigo, _ in Multa._meta.get_field('tipo').choices]
+NOMBRES_TIPO = dict(Multa._meta.get_field('tipo').choices)
+
+
+def _numpy():
+    import numpy
+    return numpy
+
+
+def _fechas(valores):
+    """Columna de fechas (None -> NaT) como datetime64[D]"""
+    np = _numpy()
+    return np.array(valores, dtype='datetime64[D]')
+
+
+def _codigo(campo, valores):
+    """Posición del valor del campo en valores, calculada en la base (lo desconocido o NULL va al final)"""
+    return Case(*[When(**{campo: valor}, then=Value(i)) for i, valor in enumerate(valores)],
+                default=Value(len(valores) - 1), output_field=IntegerField())
+
+
+def cargar(desde, hasta):
+    """Columnas de préstamos y multas con fecha en [desde, hasta]"""
+    np = _numpy()
+    filas = (Prestamo.objects.filter(fecha_prestamos__range=(desde, hasta)).order_by()
+             .annotate(codigo_rol=_codigo('usuario__perfil__rol', ROLES))
+             .values_list('fecha_prestamos', 'fecha_max', 'fecha_devolucion', 'codigo_rol'))
+    columnas = list(zip(*filas.iterator(chunk_size=20000))) or [(), (), (), ()]
+    prestamos = {
+        'inicio': _fechas(columnas[0]),
+        'maximo': _fechas(columnas[1]),
+        'devolucion': _fechas(columnas[2]),
+        'rol': np.array(columnas[3], dtype=np.int64),
+    }
+    filas = (Multa.objects.filter(fecha__range=(desde, hasta)).order_by()
+             .annotate(codigo_tipo=_codigo('tipo', TIPOS_MULTA))
+             .values_list('fecha', 'codigo_tipo', 'monto', 'pagada'))
+    columnas = list(zip(*filas.iterator(chunk_size=20000))) or [(), (), (), ()]
+    multas = {
+        'fecha': _fechas(columnas[0]),
+        'tipo': np.array(columnas[1], dtype=np.int64),
+        'monto': np.array(columnas[2], dtype=np.float64),
+        'pagada': np.array(columnas[3], dtype=bool),
+    }
+    return prestamos, multas
+
+
+def _por_mes(fechas, meses, pesos=None):
+    """Cuenta (o suma pesos) por mes, alineado con el arreglo de meses del período"""
+    np = _numpy()
+    indice = (fechas.astype('datetime64[M]') - meses[0]).astype(np.int64)
+    return np.bincount(indice, weights=pesos, minlength=len(meses))[:len(meses)]
+
+
+def calcular(prestamos, multas, desde, hasta, hoy):
+    """Indicadores del período a partir de las columnas de cargar()"""
+    np = _numpy()
+    meses = np.arange(np.datetime64(desde, 'M'), np.datetime64(hasta, 'M') + 1)
+    hoy = np.datetime64(hoy, 'D')
+
+    inicio, maximo, devolucion = prestamos['inicio'], prestamos['maximo'], prestamos['devolucion']
+    devuelto = ~np.isnat(devolucion)
+    prestados = _por_mes(inicio, meses)
+    devueltos = _por_mes(devolucion[devuelto & (devolucion <= np.datetime64(hasta, 'D'))], meses)
+
+    # Retraso: hasta la devolución o, si sigue prestado, hasta hoy
+    referencia = np.where(devuelto, devolucion, hoy)
+    retraso = np.maximum((referencia - maximo).astype(np.int64), 0)
+    tramos = np.bincount(np.digitize(retraso, TRAMOS_RETRASO) - 1, minlength=len(TRAMOS_RETRASO))
+    duracion = (devolucion[devuelto] - inicio[devuelto]).astype(np.int64)
+
+    rol = prestamos['rol']
+    por_rol = np.bincount(rol, minlength=len(ROLES))
+    atrasados_rol = np.bincount(rol, weights=retraso > 0, minlength=len(ROLES))
+
+    tipo, monto, pagada = multas['tipo'], multas['monto'], multas['pagada']
+    generado = np.bincount(tipo, weights=monto, minlength=len(TIPOS_MULTA))
+    cobrado = np.bincount(tipo, weights=np.where(pagada, monto, 0.0), minlength=len(TIPOS_MULTA))
+    cantidad_multas = np.bincount(tipo, minlength=len(TIPOS_MULTA))
+
+    return {
+        'total_prestamos': int(len(inicio)),
+        'activos': int((~devuelto).sum()),
+        'duracion_promedio': float(duracion.mean()) if len(duracion) else 0.0,
+        'duracion_mediana': float(np.median(duracion)) if len(duracion) else 0.0,
+        'mensual': [
+            {'mes': str(mes), 'prestamos': int(p), 'devoluciones': int(d), 'multas': float(m)}
+            for mes, p, d, m in zip(meses, prestados, devueltos, _por_mes(multas['fecha'], meses, monto))
+        ],
+        'retrasos': [{'tramo': etiqueta, 'prestamos': int(n)} for etiqueta, n in zip(ETIQUETAS_RETRASO, tramos)],
+        'multas': [
+            {'tipo': NOMBRES_TIPO[codigo], 'cantidad': int(n), 'generado': float(g), 'cobrado': float(c)}
+            for codigo, n, g, c in zip(TIPOS_MULTA, cantidad_multas, generado, cobrado)
+        ],
+        'roles': [
+            {'rol': nombre, 'prestamos': int(n), 'atrasados': int(a)}
+            for nombre, n, a in zip(ROLES, por_rol, atrasados_rol) if n
+        ],
+    }
+
+
+def reporte(anio):
+    """Reporte del año indicado, desde la caché compartida si ya se calculó"""
+    hoy = timezone.localdate()
+    desde, hasta = date(anio, 1, 1), date(anio, 12, 31)
+    clave = f'reporte:{anio}'
+    cache = caches['compartida']
+    datos = cache.get(clave)
+    if datos is None:
+        inicio = time.perf_counter()
+        prestamos, multas = cargar(desde, hasta)
+        datos = calcular(prestamos, multas, desde, hasta, min(hoy, hasta))
+        datos.update(anio=anio, generado=timezone.now().isoformat(timespec='seconds'),
+                     segundos=round(time.perf_counter() - inicio, 3))
+        # Un año cerrado solo cambia si se corrigen datos viejos
+        cerrado = hasta < hoy
+        cache.set(clave, datos, 86400 if cerrado else getattr(settings, 'REPORTES_CACHE_TIMEOUT', 300))
+    return datos
+
+
+def filas_csv(datos):
+    """Todas las secciones del reporte como filas (sección, clave, valores...)"""
+    yield ['seccion', 'clave', 'valor_1', 'valor_2', 'valor_3']
+    for fila in datos['mensual']:
+        yield ['mensual', fila['mes'], fila['prestamos'], fila['devoluciones'], f"{fila['multas']:.2f}"]
+    for fila in datos['retrasos']:
+        yield ['retrasos', fila['tramo'], fila['prestamos'], '', '']
+    for fila in datos['multas']:
+        yield ['multas', fila['tipo'], fila['cantidad'], f"{fila['generado']:.2f}", f"{fila['cobrado']:.2f}"]
+    for fila in datos['roles']:
+        yield ['roles', fila['rol'], fila['prestamos'], fila['atrasados'], '']
+    yield ['resumen', 'duracion_promedio', f"{datos['duracion_promedio']:.2f}", '', '']
+    yield ['resumen', 'duracion_mediana', f"{datos['duracion_mediana']:.2f}", '', '']
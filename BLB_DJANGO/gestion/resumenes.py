@@ -0,0 +1,123 @@
+# Resúmenes diarios (rollups) de actividad y circulación
+# Cada fuente es una tabla que solo crece (préstamos, registros de actividad...).
+# resumir() toma las filas con id mayor a la marca de la fuente (MarcaProceso
+# 'resumen:<fuente>'), las agrupa por día y dimensión en la base de datos y suma
+# los totales a ResumenDiario. La suma y la marca se guardan en la misma
+# transacción, así que volver a ejecutarlo no cuenta nada dos veces.
+#
+# Las filas que se editan después (una devolución, una solicitud aprobada) no
+# cambian su resumen: solo se cuenta el evento de creación. Las eliminaciones
+# tampoco se descuentan.
+
+from collections import namedtuple
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import MarcaProceso, Multa, Prestamo, RegistroActividad, ResumenDiario, SolicitudPrestamo
+
+# metricas: nombre de la métrica -> agregado que se calcula por (día, dimensión)
+Fuente = namedtuple('Fuente', 'nombre modelo campo_fecha dimension metricas')
+
+FUENTES = (
+    Fuente('actividad', RegistroActividad, 'fecha_hora', 'tipo_accion', {'actividad': Count('id')}),
+    Fuente('prestamos', Prestamo, 'fecha_prestamos', None, {'prestamos': Count('id')}),
+    Fuente('solicitudes', SolicitudPrestamo, 'fecha_solicitud', None, {'solicitudes': Count('id')}),
+    Fuente('multas', Multa, 'fecha', 'tipo', {'multas': Count('id'), 'multas_monto': Sum('monto')}),
+)
+
+METRICAS = [metrica for fuente in FUENTES for metrica in fuente.metricas]
+
+
+def _agrupar(fuente, desde_id, hasta_id):
+    """
+    Totales {(día, métrica, dimensión): valor} de las filas con id en
+    (desde_id, hasta_id], agrupados en la base. Devuelve (totales, filas leídas).
+    """
+    filas = fuente.modelo.objects.filter(id__gt=desde_id, id__lte=hasta_id).order_by()
+    campo = fuente.modelo._meta.get_field(fuente.campo_fecha)
+    if campo.get_internal_type() == 'DateTimeField':
+        filas = filas.annotate(dia=TruncDate(fuente.campo_fecha))
+        dia = 'dia'
+    else:
+        dia = fuente.campo_fecha
+    grupos = [dia] + ([fuente.dimension] if fuente.dimension else [])
+    totales, leidas = {}, 0
+    for fila in filas.values(*grupos).annotate(filas_leidas=Count('id'), **fuente.metricas):
+        dimension = (fila[fuente.dimension] or '') if fuente.dimension else ''
+        leidas += fila['filas_leidas']
+        for metrica in fuente.metricas:
+            totales[(fila[dia], metrica, dimension)] = float(fila[metrica] or 0)
+    return totales, leidas
+
+
+def _sumar(totales):
+    """Suma los totales {(fecha, metrica, dimension): valor} a los ya guardados"""
+    fechas = {fecha for fecha, _, _ in totales}
+    metricas = {metrica for _, metrica, _ in totales}
+    existentes = ResumenDiario.objects.filter(fecha__in=fechas, metrica__in=metricas)
+    for resumen in existentes.iterator(chunk_size=2000):
+        clave = (resumen.fecha, resumen.metrica, resumen.dimension)
+        if clave in totales:
+            totales[clave] += resumen.valor
+    ResumenDiario.objects.bulk_create(
+        [ResumenDiario(fecha=f, metrica=m, dimension=d, valor=v) for (f, m, d), v in totales.items()],
+        update_conflicts=True, unique_fields=['metrica', 'dimension', 'fecha'], update_fields=['valor'],
+        batch_size=500)
+
+
+def resumir_fuente(fuente, lote=50000):
+    """Procesa las filas nuevas de una fuente en bloques de ids. Devuelve las filas leídas."""
+    marca, _ = MarcaProceso.objects.get_or_create(nombre=f'resumen:{fuente.nombre}')
+    ultimo = fuente.modelo.objects.aggregate(ultimo=Max('id'))['ultimo'] or 0
+    procesadas = 0
+    desde = marca.ultimo_id
+    while desde < ultimo:
+        hasta = min(desde + lote, ultimo)
+        totales, leidas = _agrupar(fuente, desde, hasta)
+        with transaction.atomic():
+            # Avanzar la marca primero: si otro proceso ya resumió este bloque
+            # no se actualiza ninguna fila y no se suma nada
+            avanzada = (MarcaProceso.objects.filter(id=marca.id, ultimo_id=desde)
+                        .update(ultimo_id=hasta, actualizado=timezone.now()))
+            if not avanzada:
+                return procesadas
+            if totales:
+                _sumar(totales)
+        procesadas += leidas
+        desde = hasta
+    return procesadas
+
+
+def resumir(lote=50000):
+    """Actualiza los resúmenes de todas las fuentes. Devuelve {fuente: filas leídas}."""
+    return {fuente.nombre: resumir_fuente(fuente, lote) for fuente in FUENTES}
+
+
+def reiniciar():
+    """Borra los resúmenes y las marcas para recalcular todo desde cero"""
+    with transaction.atomic():
+        ResumenDiario.objects.all().delete()
+        MarcaProceso.objects.filter(nombre__startswith='resumen:').delete()
+
+
+def serie(metrica, desde, hasta, dimension=None):
+    """
+    Valores por día entre desde y hasta (inclusive), con ceros en los días sin
+    datos. Sin dimensión suma todas las dimensiones de la métrica.
+    """
+    filas = ResumenDiario.objects.filter(metrica=metrica, fecha__range=(desde, hasta))
+    if dimension is not None:
+        filas = filas.filter(dimension=dimension)
+    por_dia = dict(filas.values('fecha').annotate(total=Sum('valor')).order_by().values_list('fecha', 'total'))
+    dias = (hasta - desde).days + 1
+    return [(desde + timedelta(days=i), por_dia.get(desde + timedelta(days=i), 0)) for i in range(dias)]
+
+
+def dimensiones(metrica):
+    """Dimensiones registradas para una métrica"""
+    return list(ResumenDiario.objects.filter(metrica=metrica).exclude(dimension='')
+                .order_by('dimension').values_list('dimension', flat=True).distinct())
@@ -0,0 +1,271 @@
+# Cola de tareas en la base de datos
+# Lo que no hace falta para responder (descargar portadas, completar datos de
+# OpenLibrary, escribir logs.txt) se guarda como una fila Tarea y lo ejecutan
+# los procesos de `manage.py runworker`. No hay otro servidor: la tabla es la cola.
+#
+# Cada proceso reclama la siguiente tarea vencida con un único
+# UPDATE ... RETURNING (igual que los ejemplares en inventario.py), así dos
+# procesos nunca toman la misma. La tarea queda "en_curso" hasta
+# bloqueada_hasta; si el proceso muere, rescatar() la devuelve a la cola. Si
+# falla se reintenta con espera exponencial hasta max_intentos.
+
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, close_old_connections, connections, router, transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from .cache_catalogo import incrementar_version
+from .models import Libro, MarcaProceso, RegistroActividad, Tarea
+from .openlibrary import obtener_descripcion
+
+logger = logging.getLogger(__name__)
+
+PENDIENTE, EN_CURSO, HECHA, FALLIDA = 'pendiente', 'en_curso', 'hecha', 'fallida'
+
+ARCHIVO_LOGS = os.path.join(settings.BASE_DIR, 'docs_utiles', 'logs.txt')
+MARCA_LOGS = 'logs.txt'
+
+_registro = {}
+
+
+def tarea(funcion):
+    """Registra la función para que los workers puedan ejecutarla por su nombre"""
+    _registro[funcion.__name__] = funcion
+    return funcion
+
+
+def encolar(nombre, *args, retraso=None, ejecutar_en=None, max_intentos=5, clave=None, **kwargs):
+    """
+    Guarda la tarea para que la ejecute un worker (ejecutar_en o dentro de
+    retraso segundos; por defecto, en cuanto haya uno libre). Con clave, si ya
+    hay una pendiente con la misma no se crea otra. Los argumentos deben poder
+    guardarse como JSON. Devuelve la Tarea, o None si llevaba clave o se
+    ejecutó en el momento (TAREAS_SINCRONAS, para desarrollo sin worker).
+    """
+    if nombre not in _registro:
+        raise ValueError(f'Tarea desconocida: {nombre}')
+    if settings.TAREAS_SINCRONAS:
+        try:
+            _registro[nombre](*args, **kwargs)
+        except Exception:
+            logger.exception('Falló la tarea %s', nombre)
+        return None
+    if ejecutar_en is None:
+        ejecutar_en = timezone.now() + timedelta(seconds=retraso or 0)
+    nueva = Tarea(nombre=nombre, argumentos={'args': list(args), 'kwargs': kwargs}, clave=clave or None,
+                  ejecutar_en=ejecutar_en, max_intentos=max_intentos)
+    if clave:
+        # La restricción única parcial descarta el duplicado sin error (una sola consulta)
+        Tarea.objects.bulk_create([nueva], ignore_conflicts=True)
+        return None
+    nueva.save()
+    return nueva
+
+
+def reclamar(trabajador):
+    """
+    Pasa a en_curso la pendiente vencida más antigua y la devuelve como
+    (id, nombre, argumentos, intentos, max_intentos), o None si no hay ninguna.
+    """
+    conexion = connections[router.db_for_write(Tarea)]
+    tabla = conexion.ops.quote_name(Tarea._meta.db_table)
+    # En PostgreSQL los workers se saltan la fila que otro está reclamando en vez de esperarlo
+    saltar = ' FOR UPDATE SKIP LOCKED' if conexion.features.has_select_for_update_skip_locked else ''
+    ahora = timezone.now()
+    sql = (f'UPDATE {tabla} SET estado = %s, intentos = intentos + 1, trabajador = %s, bloqueada_hasta = %s '
+           f'WHERE id = (SELECT id FROM {tabla} WHERE estado = %s AND ejecutar_en <= %s '
+           f'ORDER BY ejecutar_en, id LIMIT 1{saltar}) AND estado = %s '
+           f'RETURNING id, nombre, argumentos, intentos, max_intentos')
+    hasta = ahora + timedelta(seconds=settings.TAREAS_BLOQUEO)
+    with conexion.cursor() as cursor:
+        cursor.execute(sql, [EN_CURSO, trabajador, conexion.ops.adapt_datetimefield_value(hasta), PENDIENTE,
+                             conexion.ops.adapt_datetimefield_value(ahora), PENDIENTE])
+        fila = cursor.fetchone()
+    if fila is None:
+        return None
+    # SQLite devuelve el JSON como texto: lo convierte el propio campo
+    argumentos = Tarea._meta.get_field('argumentos').from_db_value(fila[2], None, conexion)
+    return (fila[0], fila[1], argumentos, fila[3], fila[4])
+
+
+def _a_la_cola(tareas, **cambios):
+    """
+    Vuelve a poner pendientes las tareas. Las que tienen clave y ya tienen una
+    gemela pendiente (restricción tarea_clave_pendiente) se quedan como están:
+    la gemela hará el trabajo. Devuelve cuántas volvieron a la cola.
+    """
+    gemela = Tarea.objects.filter(clave=OuterRef('clave'), estado=PENDIENTE)
+    devueltas = tareas.filter(clave__isnull=True).update(estado=PENDIENTE, **cambios)
+    # De a una: dos con la misma clave tampoco pueden quedar pendientes a la vez
+    for id_tarea in tareas.filter(clave__isnull=False).values_list('id', flat=True):
+        try:
+            with transaction.atomic():
+                devueltas += tareas.filter(~Exists(gemela), id=id_tarea).update(estado=PENDIENTE, **cambios)
+        except IntegrityError:
+            pass  # la gemela se encoló entre la comprobación y el UPDATE
+    return devueltas
+
+
+def _espera(intentos):
+    """Segundos hasta el siguiente intento: se duplica con cada fallo, con tope"""
+    return min(settings.TAREAS_REINTENTO_BASE * 2 ** (intentos - 1), settings.TAREAS_REINTENTO_MAX)
+
+
+def ejecutar(fila, trabajador):
+    """Ejecuta una tarea reclamada y guarda el resultado. True si terminó bien."""
+    id_tarea, nombre, argumentos, intentos, max_intentos = fila
+    # Si otro proceso la rescató por tardar demasiado, este ya no escribe el resultado
+    suya = Tarea.objects.filter(id=id_tarea, estado=EN_CURSO, trabajador=trabajador)
+    funcion = _registro.get(nombre)
+    if funcion is None:
+        suya.update(estado=FALLIDA, error=f'Tarea desconocida: {nombre}', terminada=timezone.now())
+        return False
+    try:
+        funcion(*argumentos.get('args', []), **argumentos.get('kwargs', {}))
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Falló la tarea %s #%s (intento %s de %s)', nombre, id_tarea, intentos, max_intentos)
+        if intentos >= max_intentos or not _a_la_cola(
+                suya, error=error, bloqueada_hasta=None,
+                ejecutar_en=timezone.now() + timedelta(seconds=_espera(intentos))):
+            # Sin más intentos, o ya hay otra pendiente con la misma clave que hará el trabajo
+            suya.update(estado=FALLIDA, error=error, bloqueada_hasta=None, terminada=timezone.now())
+        return False
+    suya.update(estado=HECHA, error='', bloqueada_hasta=None, terminada=timezone.now())
+    return True
+
+
+def rescatar():
+    """Devuelve a la cola las tareas en curso cuyo proceso dejó de responder. Devuelve cuántas."""
+    ahora = timezone.now()
+    vencidas = Tarea.objects.filter(estado=EN_CURSO, bloqueada_hasta__lt=ahora)
+    agotadas = vencidas.filter(intentos__gte=F('max_intentos')).update(
+        estado=FALLIDA, error='El proceso no terminó la tarea', bloqueada_hasta=None, terminada=ahora)
+    devueltas = _a_la_cola(vencidas, bloqueada_hasta=None, ejecutar_en=ahora)
+    # Las que quedan en curso tienen una gemela pendiente
+    repetidas = vencidas.update(estado=FALLIDA, error='El proceso no terminó la tarea; ya hay otra pendiente igual',
+                                bloqueada_hasta=None, terminada=ahora)
+    return agotadas + devueltas + repetidas
+
+
+def reintentar(id_tarea):
+    """
+    Vuelve a encolar una tarea fallida desde cero. False si no estaba fallida
+    o si ya hay otra pendiente con su clave.
+    """
+    return bool(_a_la_cola(Tarea.objects.filter(id=id_tarea, estado=FALLIDA),
+                           intentos=0, error='', terminada=None, ejecutar_en=timezone.now()))
+
+
+def purgar(dias):
+    """Borra las tareas terminadas bien hace más de dias días (las fallidas se conservan)"""
+    limite = timezone.now() - timedelta(days=dias)
+    return Tarea.objects.filter(estado=HECHA, terminada__lt=limite).delete()[0]
+
+
+def nombre_trabajador():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def trabajar(trabajador=None, una_vez=False, espera=1.0, seguir=lambda: True):
+    """
+    Bucle de un worker: reclama y ejecuta tareas hasta que seguir() sea falso.
+    Con una_vez termina cuando la cola queda vacía. Devuelve las tareas ejecutadas.
+    """
+    trabajador = trabajador or nombre_trabajador()
+    ejecutadas = 0
+    ultimo_rescate = None
+    while seguir():
+        # Conexiones caídas o demasiado viejas se reabren, como entre peticiones
+        close_old_connections()
+        if ultimo_rescate is None or time.monotonic() - ultimo_rescate > settings.TAREAS_BLOQUEO / 2:
+            rescatar()
+            ultimo_rescate = time.monotonic()
+        fila = reclamar(trabajador)
+        if fila is None:
+            if una_vez:
+                break
+            time.sleep(espera)
+            continue
+        ejecutar(fila, trabajador)
+        ejecutadas += 1
+    return ejecutadas
+
+
+# =====================================================
+# TAREAS
+# =====================================================
+
+@tarea
+def descargar_portada(libro_id, url):
+    """Descarga la portada de OpenLibrary del libro (los fallos de red se reintentan)"""
+    respuesta = requests.get(url, timeout=10)
+    respuesta.raise_for_status()
+    libro = Libro.objects.filter(id=libro_id).first()
+    if libro is None or libro.imagen:
+        return
+    libro.imagen.save(f'libro_{libro.id}.jpg', ContentFile(respuesta.content), save=True)
+
+
+@tarea
+def completar_descripcion(libro_id, work_key):
+    """Trae de OpenLibrary la descripción de un libro que se guardó sin ella"""
+    descripcion = obtener_descripcion(work_key)
+    if descripcion:
+        if (Libro.objects.filter(Q(descripcion='') | Q(descripcion__isnull=True), id=libro_id)
+                .update(descripcion=descripcion, updated_at=timezone.now())):
+            incrementar_version('Libro', libro_id)
+
+
+def _linea_log(registro):
+    fecha_hora = timezone.localtime(registro.fecha_hora).strftime('%d/%m/%Y %H:%M:%S')
+    usuario_str = registro.usuario.username if registro.usuario else 'Anónimo'
+    return (f"[{fecha_hora}] | Usuario: {usuario_str} | Acción: {registro.tipo_accion.upper()} | "
+            f"{registro.descripcion} | IP: {registro.direccion_ip or '-'} | URL: {registro.url or '-'}\n")
+
+
+@tarea
+def volcar_logs(lote=2000):
+    """
+    Añade a logs.txt los registros de actividad nuevos desde la marca
+    (MarcaProceso 'logs.txt'). La marca avanza en la misma transacción en que
+    se escribe el archivo: si la escritura falla, el archivo vuelve a su tamaño
+    anterior y la tarea se reintenta entera sin repetir líneas.
+    """
+    marca, _ = MarcaProceso.objects.get_or_create(nombre=MARCA_LOGS)
+    desde = marca.ultimo_id
+    nuevos = RegistroActividad.objects.filter(id__gt=desde).order_by('id')
+    hasta = nuevos.values_list('id', flat=True).last()
+    if hasta is None:
+        return 0
+    with transaction.atomic():
+        # Avance condicional: si otro worker ya volcó este tramo, no se repite
+        if not MarcaProceso.objects.filter(id=marca.id, ultimo_id=desde).update(ultimo_id=hasta,
+                                                                                 actualizado=timezone.now()):
+            return 0
+        escritos = 0
+        with open(ARCHIVO_LOGS, 'a', encoding='utf-8') as archivo:
+            # Con la marca bloqueada nadie más escribe: el tamaño de ahora es el punto de retorno
+            inicio = archivo.tell()
+            try:
+                lineas = []
+                for registro in nuevos.filter(id__lte=hasta).select_related('usuario').iterator(chunk_size=lote):
+                    lineas.append(_linea_log(registro))
+                    if len(lineas) >= lote:
+                        archivo.write(''.join(lineas))
+                        escritos += len(lineas)
+                        lineas = []
+                archivo.write(''.join(lineas))
+            except BaseException:
+                archivo.truncate(inicio)
+                raise
+    return escritos + len(lineas)
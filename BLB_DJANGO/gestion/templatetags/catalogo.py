@@ -0,0 +1,48 @@
+# Etiquetas de plantilla del catálogo
+#
+#   {% load catalogo %}
+#   {% fragmento_catalogo "lista_libros" "Libro" "Autor" %} ... {% endfragmento_catalogo %}
+#   {% fragmento_catalogo "detalle_libro" libro libro.autor puede_editar %} ... {% endfragmento_catalogo %}
+#
+# Los argumentos después del nombre pueden ser modelos del catálogo ("Libro"),
+# instancias (libro) u otros valores que cambian el HTML (puede_editar). El rol
+# del usuario y si inició sesión se agregan siempre a la clave.
+
+from django import template
+
+from ..cache_catalogo import MARCA_CSRF, clave_fragmento, con_token, guardar_fragmento, obtener_fragmento
+
+register = template.Library()
+
+
+class FragmentoCatalogoNode(template.Node):
+    def __init__(self, nodelist, nombre, dependencias):
+        self.nodelist = nodelist
+        self.nombre = nombre
+        self.dependencias = dependencias
+
+    def render(self, context):
+        nombre = self.nombre.resolve(context)
+        dependencias = [d.resolve(context) for d in self.dependencias]
+        user = context.get('user')
+        variantes = (context.get('rol_usuario', 'visitante'), bool(user and user.is_authenticated))
+        clave = clave_fragmento(nombre, dependencias, variantes)
+
+        html = obtener_fragmento(clave)
+        if html is None:
+            # Se renderiza con un marcador en lugar del token CSRF del usuario
+            with context.push(csrf_token=MARCA_CSRF):
+                html = str(self.nodelist.render(context))
+            guardar_fragmento(clave, html)
+        return con_token(html, context.get('csrf_token', ''))
+
+
+@register.tag
+def fragmento_catalogo(parser, token):
+    partes = token.split_contents()
+    if len(partes) < 2:
+        raise template.TemplateSyntaxError("'fragmento_catalogo' necesita al menos un nombre")
+    nodelist = parser.parse(('endfragmento_catalogo',))
+    parser.delete_first_token()
+    return FragmentoCatalogoNode(nodelist, parser.compile_filter(partes[1]),
+                                 [parser.compile_filter(p) for p in partes[2:]])
@@ -0,0 +1,55 @@
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from gestion.models import Autor, Libro, Perfil, Prestamo
+
+
+class ApiV1Test(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.autor = Autor.objects.create(nombre="Clarice", apellido="Lispector")
+        cls.libros = [Libro.objects.create(titulo=f"Libro {i}", autor=cls.autor, stock=i) for i in range(5)]
+        cls.lector = User.objects.create_user('lector', password='test12345')
+        otro = User.objects.create_user('otro', password='test12345')
+        Perfil.objects.create(usuario=cls.lector, cedula='1', telefono='1', rol='usuario')
+        for usuario in (cls.lector, otro):
+            Prestamo.objects.create(libro=cls.libros[0], usuario=usuario, fecha_max=date.today())
+
+    def test_cursor_recorre_todo_sin_repetir(self):
+        vistos, cursor = [], ''
+        while True:
+            datos = self.client.get(f'/api/v1/libros/?limite=2&cursor={cursor}').json()
+            vistos += [libro['id'] for libro in datos['datos']]
+            if not datos['siguiente']:
+                break
+            cursor = datos['siguiente']
+        self.assertEqual(vistos, [l.id for l in self.libros])
+        self.assertEqual(self.client.get('/api/v1/libros/?cursor=xx').status_code, 400)
+
+    def test_campos_e_inclusion_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            datos = self.client.get('/api/v1/libros/?fields=titulo&include=autor&limite=1').json()
+        self.assertEqual(datos['datos'][0], {'id': self.libros[0].id, 'titulo': 'Libro 0',
+                                             'autor': {'id': self.autor.id, 'nombre': 'Clarice', 'apellido': 'Lispector'}})
+        self.assertIn('siguiente_url', datos)
+        self.assertEqual(self.client.get('/api/v1/libros/?fields=password').status_code, 400)
+        self.assertEqual(self.client.get('/api/v1/libros/?include=usuario').status_code, 400)
+        # Repetir un campo o una relación no cambia la respuesta
+        repetido = self.client.get('/api/v1/libros/?fields=titulo,titulo&include=autor,autor&limite=1').json()
+        self.assertEqual(repetido['datos'], datos['datos'])
+        self.assertEqual(self.client.get(f'/api/v1/libros/{self.libros[0].id}/?include=autor,autor').json()['autor'],
+                         datos['datos'][0]['autor'])
+
+    def test_filtros_y_detalle(self):
+        datos = self.client.get('/api/v1/autores/?q=lispec').json()
+        self.assertEqual([a['apellido'] for a in datos['datos']], ['Lispector'])
+        libro = self.client.get(f'/api/v1/libros/{self.libros[3].id}/?fields=stock').json()
+        self.assertEqual(libro, {'id': self.libros[3].id, 'stock': 3})
+        self.assertEqual(self.client.get('/api/v1/libros/9999/').status_code, 404)
+
+    def test_prestamos_privados(self):
+        self.assertEqual(self.client.get('/api/v1/prestamos/').status_code, 401)
+        self.client.login(username='lector', password='test12345')
+        datos = self.client.get('/api/v1/prestamos/?include=usuario').json()
+        self.assertEqual([p['usuario']['username'] for p in datos['datos']], ['lector'])
@@ -0,0 +1,104 @@
+from time import perf_counter
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from gestion import autocompletar
+from gestion.autocompletar import IndicePrefijos
+from gestion.inventario import ajustar_stock, devolver, prestar
+from gestion.normalizacion import normalizar
+from gestion.models import Autor, Libro
+from gestion.test.test_cache import CACHES_PRUEBA
+
+
+class IndicePrefijosTest(SimpleTestCase):
+    def test_normalizar(self):
+        self.assertEqual(normalizar('¡Cien Años de Soledad!'), 'cien anos de soledad')
+        self.assertEqual(normalizar('  GARCÍA-Márquez '), 'garcia marquez')
+
+    def test_prefijo_y_palabras(self):
+        indice = IndicePrefijos({1: 'El Señor de los Anillos', 2: 'Anillos de Saturno', 3: 'El Hobbit'})
+        self.assertEqual(indice.buscar('anillos'), [2, 1])  # primero los que empiezan así
+        self.assertEqual(indice.buscar('el se'), [1])
+        self.assertEqual(indice.buscar('x'), [])
+
+        indice.poner(3, 'El Hobbit anotado')
+        indice.quitar(2)
+        self.assertEqual(indice.buscar('an'), [1, 3])
+
+    def test_consulta_mas_larga_que_la_clave(self):
+        indice = IndicePrefijos({1: 'Historia de la eternidad y otros ensayos', 2: 'Historia de la eternidad'})
+        self.assertEqual(indice.buscar('historia de la eternidad y otros'), [1])
+
+    def test_menos_de_un_milisegundo(self):
+        indice = IndicePrefijos({i: f'Libro de prueba número {i} volumen {i % 7}' for i in range(20000)})
+        inicio = perf_counter()
+        for _ in range(200):
+            indice.buscar('libro de prueba numero 12')
+        promedio_ms = (perf_counter() - inicio) / 200 * 1000
+        self.assertLess(promedio_ms, 1)
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class AutocompletarEndpointTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.autor = Autor.objects.create(nombre="Jorge Luis", apellido="Borges")
+        Libro.objects.create(titulo="Ficciones", autor=cls.autor)
+
+    def setUp(self):
+        autocompletar._estado['version'] = None
+
+    @mock.patch('gestion.views.buscar_libros', return_value=[])
+    def test_locales_y_parche_por_senal(self, buscar):
+        datos = self.client.get('/api/autocompletar/?q=fic').json()
+        self.assertEqual([l['titulo'] for l in datos['locales']], ['Ficciones'])
+        self.assertEqual(datos['locales'][0]['autor'], 'Jorge Luis Borges')
+        buscar.assert_not_called()
+
+        # El índice ya cargado se parchea (al confirmar) sin volver a consultar la base
+        with self.captureOnCommitCallbacks(execute=True):
+            Libro.objects.create(titulo="El Aleph", autor=self.autor)
+        with self.assertNumQueries(0):
+            datos = self.client.get('/api/autocompletar/?q=aleph').json()
+        self.assertEqual([l['titulo'] for l in datos['locales']], ['El Aleph'])
+
+    @mock.patch('gestion.views.buscar_autores', return_value=[{'name': 'Adolfo Bioy Casares'}])
+    def test_openlibrary_solo_si_faltan_locales(self, buscar):
+        datos = self.client.get('/api/autocompletar/?tipo=autores&externos=1&q=bioy').json()
+        self.assertEqual(datos['locales'], [])
+        self.assertEqual(datos['autores'][0]['nombre'], 'Adolfo Bioy Casares')
+
+        with override_settings(AUTOCOMPLETAR_MINIMO_LOCAL=1):
+            datos = self.client.get('/api/autocompletar/?tipo=autores&externos=1&q=borg').json()
+        self.assertEqual(datos['locales'][0]['nombre'], 'Jorge Luis Borges')
+        self.assertEqual(datos['autores'], [])
+        self.assertEqual(buscar.call_count, 1)
+
+    def test_prestamos_y_stock_no_recargan_el_indice(self):
+        libro = Libro.objects.get(titulo="Ficciones")
+        lector = User.objects.create_user('lector')
+        self.client.get('/api/autocompletar/?q=fic')
+        with mock.patch.object(autocompletar, '_cargar', wraps=autocompletar._cargar) as cargar:
+            with self.captureOnCommitCallbacks(execute=True):
+                prestamo = prestar(lector, timezone.localdate(), libro_id=libro.id)
+                devolver(prestamo)
+                ajustar_stock(libro, 5)
+                libro.refresh_from_db()
+                libro.descripcion = 'Cuentos'
+                libro.save()  # mismo título y autor: no cambia el índice
+            datos = self.client.get('/api/autocompletar/?q=fic').json()
+            cargar.assert_not_called()
+            self.assertEqual([l['titulo'] for l in datos['locales']], ['Ficciones'])
+
+            # Renombrar sí cambia el índice (parcheado aquí, recargado en los demás procesos)
+            with self.captureOnCommitCallbacks(execute=True):
+                libro.titulo = 'Ficciones completas'
+                libro.save()
+            self.client.get('/api/autocompletar/?q=fic')
+            cargar.assert_not_called()
+            autocompletar._estado['version'] -= 1  # como un proceso que no vio el cambio
+            datos = self.client.get('/api/autocompletar/?q=fic').json()
+            cargar.assert_called_once()
+        self.assertEqual([l['titulo'] for l in datos['locales']], ['Ficciones completas'])
@@ -0,0 +1,68 @@
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from gestion import metricas
+from gestion.cache_catalogo import MARCA_CSRF
+from gestion.models import Autor, Libro, Perfil
+
+CACHES_PRUEBA = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'prueba-local'},
+    'compartida': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'prueba-compartida'},
+}
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class CacheCatalogoTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.autor = Autor.objects.create(nombre="Ursula", apellido="Le Guin")
+        cls.libro = Libro.objects.create(titulo="Terramar", autor=cls.autor)
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['compartida'].clear()
+
+    def consultas(self, url):
+        with CaptureQueriesContext(connection) as capturadas:
+            resp = self.client.get(url)
+        return resp, len(capturadas)
+
+    def test_segunda_visita_sale_de_cache(self):
+        _, primera = self.consultas('/libros/')
+        resp, segunda = self.consultas('/libros/')
+        self.assertLess(segunda, primera)
+        self.assertContains(resp, 'Terramar')
+
+    def test_guardar_invalida_lista_y_detalle(self):
+        url_detalle = f'/libros/{self.libro.id}/'
+        self.client.get('/libros/')
+        self.client.get(url_detalle)
+        self.libro.titulo = "Un mago de Terramar"
+        self.libro.save()
+        self.assertContains(self.client.get('/libros/'), 'Un mago de Terramar')
+        self.assertContains(self.client.get(url_detalle), 'Un mago de Terramar')
+
+        # Cambiar el autor invalida el detalle del libro que lo muestra
+        self.autor.apellido = "K. Le Guin"
+        self.autor.save()
+        self.assertContains(self.client.get(url_detalle), 'K. Le Guin')
+
+    def test_variantes_por_rol_y_token_csrf(self):
+        self.assertNotContains(self.client.get('/autores/'), 'Si, Eliminar')
+
+        usuario = User.objects.create_user('bodega', password='test12345')
+        Perfil.objects.create(usuario=usuario, cedula='1', telefono='1', rol='bodeguero')
+        self.client.login(username='bodega', password='test12345')
+        resp = self.client.get('/autores/')
+        self.assertContains(resp, 'Si, Eliminar')
+        self.assertNotContains(resp, MARCA_CSRF)
+        self.assertContains(resp, 'name="csrfmiddlewaretoken"')
+
+    def test_contadores_de_aciertos(self):
+        antes = metricas._contadores.get('blb_cache_aciertos_local_total', 0)
+        self.client.get('/autores/')
+        self.client.get('/autores/')
+        self.assertEqual(metricas._contadores['blb_cache_aciertos_local_total'], antes + 1)
+        self.assertIn('blb_cache_ratio_aciertos', metricas.exportar_prometheus())
@@ -0,0 +1,84 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from gestion.cache_catalogo import versiones
+from gestion.inventario import libros_descuadrados, prestar, reparar, revisar
+from gestion.models import Autor, Ejemplar, Libro, Perfil, Prestamo
+from gestion.test.test_cache import CACHES_PRUEBA
+
+
+class ConciliacionTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.autor = Autor.objects.create(nombre='Juan', apellido='Rulfo')
+        cls.lector = User.objects.create_user('lector', password='test12345')
+        Perfil.objects.create(usuario=cls.lector, cedula='1', telefono='1', rol='usuario')
+
+    def setUp(self):
+        vence = timezone.localdate() + timedelta(days=7)
+        self.libro = Libro.objects.create(titulo='Pedro Páramo', autor=self.autor, stock=3)
+        self.prestamo = prestar(self.lector, vence, libro_id=self.libro.id)
+        self.sano = Libro.objects.create(titulo='El llano en llamas', autor=self.autor, stock=1)
+        # Descuadres: contador pisado, copia prestada sin préstamo y préstamo con la copia en el estante
+        Libro.objects.filter(id=self.libro.id).update(stock=7, disponible=False)
+        Ejemplar.objects.filter(libro=self.libro, numero=2).update(estado='prestado')
+        Ejemplar.objects.filter(id=self.prestamo.ejemplar_id).update(estado='disponible')
+        [self.cargado] = Libro.objects.bulk_create([Libro(titulo='Luvina', autor=self.autor, stock=2)])
+
+    def test_revisar(self):
+        with self.assertNumQueries(1):
+            descuadrados = list(libros_descuadrados())
+        self.assertEqual(descuadrados, [(self.libro.id, 'Pedro Páramo', 7, False, 2)])
+        resumen = revisar()
+        self.assertEqual((resumen['libros'], resumen['sin_ejemplares'], resumen['prestados_sin_prestamo'],
+                          resumen['prestamos_sin_copia']), (1, 1, 1, 1))
+
+    def test_libros_sin_ejemplares_ni_stock(self):
+        # Sin copias el esperado es 0: disponible=True o stock negativo son descuadres
+        [vacio, negativo, cero] = Libro.objects.bulk_create([
+            Libro(titulo='Macario', autor=self.autor, stock=0, disponible=True),
+            Libro(titulo='Talpa', autor=self.autor, stock=-1, disponible=False),
+            Libro(titulo='Diles que no me maten', autor=self.autor, stock=0, disponible=False)])
+        self.assertEqual([fila[0] for fila in libros_descuadrados()], [self.libro.id, vacio.id, negativo.id])
+        reparar(margen=timedelta(0))
+        self.assertEqual(list(Libro.objects.filter(id__in=[vacio.id, negativo.id, cero.id])
+                              .order_by('id').values_list('stock', 'disponible')), [(0, False)] * 3)
+        # El libro con stock y sin copias se expande, no se pone en 0
+        self.assertEqual(Libro.objects.get(id=self.cargado.id).stock, 2)
+        self.assertEqual(list(libros_descuadrados()), [])
+
+    @override_settings(CACHES=CACHES_PRUEBA)
+    def test_reparar(self):
+        # Con el margen por defecto lo recién modificado no se toca
+        self.assertEqual(reparar()['libros'], 0)
+        antes = versiones(f'ver:Libro:{self.libro.id}')
+        with self.captureOnCommitCallbacks() as al_confirmar:
+            reparados = reparar(margen=timedelta(0))
+        self.assertEqual((reparados['prestados_sin_prestamo'], reparados['prestamos_sin_copia'], reparados['libros']),
+                         (1, 1, 1))
+        self.libro.refresh_from_db()
+        self.assertEqual((self.libro.stock, self.libro.disponible), (2, True))
+        # La caché se invalida al confirmar la transacción, no antes
+        self.assertEqual(versiones(f'ver:Libro:{self.libro.id}'), antes)
+        for callback in al_confirmar:
+            callback()
+        self.assertNotEqual(versiones(f'ver:Libro:{self.libro.id}'), antes)
+        self.assertEqual(Ejemplar.objects.get(id=self.prestamo.ejemplar_id).estado, 'prestado')
+        self.assertEqual(self.cargado.ejemplares.filter(estado='disponible').count(), 2)
+        self.assertEqual(Libro.objects.get(id=self.sano.id).stock, 1)
+        self.assertEqual(revisar()['libros'], 0)
+        self.assertEqual(Prestamo.objects.count(), 1)
+
+    def test_comando(self):
+        salida = StringIO()
+        call_command('conciliar_stock', stdout=salida)
+        self.assertIn('Usa --reparar', salida.getvalue())
+        self.assertIn('stock=7 disponible=False -> 2 disponibles', salida.getvalue())
+        call_command('conciliar_stock', '--reparar', '--margen', '0', stdout=StringIO())
+        salida = StringIO()
+        call_command('conciliar_stock', stdout=salida)
+        self.assertIn('Stock conciliado', salida.getvalue())
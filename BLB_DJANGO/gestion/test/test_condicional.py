@@ -0,0 +1,56 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from gestion.models import Autor, Libro
+
+
+class GetCondicionalTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.autor = Autor.objects.create(nombre="Mary", apellido="Shelley")
+        cls.libro = Libro.objects.create(titulo="Frankenstein", autor=cls.autor)
+
+    def test_304_si_no_cambio(self):
+        url = f'/libros/{self.libro.id}/'
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        etag = resp['ETag']
+        self.assertIn('Last-Modified', resp)
+        self.assertIn('no-cache', resp['Cache-Control'])
+
+        # Sin renderizar: solo la consulta de updated_at
+        with self.assertNumQueries(1):
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+        self.autor.apellido = "Wollstonecraft Shelley"
+        self.autor.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_lista_detecta_eliminaciones(self):
+        etag = self.client.get('/libros/')['ETag']
+        Libro.objects.create(titulo="El último hombre", autor=self.autor).delete()
+        self.assertEqual(self.client.get('/libros/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.libro.delete()
+        self.assertEqual(self.client.get('/libros/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_distinto_por_usuario(self):
+        url = f'/autores/{self.autor.id}/'
+        etag_anonimo = self.client.get(url)['ETag']
+        User.objects.create_user('lector', password='test12345')
+        self.client.login(username='lector', password='test12345')
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag_anonimo)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp['ETag'], etag_anonimo)
+        self.assertNotIn('Last-Modified', resp)
+
+    def test_inexistente_sigue_siendo_404(self):
+        self.assertEqual(self.client.get('/libros/9999/').status_code, 404)
+
+    @mock.patch('gestion.views.buscar_libros', return_value=[])
+    def test_api_busqueda(self, buscar):
+        resp = self.client.get('/api/libros/?q=dune')
+        resp = self.client.get('/api/libros/?q=dune', HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(buscar.call_count, 1)
@@ -0,0 +1,70 @@
+import logging
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from gestion import consultas_lentas, metricas
+from gestion.consultas_lentas import huella, peores_consultas
+from gestion.metricas import Medicion
+from gestion.models import Autor, Libro, Perfil
+
+
+@override_settings(CONSULTAS_LENTAS_ACTIVO=True, CONSULTAS_LENTAS_UMBRAL_MS=0)
+class ConsultasLentasTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        autor = Autor.objects.create(nombre="Isaac", apellido="Asimov")
+        Libro.objects.create(titulo="Fundacion", autor=autor)
+        admin = User.objects.create_user('admin', password='test12345')
+        Perfil.objects.create(usuario=admin, cedula='9', telefono='1', rol='admin')
+
+    def setUp(self):
+        consultas_lentas._entradas.clear()
+        # El handler de settings.LOGGING escribe en docs_utiles/: las pruebas no deben tocarlo
+        parche = mock.patch.object(consultas_lentas.logger, 'handlers', [logging.NullHandler()])
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def test_registra_sql_vista_origen_y_plan(self):
+        with self.assertLogs('gestion.consultas_lentas', 'WARNING') as logs:
+            self.client.get('/libros/')
+        self.assertTrue(any('gestion_libro' in linea for linea in logs.output))
+        grupos = peores_consultas()
+        self.assertTrue(grupos)
+        libros = [g for g in grupos if 'FROM "gestion_libro"' in g['sql']]
+        self.assertTrue(libros)
+        ejemplo = libros[0]['ejemplo']
+        self.assertEqual(ejemplo['vista'], 'lista_libros')
+        self.assertIn('gestion/', ejemplo['origen'])
+        self.assertTrue(ejemplo['plan'])
+
+    def test_el_plan_no_cuenta_como_consulta(self):
+        medicion = Medicion()
+        metricas._estado.medicion = medicion
+        try:
+            with CaptureQueriesContext(connection) as capturadas:
+                plan = consultas_lentas._plan(connection, 'SELECT * FROM "gestion_libro" WHERE id = %s', [1])
+        finally:
+            metricas._estado.medicion = None
+        self.assertTrue(plan)
+        self.assertNotIn('sin plan', plan[0])
+        self.assertEqual((medicion.consultas, len(capturadas)), (0, 0))
+
+    def test_pagina_para_personal(self):
+        self.client.login(username='admin', password='test12345')
+        self.client.get('/libros/')
+        resp = self.client.get('/consultas-lentas/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, 'gestion_libro')
+
+
+class HuellaTest(SimpleTestCase):
+    def test_misma_huella_con_distintos_valores(self):
+        a = huella('SELECT * FROM "gestion_libro" WHERE "id" IN (%s, %s, %s) AND stock > 5')
+        b = huella('SELECT * FROM "gestion_libro" WHERE "id" IN (%s) AND stock > 10')
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, huella('SELECT * FROM "gestion_autor"'))
+        self.assertEqual(huella('SELECT * FROM t WHERE id IN (%s, %s)')[0],
+                         huella('SELECT * FROM t WHERE id IN (%s, %s, %s, %s)')[0])
@@ -0,0 +1,73 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from gestion.deduplicacion import duplicados_exactos, duplicados_similares, fusionar
+from gestion.models import Autor, Libro, Perfil
+from gestion.normalizacion import clave_autor, similitud, trigramas
+
+
+class ClaveAutorTest(SimpleTestCase):
+    def test_variantes_del_mismo_nombre(self):
+        clave = clave_autor('J. R. R.', 'Tolkien')
+        self.assertEqual(clave, 'jrr tolkien')
+        self.assertEqual(clave_autor('J.R.R.', 'Tolkien'), clave)
+        self.assertEqual(clave_autor('Tolkien, JRR'), clave)
+        self.assertEqual(clave_autor('Gabriel', 'GARCÍA MÁRQUEZ'), clave_autor('gabriel garcia marquez'))
+
+    def test_similitud_trigramas(self):
+        a = trigramas(clave_autor('Gabriel', 'García Márquez'))
+        self.assertGreater(similitud(a, trigramas(clave_autor('Gabriel', 'Garcia Marques'))), 0.75)
+        self.assertLess(similitud(a, trigramas(clave_autor('Isabel', 'Allende'))), 0.2)
+
+
+class DeduplicacionTest(TestCase):
+    def setUp(self):
+        self.tolkien = Autor.objects.create(nombre='J. R. R.', apellido='Tolkien', bibliografia='Filólogo')
+        self.copia = Autor.objects.create(nombre='J.R.R.', apellido='Tolkien')
+        self.gabo = Autor.objects.create(nombre='Gabriel', apellido='García Márquez')
+        self.gabo_mal = Autor.objects.create(nombre='Gabriel', apellido='Garcia Marques')
+        Libro.objects.create(titulo='El Hobbit', autor=self.copia)
+        Libro.objects.create(titulo='El Silmarillion', autor=self.copia)
+        Libro.objects.create(titulo='Cien años de soledad', autor=self.gabo)
+
+    def test_clave_al_guardar(self):
+        self.assertEqual(self.tolkien.clave_normalizada, self.copia.clave_normalizada)
+        self.copia.apellido = 'Tolkien Jr'
+        self.copia.save(update_fields=['apellido'])
+        self.copia.refresh_from_db()
+        self.assertEqual(self.copia.clave_normalizada, 'jr jrr tolkien')
+
+    def test_grupos(self):
+        self.assertEqual(duplicados_exactos(), [[self.tolkien.id, self.copia.id]])
+        self.assertIn([self.gabo.id, self.gabo_mal.id], duplicados_similares(0.75))
+
+    def test_fusionar(self):
+        eliminados, movidos = fusionar([[self.tolkien.id, self.copia.id]])
+        self.assertEqual((eliminados, movidos), (1, 0))
+        # Se conserva el que tiene más libros y hereda la biografía
+        principal = Autor.objects.get(clave_normalizada='jrr tolkien')
+        self.assertEqual(principal.id, self.copia.id)
+        self.assertEqual(principal.bibliografia, 'Filólogo')
+        self.assertEqual(principal.libros.count(), 2)
+
+    def test_comando(self):
+        salida = StringIO()
+        call_command('deduplicar_autores', '--similares', stdout=salida)
+        self.assertIn('Usa --fusionar', salida.getvalue())
+        self.assertEqual(Autor.objects.count(), 4)
+
+        call_command('deduplicar_autores', '--similares', '--fusionar', stdout=salida)
+        self.assertEqual(Autor.objects.count(), 2)
+        self.assertEqual(Libro.objects.filter(autor=self.gabo).count(), 1)
+
+    @mock.patch('gestion.views.registrar_log')
+    def test_crear_libro_reutiliza_autor(self, registrar_log):
+        usuario = User.objects.create_user('bodega', password='test12345')
+        Perfil.objects.create(usuario=usuario, cedula='1', telefono='1', rol='bodeguero')
+        self.client.login(username='bodega', password='test12345')
+        self.client.post('/libros/nuevo/', {'titulo': 'Beren y Lúthien', 'autor_nombre': 'J R R Tolkien', 'stock': 1})
+        self.assertEqual(Autor.objects.filter(clave_normalizada='jrr tolkien').count(), 2)
+        self.assertEqual(Libro.objects.get(titulo='Beren y Lúthien').autor_id, self.tolkien.id)
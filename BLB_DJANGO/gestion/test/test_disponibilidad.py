@@ -0,0 +1,71 @@
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from gestion.models import Autor, Libro, Prestamo, SolicitudPrestamo
+from gestion.test.test_cache import CACHES_PRUEBA
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class DisponibilidadTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        autor = Autor.objects.create(nombre="Juan Carlos", apellido="Onetti")
+        cls.libros = [Libro.objects.create(titulo=f"Tomo {i}", autor=autor, stock=2) for i in range(40)]
+        cls.lector = User.objects.create_user('lector', password='test12345')
+        hoy = date.today()
+        for dias in (10, 3):
+            Prestamo.objects.create(libro=cls.libros[0], usuario=cls.lector, fecha_max=hoy + timedelta(days=dias))
+        Prestamo.objects.create(libro=cls.libros[0], usuario=cls.lector, fecha_max=hoy - timedelta(days=30),
+                                fecha_devolucion=hoy)
+        SolicitudPrestamo.objects.create(libro=cls.libros[0], usuario=cls.lector)
+        SolicitudPrestamo.objects.create(libro=cls.libros[1], usuario=cls.lector, estado='rechazada')
+
+    def url(self, ids):
+        return '/api/v1/disponibilidad/?ids=' + ','.join(map(str, ids))
+
+    def test_consultas_constantes(self):
+        ids = [l.id for l in self.libros]
+        with self.assertNumQueries(1):
+            datos = self.client.get(self.url(ids + [9999])).json()
+        self.assertEqual(len(datos['libros']), 40)
+        self.assertEqual(datos['no_encontrados'], [9999])
+        primero = datos['libros'][str(self.libros[0].id)]
+        self.assertEqual((primero['cola'], primero['prestados']), (1, 2))
+        self.assertEqual(primero['proxima_devolucion'], (date.today() + timedelta(days=3)).isoformat())
+        segundo = datos['libros'][str(self.libros[1].id)]
+        self.assertEqual((segundo['cola'], segundo['proxima_devolucion']), (0, None))
+
+    def test_etag_y_cache(self):
+        url = self.url([self.libros[1].id, self.libros[0].id])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            self.assertEqual(self.client.get(url)['ETag'], etag)
+        # Una solicitud nueva cambia la cola: nueva versión, nuevo ETag
+        SolicitudPrestamo.objects.create(libro=self.libros[1], usuario=self.lector)
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['libros'][str(self.libros[1].id)]['cola'], 1)
+
+    def test_limites(self):
+        self.assertEqual(self.client.get('/api/v1/disponibilidad/').status_code, 400)
+        self.assertEqual(self.client.get(self.url(range(1, 102))).status_code, 400)
+        # Un id que no cabe en 64 bits se ignora en lugar de romper la consulta
+        self.assertEqual(self.client.get(self.url([2 ** 64])).status_code, 400)
+        self.assertEqual(self.client.get(self.url([2 ** 64, 9999])).json()['no_encontrados'], [9999])
+        self.assertEqual(self.client.get('/api/v1/disponibilidad/sucursales/?ids=' + str(2 ** 64)).status_code, 400)
+
+    def test_por_isbn(self):
+        Libro.objects.filter(id=self.libros[0].id).update(isbn='9788437604947')
+        with self.assertNumQueries(1):
+            datos = self.client.get(self.url(['84-376-0494-X', self.libros[0].id, '978-0-00-000000-2'])).json()
+        por_isbn = datos['libros']['9788437604947']
+        self.assertEqual((por_isbn['id'], por_isbn['prestados']), (self.libros[0].id, 2))
+        self.assertEqual(datos['libros'][str(self.libros[0].id)], por_isbn)
+        self.assertEqual(datos['no_encontrados'], ['9780000000002'])
+        # El ETag y la caché usan el código normalizado: la misma consulta escrita distinto es la misma
+        etag = self.client.get(self.url(['9788437604947']))['ETag']
+        with self.assertNumQueries(0):
+            resp = self.client.get(self.url([' 978-84-376-0494-7', '843760494x']), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
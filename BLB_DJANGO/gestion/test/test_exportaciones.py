@@ -0,0 +1,54 @@
+import json
+from datetime import date, timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from gestion.models import Autor, Libro, Multa, Perfil, Prestamo
+
+
+@mock.patch('gestion.views.registrar_log')
+class ExportacionesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        autor = Autor.objects.create(nombre="Rómulo", apellido="Gallegos")
+        cls.libro = Libro.objects.create(titulo="Doña Bárbara", autor=autor)
+        Libro.objects.create(titulo="Canaima", autor=autor, disponible=False)
+        lector = User.objects.create_user('lector', password='test12345')
+        hoy = date.today()
+        cls.vencido = Prestamo.objects.create(libro=cls.libro, usuario=lector, fecha_prestamos=hoy - timedelta(days=20),
+                                              fecha_max=hoy - timedelta(days=5))
+        Prestamo.objects.create(libro=cls.libro, usuario=lector, fecha_prestamos=hoy - timedelta(days=30),
+                                fecha_max=hoy - timedelta(days=23), fecha_devolucion=hoy - timedelta(days=25))
+        Multa.objects.create(prestamo=cls.vencido, tipo='p', monto=30)
+        bibliotecaria = User.objects.create_user('biblio', password='test12345')
+        Perfil.objects.create(usuario=bibliotecaria, cedula='1', telefono='1', rol='bibliotecario')
+
+    def setUp(self):
+        self.client.login(username='biblio', password='test12345')
+
+    def test_csv_en_streaming(self, registrar_log):
+        resp = self.client.get('/exportar/prestamos/?estado=vencidos')
+        self.assertTrue(resp.streaming)
+        self.assertIn('attachment', resp['Content-Disposition'])
+        lineas = b''.join(resp.streaming_content).decode().splitlines()
+        self.assertEqual(lineas[0], 'id,libro_id,libro,usuario,fecha_prestamo,fecha_max,fecha_devolucion,dias_retraso')
+        self.assertEqual(len(lineas), 2)
+        self.assertTrue(lineas[1].endswith(',5'))
+
+    def test_jsonl_y_filtros(self, registrar_log):
+        resp = self.client.get('/exportar/libros/?disponible=0&formato=jsonl')
+        filas = [json.loads(l) for l in b''.join(resp.streaming_content).decode().splitlines()]
+        self.assertEqual([(f['titulo'], f['autor_apellido']) for f in filas], [('Canaima', 'Gallegos')])
+        multa = json.loads(b''.join(self.client.get('/exportar/multas/?formato=jsonl').streaming_content))
+        self.assertEqual((multa['tipo'], multa['monto'], multa['usuario']), ('p', '30.00', 'lector'))
+        # La lista acepta los mismos filtros
+        self.assertEqual(len(self.client.get('/prestamos/?estado=devueltos').context['prestamos']), 1)
+
+    def test_permisos_y_formato(self, registrar_log):
+        self.assertEqual(self.client.get('/exportar/prestamos/?formato=xml').status_code, 400)
+        self.assertEqual(self.client.get('/exportar/usuarios/').status_code, 404)
+        self.client.logout()
+        User.objects.create_user('otro', password='test12345')
+        self.client.login(username='otro', password='test12345')
+        self.assertEqual(self.client.get('/exportar/multas/').status_code, 403)
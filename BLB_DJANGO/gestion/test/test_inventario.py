@@ -0,0 +1,133 @@
+from datetime import timedelta
+from importlib import import_module
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from gestion.inventario import ajustar_stock, devolver, expandir_stock, prestar
+from gestion.models import Autor, Ejemplar, Libro, Perfil, Prestamo
+
+
+class InventarioTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.autor = Autor.objects.create(nombre='Juan', apellido='Rulfo')
+        cls.lector = User.objects.create_user('lector', password='test12345')
+        Perfil.objects.create(usuario=cls.lector, cedula='1', telefono='1', rol='usuario')
+        cls.vence = timezone.localdate() + timedelta(days=7)
+
+    def setUp(self):
+        self.libro = Libro.objects.create(titulo='Pedro Páramo', autor=self.autor, stock=2)
+
+    def test_libro_nuevo_crea_ejemplares(self):
+        self.assertEqual(list(self.libro.ejemplares.values_list('codigo_barras', 'estado')),
+                         [(f'EJ-{self.libro.id}-1', 'disponible'), (f'EJ-{self.libro.id}-2', 'disponible')])
+
+    def test_prestar_reclama_con_un_update(self):
+        with CaptureQueriesContext(connection) as consultas:
+            prestamo = prestar(self.lector, self.vence, libro_id=self.libro.id)
+        sobre_ejemplares = [q['sql'] for q in consultas if 'gestion_ejemplar' in q['sql']]
+        self.assertEqual(len(sobre_ejemplares), 1)
+        self.assertIn('RETURNING', sobre_ejemplares[0])
+        self.assertEqual(prestamo.ejemplar.estado, 'prestado')
+
+        prestar(self.lector, self.vence, libro_id=self.libro.id)
+        self.libro.refresh_from_db()
+        self.assertEqual((self.libro.stock, self.libro.disponible), (0, False))
+        self.assertIsNone(prestar(self.lector, self.vence, libro_id=self.libro.id))
+        self.assertEqual(Prestamo.objects.count(), 2)
+
+    def test_prestar_ejemplar_escaneado(self):
+        codigo = f'ej-{self.libro.id}-2'
+        prestamo = prestar(self.lector, self.vence, codigo=codigo)
+        self.assertEqual((prestamo.libro_id, prestamo.ejemplar.numero), (self.libro.id, 2))
+        self.assertIsNone(prestar(self.lector, self.vence, codigo=codigo))
+
+    def test_devolver(self):
+        prestamo = prestar(self.lector, self.vence, libro_id=self.libro.id)
+        self.assertTrue(devolver(prestamo))
+        self.assertFalse(devolver(prestamo))
+        self.libro.refresh_from_db()
+        self.assertEqual(self.libro.stock, 2)
+
+        perdido = prestar(self.lector, self.vence, libro_id=self.libro.id)
+        devolver(perdido, perdido=True)
+        self.libro.refresh_from_db()
+        self.assertEqual(self.libro.stock, 1)
+        self.assertEqual(Ejemplar.objects.get(id=perdido.ejemplar_id).estado, 'baja')
+
+    def test_ajustar_stock_no_toca_prestados(self):
+        prestamo = prestar(self.lector, self.vence, libro_id=self.libro.id)
+        self.assertEqual(ajustar_stock(self.libro, 0), 0)
+        self.assertEqual(Ejemplar.objects.get(id=prestamo.ejemplar_id).estado, 'prestado')
+        self.assertEqual(ajustar_stock(self.libro, 3), 3)
+        self.assertEqual(self.libro.ejemplares.count(), 5)
+        self.assertTrue(self.libro.disponible)
+
+    def test_expandir_stock(self):
+        [cargado] = Libro.objects.bulk_create([Libro(titulo='El llano en llamas', autor=self.autor, stock=2)])
+        abierto = Prestamo.objects.create(libro=cargado, usuario=self.lector, fecha_max=self.vence)
+        self.assertEqual(expandir_stock(Libro, Prestamo, Ejemplar), 3)
+        abierto.refresh_from_db()
+        self.assertEqual(abierto.ejemplar.estado, 'prestado')
+        self.assertEqual(cargado.ejemplares.filter(estado='disponible').count(), 2)
+        # Los libros que ya tienen ejemplares no se vuelven a expandir
+        self.assertEqual(expandir_stock(Libro, Prestamo, Ejemplar), 0)
+
+
+    @mock.patch('gestion.inventario.incrementar_version')
+    def test_invalida_la_cache_al_confirmar(self, incrementar_version):
+        with self.captureOnCommitCallbacks(execute=True):
+            prestamo = prestar(self.lector, self.vence, libro_id=self.libro.id)
+            # Antes del COMMIT otro proceso podría volver a guardar el stock viejo en la caché
+            incrementar_version.assert_not_called()
+        incrementar_version.assert_called_once_with('Libro', self.libro.id)
+        incrementar_version.reset_mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            devolver(prestamo)
+            incrementar_version.assert_not_called()
+        self.assertEqual(sorted(c.args for c in incrementar_version.call_args_list),
+                         [('Libro', self.libro.id), ('Prestamo',)])
+
+    def test_migracion_de_ejemplares(self):
+        [negativo, sin_marcar] = Libro.objects.bulk_create([
+            Libro(titulo='El gallo de oro', autor=self.autor, stock=-2, disponible=True),
+            Libro(titulo='Luvina', autor=self.autor, stock=1, disponible=False)])
+        import_module('gestion.migrations.0018_ejemplar').crear_ejemplares(apps, None)
+        negativo.refresh_from_db()
+        sin_marcar.refresh_from_db()
+        self.assertEqual((negativo.stock, negativo.disponible), (0, False))
+        self.assertEqual((sin_marcar.disponible, sin_marcar.ejemplares.count()), (True, 1))
+
+
+class InventarioVistasTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.libro = Libro.objects.create(titulo='Pedro Páramo', autor=Autor.objects.create(nombre='Juan', apellido='Rulfo'))
+        cls.lector = User.objects.create_user('lector', password='test12345')
+        Perfil.objects.create(usuario=cls.lector, cedula='1', telefono='1', rol='usuario')
+        cls.bibliotecario = User.objects.create_user('biblio', password='test12345')
+        Perfil.objects.create(usuario=cls.bibliotecario, cedula='2', telefono='1', rol='bibliotecario')
+
+    @mock.patch('gestion.views.registrar_log')
+    def test_prestamo_y_devolucion_doble(self, registrar_log):
+        self.client.login(username='biblio', password='test12345')
+        hoy = timezone.localdate()
+        self.client.post('/prestamos/nuevo/', {'libro': f'EJ-{self.libro.id}-1', 'usuario': 'lector',
+                                               'fecha_prestamo': hoy.isoformat(), 'fecha_max': hoy.isoformat()})
+        prestamo = Prestamo.objects.get()
+        self.assertEqual(prestamo.ejemplar.codigo_barras, f'EJ-{self.libro.id}-1')
+        respuesta = self.client.post('/prestamos/nuevo/', {'libro': self.libro.id, 'usuario': 'lector',
+                                                           'fecha_prestamo': hoy.isoformat(), 'fecha_max': hoy.isoformat()})
+        self.assertContains(respuesta, 'no tiene stock disponible')
+
+        for _ in range(2):
+            self.client.post(f'/prestamos/{prestamo.id}/devolver/', {'estado_libro': 'bueno'})
+        self.libro.refresh_from_db()
+        self.assertEqual(self.libro.stock, 1)
+        pagina = self.client.get(f'/libros/{self.libro.id}/ejemplares/')
+        self.assertContains(pagina, f'EJ-{self.libro.id}-1')
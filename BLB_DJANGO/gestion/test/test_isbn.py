@@ -0,0 +1,118 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from gestion.models import Autor, Libro, Perfil, Prestamo
+from gestion.normalizacion import normalizar_isbn
+
+
+class NormalizarIsbnTest(SimpleTestCase):
+    def test_isbn10_y_13(self):
+        self.assertEqual(normalizar_isbn('84-376-0494-X'), '9788437604947')
+        self.assertEqual(normalizar_isbn('978 84 376 0494 7'), '9788437604947')
+        self.assertEqual(normalizar_isbn('0-306-40615-2'), '9780306406157')
+
+    def test_invalidos(self):
+        self.assertIsNone(normalizar_isbn('84-376-0494-1'))
+        self.assertIsNone(normalizar_isbn('9788437604948'))
+        self.assertIsNone(normalizar_isbn('123'))
+        self.assertIsNone(normalizar_isbn(None))
+
+
+class IsbnTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.autor = Autor.objects.create(nombre='Gabriel', apellido='García Márquez')
+        cls.libro = Libro.objects.create(titulo='Cien años de soledad', autor=cls.autor, stock=2,
+                                         isbn='84-376-0494-X')
+        cls.lector = User.objects.create_user('lector', password='test12345', first_name='Ana')
+        Perfil.objects.create(usuario=cls.lector, cedula='1712345678', telefono='1', rol='usuario')
+        bibliotecario = User.objects.create_user('biblio', password='test12345')
+        Perfil.objects.create(usuario=bibliotecario, cedula='2', telefono='1', rol='bibliotecario')
+
+    def test_se_guarda_normalizado_y_unico(self):
+        self.assertEqual(self.libro.isbn, '9788437604947')
+        Libro.objects.create(titulo='Sin ISBN', autor=self.autor)
+        Libro.objects.create(titulo='Otro sin ISBN', autor=self.autor, isbn='')
+        with self.assertRaises(IntegrityError):
+            Libro.objects.create(titulo='Duplicado', autor=self.autor, isbn='9788437604947')
+
+    def test_api_por_isbn_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            datos = self.client.get('/api/v1/libros/isbn/84-376-0494-X/').json()
+        self.assertEqual((datos['id'], datos['isbn'], datos['stock']), (self.libro.id, '9788437604947', 2))
+        self.assertEqual(self.client.get('/api/v1/libros/isbn/9780306406157/').status_code, 404)
+        self.assertEqual(self.client.get('/api/v1/libros/isbn/123/').status_code, 400)
+        datos = self.client.get('/api/v1/libros/?isbn=843760494X').json()
+        self.assertEqual([l['id'] for l in datos['datos']], [self.libro.id])
+
+    def test_escanear(self):
+        self.client.login(username='biblio', password='test12345')
+        datos = self.client.get('/prestamos/escanear/?libro=9788437604947').json()
+        self.assertEqual(datos['titulo'], 'Cien años de soledad')
+        datos = self.client.get('/prestamos/escanear/?usuario=1712345678').json()
+        self.assertEqual((datos['username'], datos['nombre']), ('lector', 'Ana'))
+        self.assertEqual(self.client.get('/prestamos/escanear/?usuario=biblio').status_code, 404)
+
+    @mock.patch('gestion.views.registrar_log')
+    def test_prestamo_con_codigos_escaneados(self, registrar_log):
+        self.client.login(username='biblio', password='test12345')
+        pagina = self.client.get('/prestamos/nuevo/')
+        self.assertNotContains(pagina, '<option')
+        hoy = timezone.localdate()
+        respuesta = self.client.post('/prestamos/nuevo/', {
+            'libro': '84-376-0494-X', 'usuario': '1712345678',
+            'fecha_prestamo': hoy.isoformat(), 'fecha_max': (hoy + timedelta(days=7)).isoformat()})
+        prestamo = Prestamo.objects.get()
+        self.assertRedirects(respuesta, f'/prestamos/{prestamo.id}', fetch_redirect_response=False)
+        self.assertEqual((prestamo.libro_id, prestamo.usuario_id), (self.libro.id, self.lector.id))
+        self.libro.refresh_from_db()
+        self.assertEqual(self.libro.stock, 1)
+
+        respuesta = self.client.post('/prestamos/nuevo/', {
+            'libro': '9780306406157', 'usuario': 'lector',
+            'fecha_prestamo': hoy.isoformat(), 'fecha_max': hoy.isoformat()})
+        self.assertContains(respuesta, 'No hay ningún libro con el código 9780306406157')
+
+    @mock.patch('gestion.views.registrar_log')
+    def test_crear_libro_valida_isbn(self, registrar_log):
+        bodeguero = User.objects.create_user('bodega', password='test12345')
+        Perfil.objects.create(usuario=bodeguero, cedula='3', telefono='1', rol='bodeguero')
+        self.client.login(username='bodega', password='test12345')
+        datos = {'titulo': 'El amor en los tiempos del cólera', 'autor': self.autor.id, 'stock': 1}
+        respuesta = self.client.post('/libros/nuevo/', {**datos, 'isbn': '978-84-376-0494-7'})
+        self.assertContains(respuesta, 'Ya existe un libro con el ISBN')
+        respuesta = self.client.post('/libros/nuevo/', {**datos, 'isbn': '0-306-40615-2'})
+        self.assertEqual(Libro.objects.get(titulo=datos['titulo']).isbn, '9780306406157')
+        # Si otro libro toma el ISBN entre la validación y el INSERT, el índice único responde
+        with mock.patch('gestion.views._error_isbn', return_value=None):
+            respuesta = self.client.post('/libros/nuevo/', {**datos, 'titulo': 'Otro', 'isbn': '9780306406157'})
+        self.assertContains(respuesta, 'Ya existe un libro con el ISBN')
+        self.assertFalse(Libro.objects.filter(titulo='Otro').exists())
+
+    @mock.patch('gestion.views.registrar_log')
+    def test_editar_libro_valida_isbn(self, registrar_log):
+        bodeguero = User.objects.create_user('bodega', password='test12345')
+        Perfil.objects.create(usuario=bodeguero, cedula='3', telefono='1', rol='bodeguero')
+        otro = Libro.objects.create(titulo='Relato de un náufrago', autor=self.autor)
+        self.client.login(username='bodega', password='test12345')
+        self.assertContains(self.client.get(f'/libros/{self.libro.id}/editar/'), 'value="9788437604947"')
+        datos = {'titulo': otro.titulo, 'autor': self.autor.id}
+        url = f'/libros/{otro.id}/editar/'
+        self.assertContains(self.client.post(url, {**datos, 'isbn': '123'}), 'El ISBN 123 no es válido')
+        self.assertContains(self.client.post(url, {**datos, 'isbn': '84-376-0494-X'}), 'Ya existe un libro con el ISBN')
+        with mock.patch('gestion.views._error_isbn', return_value=None):
+            respuesta = self.client.post(url, {**datos, 'isbn': '84-376-0494-X'})
+        self.assertContains(respuesta, 'Ya existe un libro con el ISBN')
+        otro.refresh_from_db()
+        self.assertIsNone(otro.isbn)
+        self.client.post(url, {**datos, 'isbn': '0-306-40615-2'})
+        otro.refresh_from_db()
+        self.assertEqual(otro.isbn, '9780306406157')
+        # Guardar el libro con su propio ISBN no es un duplicado
+        self.assertEqual(self.client.post(f'/libros/{self.libro.id}/editar/',
+                                          {'titulo': self.libro.titulo, 'autor': self.autor.id,
+                                           'isbn': '9788437604947'}).status_code, 302)
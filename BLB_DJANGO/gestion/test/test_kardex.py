@@ -0,0 +1,90 @@
+from datetime import datetime, time, timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from gestion.inventario import ajustar_en_bloque, devolver, prestar
+from gestion.kardex import compactar, sembrar_fotos, stock_en
+from gestion.models import Autor, FotoStock, Libro, MovimientoStock, Perfil
+
+
+class KardexTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.autor = Autor.objects.create(nombre='Elena', apellido='Garro')
+        cls.lector = User.objects.create_user('lector', password='test12345')
+        Perfil.objects.create(usuario=cls.lector, cedula='1', telefono='1', rol='usuario')
+        cls.biblio = User.objects.create_user('biblio', password='test12345')
+        Perfil.objects.create(usuario=cls.biblio, cedula='2', telefono='1', rol='bibliotecario')
+        cls.hoy = timezone.localdate()
+
+    def a_las(self, dias_atras, hora=12):
+        return timezone.make_aware(datetime.combine(self.hoy - timedelta(days=dias_atras), time(hora)))
+
+    def test_prestamo_y_devolucion_anotados(self):
+        libro = Libro.objects.create(titulo='Los recuerdos del porvenir', autor=self.autor, stock=2)
+        prestamo = prestar(self.lector, self.hoy, libro_id=libro.id, actor=self.biblio)
+        devolver(prestamo, actor=self.biblio)
+        self.assertEqual(list(libro.movimientos.order_by('id').values_list('delta', 'motivo', 'usuario__username')),
+                         [(2, 'alta', None), (-1, 'prestamo', 'biblio'), (1, 'devolucion', 'biblio')])
+
+    def test_ajuste_en_bloque_con_un_insert(self):
+        libros = [Libro.objects.create(titulo=f'Libro {n}', autor=self.autor, stock=1).id for n in range(5)]
+        with CaptureQueriesContext(connection) as consultas:
+            ajustar_en_bloque({libro_id: 3 for libro_id in libros}, actor=self.biblio)
+        inserts = [q for q in consultas if q['sql'].startswith('INSERT INTO "gestion_movimientostock"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(MovimientoStock.objects.filter(motivo='ajuste', delta=2, usuario=self.biblio).count(), 5)
+
+    def test_stock_a_una_fecha(self):
+        libro = Libro.objects.create(titulo='La semana de colores', autor=self.autor, stock=0)
+        FotoStock.objects.create(libro=libro, fecha=self.hoy - timedelta(days=10), stock=5)
+        for dias, delta in ((5, -1), (2, 3), (0, -2)):
+            MovimientoStock.objects.create(libro=libro, delta=delta, motivo='ajuste', fecha=self.a_las(dias))
+
+        self.assertEqual(compactar(hasta=self.hoy - timedelta(days=3)), 1)
+        self.assertEqual(FotoStock.objects.get(libro=libro, fecha=self.hoy - timedelta(days=3)).stock, 4)
+        self.assertEqual(compactar(hasta=self.hoy - timedelta(days=3)), 0)
+        with self.assertNumQueries(2):
+            self.assertEqual(stock_en(libro.id, self.hoy - timedelta(days=1)), 7)
+        self.assertEqual(stock_en(libro.id, self.hoy - timedelta(days=4)), 4)
+        self.assertEqual(stock_en(libro.id, self.hoy - timedelta(days=6)), 5)
+        self.assertEqual(stock_en(libro.id, self.hoy), 5)
+
+        # La siguiente pasada solo suma lo nuevo a la foto anterior
+        self.assertEqual(compactar(), 1)
+        self.assertEqual(FotoStock.objects.get(libro=libro, fecha=self.hoy - timedelta(days=1)).stock, 7)
+
+    def test_no_compacta_antes_de_la_ultima_foto(self):
+        libro = Libro.objects.create(titulo='Recuerdo de Tlatelolco', autor=self.autor, stock=0)
+        FotoStock.objects.create(libro=libro, fecha=self.hoy - timedelta(days=2), stock=5)
+        MovimientoStock.objects.create(libro=libro, delta=-1, motivo='ajuste', fecha=self.a_las(4))
+        with self.assertRaises(ValueError):
+            compactar(hasta=self.hoy - timedelta(days=4))
+        self.assertFalse(FotoStock.objects.filter(fecha=self.hoy - timedelta(days=4)).exists())
+        with self.assertRaises(CommandError):
+            call_command('compactar_kardex', hasta=(self.hoy - timedelta(days=4)).isoformat())
+
+    def test_sembrar_solo_libros_sin_historia(self):
+        [cargado] = Libro.objects.bulk_create([Libro(titulo='Felipe Ángeles', autor=self.autor, stock=4)])
+        Libro.objects.create(titulo='Testimonios sobre Mariana', autor=self.autor, stock=1)
+        ayer = self.hoy - timedelta(days=1)
+        self.assertEqual(sembrar_fotos(Libro, FotoStock, MovimientoStock, ayer), 1)
+        self.assertEqual(stock_en(cargado.id, self.hoy), 4)
+
+    @mock.patch('gestion.views.registrar_log')
+    def test_pagina_de_ejemplares(self, registrar_log):
+        libro = Libro.objects.create(titulo='Andamos huyendo Lola', autor=self.autor, stock=3)
+        bodeguero = User.objects.create_user('bodega', password='test12345')
+        Perfil.objects.create(usuario=bodeguero, cedula='3', telefono='1', rol='bodeguero')
+        self.client.login(username='bodega', password='test12345')
+        self.client.post('/stock/', {'libro_id': libro.id, 'stock': 1})
+        respuesta = self.client.get(f'/libros/{libro.id}/ejemplares/?fecha={self.hoy.isoformat()}')
+        self.assertEqual(respuesta.context['stock_fecha'], 1)
+        self.assertEqual([(m.delta, m.motivo, m.usuario_id) for m in respuesta.context['movimientos']],
+                         [(-2, 'ajuste', bodeguero.id), (3, 'alta', None)])
@@ -0,0 +1,81 @@
+import threading
+from time import perf_counter
+
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from gestion import metricas
+from gestion.metricas import Histograma, Medicion, MetricasMiddleware
+from gestion.models import Autor, Libro, Perfil
+
+
+class MetricasMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        autor = Autor.objects.create(nombre="Isaac", apellido="Asimov")
+        Libro.objects.create(titulo="Fundacion", autor=autor)
+
+    def test_cabecera_server_timing(self):
+        resp = self.client.get('/libros/')
+        cabecera = resp['Server-Timing']
+        self.assertIn('total;dur=', cabecera)
+        self.assertIn('tpl;dur=', cabecera)
+        self.assertNotIn('db;dur=0.0;desc="0 consultas"', cabecera)
+
+    def test_metrics_solo_personal(self):
+        User.objects.create_user('normal', password='test12345')
+        self.client.login(username='normal', password='test12345')
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+        admin = User.objects.create_user('admin', password='test12345')
+        Perfil.objects.create(usuario=admin, cedula='9', telefono='1', rol='admin')
+        self.client.login(username='admin', password='test12345')
+        self.client.get('/libros/')
+        resp = self.client.get('/metrics')
+        self.assertEqual(resp.status_code, 200)
+        texto = resp.content.decode()
+        self.assertIn('# TYPE blb_peticion_segundos histogram', texto)
+        self.assertIn('blb_consultas_count{vista="lista_libros"}', texto)
+        self.assertIn('blb_peticion_segundos_bucket{vista="lista_libros",le="+Inf"}', texto)
+
+
+class HistogramaTest(SimpleTestCase):
+    def test_buckets_acumulados(self):
+        histograma = Histograma((0.1, 1.0))
+        for valor in (0.05, 0.1, 0.5, 3.0):
+            histograma.observar(valor)
+        self.assertEqual(list(histograma.acumulados()), [(0.1, 2), (1.0, 3), ('+Inf', 4)])
+        self.assertEqual(histograma.total, 4)
+
+    def test_costo_por_peticion(self):
+        # Lo que agrega el middleware sobre la vista (mejor de 5 rondas, para no medir ruido)
+        def por_peticion(manejador, repeticiones=2000):
+            request = RequestFactory().get('/')
+            mejor = float('inf')
+            for _ in range(5):
+                inicio = perf_counter()
+                for _ in range(repeticiones):
+                    manejador(request)
+                mejor = min(mejor, (perf_counter() - inicio) / repeticiones)
+            return mejor * 1e6
+
+        vista = lambda request: HttpResponse()
+        costo = por_peticion(MetricasMiddleware(vista)) - por_peticion(vista)
+        self.assertLess(costo, 15)  # microsegundos
+
+    def test_hilos_no_pierden_cuentas(self):
+        antes = metricas._contadores.get('blb_prueba_hilos_total', 0)
+        medicion = Medicion()
+
+        def trabajar():
+            for _ in range(5000):
+                metricas.incrementar('blb_prueba_hilos_total')
+                metricas.registrar('prueba_hilos', 0.001, medicion)
+
+        hilos = [threading.Thread(target=trabajar) for _ in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(metricas._contadores['blb_prueba_hilos_total'] - antes, 40000)
+        self.assertEqual(metricas._histogramas['prueba_hilos'][0].total, 40000)
@@ -1,8 +1,9 @@
 from django.test import TestCase
-from gestion.models import Autor, Libro, Prestamo
+from gestion.models import Autor, Libro, Prestamo, Perfil
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.urls import reverse
+from datetime import timedelta
 
 
 class LibroModelTest(TestCase):
@@ -10,29 +11,30 @@ class LibroModelTest(TestCase):
     def setUpTestData(cls):
         # Crear un autor para usar en las pruebas
         autor = Autor.objects.create(nombre="Isaac", apellido="Asimov", bibliografia="Escritor de ciencia ficción")
-        Libro.objects.create(titulo="Fundacion", autor=autor, disponible= True)
+        cls.libro = Libro.objects.create(titulo="Fundacion", autor=autor, disponible= True)
         
     def test_str_devuelve_titulo(self):
-        libro = Libro.objects.get(id=1) #obtener el el id que estoy creando en setuptestdata
-        self.assertEqual(str(libro), 'Fundacion') #verificar que el str del libro devuelva el titulo
+        libro = Libro.objects.get(id=self.libro.id) #obtener el el id que estoy creando en setuptestdata
+        self.assertEqual(str(libro), 'Fundacion - Isaac Asimov') #verificar que el str del libro devuelva el titulo y el autor
 
 class PrestamoModelTest(TestCase):
     @classmethod
     def setUpTestData(cls):
         usuario = User.objects.create_user(username='testuser', password='12345678') #crear un usuario de prueba
-        Libro.objects.create(titulo="I Robot", autor=1, disponible=False) #crear un libro no disponible
+        autor = Autor.objects.create(nombre="Isaac", apellido="Asimov")
+        libro = Libro.objects.create(titulo="I Robot", autor=autor, disponible=False) #crear un libro no disponible
         cls.prestamo = Prestamo.objects.create( #el cls es para definir atributos de la clase de prueba parecido al self
-            libro=Libro,
+            libro=libro,
             usuario=usuario,
-            fecha_max='2025-12-25'
+            fecha_max=timezone.now().date() - timedelta(days=8) #vencido hace 8 dias
         )
         
     def test_libro_no_disponible(self):
         self.prestamo.refresh_from_db()  # Actualizar el objeto desde la base de datos
-        self.assertFalse(self.prestamo.libro) # Verificar que el libro no esté disponible
-        self.assertEqual(self.prestamo.dias_retraso, 8)  # Verificar el título del libro
+        self.assertFalse(self.prestamo.libro.disponible) # Verificar que el libro no esté disponible
+        self.assertEqual(self.prestamo.dias_retraso, 8)  # Verificar los dias de retraso
         if self.prestamo.dias_retraso > 0:
-            self.assertGreater(self.prestamo.multa_restraso, 1000)  # Verificar la multa por retraso
+            self.assertEqual(self.prestamo.multa_retraso, 16.0)  # Verificar la multa por retraso (8 dias * 2.00)
             
 class PrestamoUsuarioViewTest(TestCase):
     def setUp(self):
@@ -44,8 +46,9 @@ class PrestamoUsuarioViewTest(TestCase):
         self.assertEqual(resp.status_code, 302)  # Redirige al login
         
     def test_carga_login(self):
-        resp = self.client.login(username=1, password="test12345")
-        self.assertEqual(resp.status_code, 200)
+        Perfil.objects.create(usuario=self.user1, cedula='0999999999', telefono='0999999999', rol='bodeguero')
+        resp = self.client.login(username='u1', password="test12345")
+        self.assertTrue(resp)
         respl = self.client.get(reverse('crear_autores'))
         self.assertEqual(respl.status_code, 200)
 
@@ -0,0 +1,40 @@
+import json
+import marshal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from gestion.models import Autor, Libro
+
+
+class PerfiladoTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        autor = Autor.objects.create(nombre="Isaac", apellido="Asimov")
+        Libro.objects.create(titulo="Fundacion", autor=autor)
+        User.objects.create_user('staff', password='test12345', is_staff=True)
+        User.objects.create_user('normal', password='test12345')
+
+    def test_informe_html_para_personal(self):
+        self.client.login(username='staff', password='test12345')
+        resp = self.client.get('/libros/?_profile=1')
+        self.assertTemplateUsed(resp, 'gestion/templates/perfil.html')
+        nombres = [c['nombre'] for c in resp.context['categorias']]
+        self.assertIn('ORM / SQL', nombres)
+        self.assertIn('Plantillas', nombres)
+        self.assertIn('Context processors', nombres)
+
+    def test_descargas_prof_y_speedscope(self):
+        self.client.login(username='staff', password='test12345')
+        resp = self.client.get('/libros/?_profile=prof')
+        self.assertIn('perfil.prof', resp['Content-Disposition'])
+        self.assertTrue(marshal.loads(resp.content))
+
+        resp = self.client.get('/libros/?_profile=speedscope')
+        datos = json.loads(resp.content)
+        eventos = datos['profiles'][0]['events']
+        self.assertEqual(sum(1 for e in eventos if e['type'] == 'O'), sum(1 for e in eventos if e['type'] == 'C'))
+
+    def test_usuario_normal_recibe_la_pagina(self):
+        self.client.login(username='normal', password='test12345')
+        resp = self.client.get('/libros/?_profile=1')
+        self.assertTemplateUsed(resp, 'gestion/templates/libros.html')
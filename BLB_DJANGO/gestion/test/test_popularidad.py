@@ -0,0 +1,51 @@
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from gestion import popularidad
+from gestion.models import Autor, Libro, Prestamo, SolicitudPrestamo
+from gestion.test.test_cache import CACHES_PRUEBA
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class PopularidadTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        autor = Autor.objects.create(nombre="Julio", apellido="Verne")
+        cls.viejo = Libro.objects.create(titulo="Viaje al centro de la Tierra", autor=autor)
+        cls.nuevo = Libro.objects.create(titulo="La vuelta al mundo en 80 días", autor=autor)
+        cls.nada = Libro.objects.create(titulo="Miguel Strogoff", autor=autor)
+        cls.usuario = User.objects.create_user('lector', password='test12345')
+
+    def test_decaimiento_y_orden(self):
+        hace_dos_meses = timezone.now() - timedelta(days=60)
+        for _ in range(3):
+            popularidad.registrar(self.viejo.id, 1.0, hace_dos_meses)
+        popularidad.registrar(self.nuevo.id, 1.0)
+        self.viejo.refresh_from_db()
+        self.nuevo.refresh_from_db()
+        # 3 préstamos de hace dos vidas medias valen 0.75 hoy
+        self.assertAlmostEqual(popularidad.valor_actual(self.viejo.popularidad, 30), 0.75, places=3)
+        self.assertAlmostEqual(popularidad.valor_actual(self.nuevo.popularidad, 30), 1.0, places=3)
+        self.assertEqual(list(popularidad.populares(3)), [self.nuevo, self.viejo, self.nada])
+        self.assertEqual(list(popularidad.tendencias()), [self.nuevo])
+
+    def test_senales_y_recalculo(self):
+        Prestamo.objects.create(libro=self.viejo, usuario=self.usuario, fecha_max=date.today())
+        SolicitudPrestamo.objects.create(libro=self.viejo, usuario=self.usuario)
+        SolicitudPrestamo.objects.create(libro=self.nuevo, usuario=self.usuario)
+        incremental = dict(Libro.objects.values_list('id', 'tendencia'))
+        self.assertGreater(incremental[self.viejo.id], incremental[self.nuevo.id])
+
+        popularidad.recalcular()
+        recalculado = dict(Libro.objects.values_list('id', 'tendencia'))
+        for libro_id, valor in incremental.items():
+            self.assertAlmostEqual(recalculado[libro_id], valor, delta=0.2)
+
+    def test_pagina_tendencias(self):
+        Prestamo.objects.create(libro=self.nuevo, usuario=self.usuario, fecha_max=date.today())
+        resp = self.client.get('/libros/tendencias/')
+        self.assertContains(resp, 'La vuelta al mundo')
+        self.assertNotContains(resp, 'Miguel Strogoff')
+        self.assertContains(self.client.get('/'), 'La vuelta al mundo')
@@ -0,0 +1,73 @@
+from datetime import date
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from gestion.models import Autor, Libro, Prestamo, Recomendacion
+from gestion import recomendaciones
+from gestion.recomendaciones import calcular
+from gestion.test.test_cache import CACHES_PRUEBA
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class RecomendacionesTest(TestCase):
+    def setUp(self):
+        autor = Autor.objects.create(nombre="Ursula", apellido="K. Le Guin")
+        self.libros = [Libro.objects.create(titulo=f"Libro {i}", autor=autor) for i in range(5)]
+        self.usuarios = [User.objects.create_user(f'lector{i}', password='test12345') for i in range(4)]
+        # lector0 y lector1 piden 0 y 1; lector2 pide 0 y 2; lector3 pide 3 y 4
+        for u, l in [(0, 0), (0, 1), (1, 0), (1, 1), (1, 1), (2, 0), (2, 2), (3, 3), (3, 4)]:
+            self.prestar(u, l)
+
+    def prestar(self, usuario, libro):
+        Prestamo.objects.create(usuario=self.usuarios[usuario], libro=self.libros[libro], fecha_max=date.today())
+
+    def recomendados(self, libro):
+        return list(Recomendacion.objects.filter(libro=self.libros[libro]).values_list('recomendado_id', flat=True))
+
+    def test_vecinos_ordenados_por_coseno(self):
+        calcular(completo=True)
+        ids = [l.id for l in self.libros]
+        # 0-1: 2 lectores en común / sqrt(3 * 2); 0-2: 1 / sqrt(3 * 1)
+        self.assertEqual(self.recomendados(0), [ids[1], ids[2]])
+        self.assertEqual(self.recomendados(3), [ids[4]])
+        self.assertEqual(self.recomendados(1), [ids[0]])
+        puntaje = Recomendacion.objects.get(libro=self.libros[0], posicion=0).puntaje
+        self.assertAlmostEqual(puntaje, 2 / 6 ** 0.5)
+
+    def test_incremental_solo_libros_afectados(self):
+        calcular(completo=True)
+        intacta = Recomendacion.objects.get(libro=self.libros[3])
+        self.prestar(2, 1)
+        libros, _ = calcular()
+        # Afecta a los libros de lector2 (0, 1, 2), no a 3 ni 4
+        self.assertEqual(libros, 3)
+        self.assertEqual(Recomendacion.objects.get(libro=self.libros[3]).id, intacta.id)
+        self.assertIn(self.libros[1].id, self.recomendados(2))
+        self.assertEqual(calcular(), (0, 0))
+
+    def test_incremental_no_lee_todo_el_historial(self):
+        calcular(completo=True)
+        self.prestar(2, 1)
+        with mock.patch('gestion.recomendaciones.historiales', wraps=recomendaciones.historiales) as historiales:
+            calcular()
+        ids, usuarios, libros = historiales.call_args.args[:3]
+        # Solo los lectores de 0, 1 y 2; los préstamos de lector3 no se leen
+        self.assertEqual(set(usuarios.tolist()), {u.id for u in self.usuarios[:3]})
+        incremental = {l: self.recomendados(l) for l in range(5)}
+        puntajes = list(Recomendacion.objects.order_by('libro', 'posicion').values_list('puntaje', flat=True))
+        calcular(completo=True)
+        self.assertEqual({l: self.recomendados(l) for l in range(5)}, incremental)
+        self.assertEqual(list(Recomendacion.objects.order_by('libro', 'posicion').values_list('puntaje', flat=True)),
+                         puntajes)
+
+    def test_comando_y_detalle(self):
+        salida = StringIO()
+        call_command('calcular_recomendaciones', stdout=salida)
+        self.assertIn('recomendaciones para 5 libros', salida.getvalue())
+        resp = self.client.get(f'/libros/{self.libros[0].id}/')
+        self.assertContains(resp, 'Otros lectores también pidieron')
+        self.assertContains(resp, 'Libro 2')
+        self.assertNotContains(self.client.get(f'/libros/{self.libros[3].id}/'), 'Libro 2')
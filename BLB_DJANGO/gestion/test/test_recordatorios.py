@@ -0,0 +1,96 @@
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPRecipientsRefused
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from gestion.models import Autor, Libro, Prestamo, RecordatorioEnviado
+from gestion.recordatorios import enviar, pendientes
+
+
+class RechazaAna(EmailBackend):
+    """Backend en memoria cuyo servidor rechaza a un destinatario"""
+    def send_messages(self, messages):
+        if any('ana@ejemplo.com' in m.to for m in messages):
+            raise SMTPRecipientsRefused({'ana@ejemplo.com': (550, b'Mailbox unavailable')})
+        return super().send_messages(messages)
+
+
+class RecordatoriosTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        autor = Autor.objects.create(nombre='Julio', apellido='Cortázar')
+        cls.rayuela = Libro.objects.create(titulo='Rayuela', autor=autor)
+        cls.bestiario = Libro.objects.create(titulo='Bestiario', autor=autor)
+        cls.ana = User.objects.create_user('ana', email='ana@ejemplo.com', first_name='Ana')
+        cls.luis = User.objects.create_user('luis', email='luis@ejemplo.com')
+        sin_correo = User.objects.create_user('sincorreo')
+        cls.hoy = timezone.localdate()
+
+        def prestamo(usuario, libro, dias, devuelto=None):
+            return Prestamo.objects.create(usuario=usuario, libro=libro, fecha_max=cls.hoy + timedelta(days=dias),
+                                           fecha_devolucion=devuelto)
+        cls.vencido = prestamo(cls.ana, cls.rayuela, -3)
+        cls.proximo = prestamo(cls.ana, cls.bestiario, 1)
+        prestamo(cls.luis, cls.rayuela, 0)
+        prestamo(cls.luis, cls.bestiario, 10)  # todavía lejos
+        prestamo(cls.luis, cls.bestiario, -5, devuelto=cls.hoy)
+        prestamo(sin_correo, cls.rayuela, -1)
+
+    def test_un_correo_por_usuario(self):
+        self.assertEqual(enviar(self.hoy, dias=2), {'correos': 2, 'prestamos': 3, 'fallidos': 0})
+        correos = {m.to[0]: m for m in mail.outbox}
+        ana = correos['ana@ejemplo.com']
+        self.assertIn('vencidos', ana.subject)
+        self.assertIn('Hola Ana', ana.body)
+        self.assertIn('Rayuela: venció el', ana.body)
+        self.assertIn('3 días de retraso', ana.body)
+        self.assertIn('Bestiario: vence el', ana.body)
+        self.assertIn('Rayuela: vence hoy', correos['luis@ejemplo.com'].body)
+        self.assertIn('Hola luis', correos['luis@ejemplo.com'].body)
+
+    def test_no_repite_avisos(self):
+        enviar(self.hoy, dias=2)
+        self.assertEqual(enviar(self.hoy, dias=2), {'correos': 0, 'prestamos': 0, 'fallidos': 0})
+        self.assertEqual(len(mail.outbox), 2)
+        # Al vencer, el préstamo por vencer recibe su aviso de vencido
+        self.assertEqual(enviar(self.hoy + timedelta(days=2), dias=2), {'correos': 2, 'prestamos': 2, 'fallidos': 0})
+        self.assertEqual(set(self.proximo.recordatorios.values_list('tipo', flat=True)), {'proximo', 'vencido'})
+
+    def test_una_consulta_sobre_el_indice(self):
+        sql, params = pendientes(self.hoy, 2).query.sql_with_params()
+        with connection.cursor() as cursor:
+            plan = ' '.join(str(fila[-1]) for fila in cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params))
+        self.assertIn('prestamo_abierto_vence', plan)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(list(pendientes(self.hoy, 2))), 3)
+
+    def test_lotes_sobre_una_conexion(self):
+        with mock.patch('gestion.recordatorios.get_connection', wraps=mail.get_connection) as get_connection:
+            enviar(self.hoy, dias=2, lote=1)
+        get_connection.assert_called_once()
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(RecordatorioEnviado.objects.count(), 3)
+
+    def test_comando_simular(self):
+        salida = StringIO()
+        call_command('enviar_recordatorios', simular=True, dias=2, stdout=salida)
+        self.assertIn('2 correos por enviar (3 préstamos)', salida.getvalue())
+        self.assertEqual((len(mail.outbox), RecordatorioEnviado.objects.count()), (0, 0))
+
+    @override_settings(EMAIL_BACKEND='gestion.test.test_recordatorios.RechazaAna')
+    def test_destinatario_rechazado_no_frena_el_resto(self):
+        with self.assertLogs('gestion.recordatorios', 'ERROR') as logs:
+            self.assertEqual(enviar(self.hoy, dias=2), {'correos': 1, 'prestamos': 1, 'fallidos': 1})
+        self.assertIn('ana@ejemplo.com', logs.output[0])
+        self.assertEqual([m.to for m in mail.outbox], [['luis@ejemplo.com']])
+        # Solo se anota lo enviado: los avisos de Ana quedan para la próxima corrida
+        self.assertEqual(list(RecordatorioEnviado.objects.values_list('prestamo__usuario__username', flat=True)),
+                         ['luis'])
+        self.assertEqual(len(list(pendientes(self.hoy, 2))), 2)
@@ -0,0 +1,51 @@
+import json
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from gestion.management.commands.medir_rendimiento import percentil
+from gestion.models import Libro, Multa, Perfil, Prestamo, RegistroActividad
+
+
+class GenerarDatosTest(TestCase):
+    def test_genera_todas_las_tablas(self):
+        call_command('generar_datos', escala=0.0002, stdout=open(os.devnull, 'w'))
+        self.assertEqual(Libro.objects.count(), 20)
+        self.assertEqual(Perfil.objects.count(), 10)
+        self.assertEqual(Prestamo.objects.count(), 200)
+        self.assertEqual(Multa.objects.count(), 200)
+        self.assertEqual(RegistroActividad.objects.count(), 1000)
+
+
+class MedirRendimientoTest(TestCase):
+    def test_recorre_las_urls_y_guarda_json(self):
+        call_command('generar_datos', escala=0.0001, stdout=open(os.devnull, 'w'))
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        salida = os.path.join(carpeta.name, 'bench.json')
+        call_command('medir_rendimiento', concurrencia='1', repeticiones=2, salida=salida,
+                     stdout=open(os.devnull, 'w'))
+        with open(salida, encoding='utf-8') as f:
+            informe = json.load(f)
+        medida = informe['resultados']['lista_libros']['niveles']['1']
+        self.assertEqual(medida['peticiones'], 2)
+        self.assertEqual(medida['errores'], 0)
+        self.assertGreater(medida['consultas'], 0)
+        self.assertIn('detalle_prestamo', informe['resultados'])
+        # Todos los conversores se sustituyen y ninguna ruta medida responde con error
+        isbn = Libro.objects.exclude(isbn=None).order_by('-pk').values_list('isbn', flat=True).first()
+        self.assertEqual(informe['resultados']['api_v1_libros_isbn']['url'], f'/api/v1/libros/isbn/{isbn}/')
+        self.assertEqual({nombre: datos['url'] for nombre, datos in informe['resultados'].items()
+                          if '<' in datos['url'] or datos['niveles']['1']['errores']}, {})
+        # La cuenta de prueba no queda en la base
+        self.assertFalse(User.objects.filter(username='bench_superusuario').exists())
+
+
+class PercentilTest(SimpleTestCase):
+    def test_percentiles(self):
+        valores = list(range(1, 101))
+        self.assertEqual(percentil(valores, 50), 50)
+        self.assertEqual(percentil(valores, 99), 99)
+        self.assertEqual(percentil([], 95), 0.0)
@@ -0,0 +1,70 @@
+import os
+import sqlite3
+import tempfile
+
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from gestion import replica
+from gestion.models import Autor, Libro
+from gestion.replica import (COOKIE_PIN, REPLICA, ReplicaMiddleware, ReplicaRouter,
+                             sincronizar_replica, solo_lectura)
+
+
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+        # Simular una réplica ya sincronizada (en los tests es un espejo de 'default')
+        replica._disponible['ok'] = True
+
+    def tearDown(self):
+        replica._disponible['ok'] = False
+
+    def _db_en_vista(self, request, modelo):
+        @solo_lectura
+        def vista(request):
+            return HttpResponse(self.router.db_for_read(modelo))
+        return vista(request).content.decode()
+
+    def test_vista_de_lectura_usa_replica(self):
+        request = self.factory.get('/libros/')
+        self.assertEqual(self._db_en_vista(request, Libro), REPLICA)
+        # Fuera de la vista todo vuelve a 'default'
+        self.assertEqual(self.router.db_for_read(Libro), 'default')
+
+    def test_usuarios_y_sesiones_siempre_en_default(self):
+        request = self.factory.get('/libros/')
+        self.assertEqual(self._db_en_vista(request, User), 'default')
+
+    def test_escritura_reciente_fija_lecturas(self):
+        request = self.factory.get('/libros/')
+        request.COOKIES[COOKIE_PIN] = '1'
+        self.assertEqual(self._db_en_vista(request, Libro), 'default')
+
+    def test_post_entrega_cookie_de_fijado(self):
+        middleware = ReplicaMiddleware(lambda request: HttpResponse())
+        self.assertIn(COOKIE_PIN, middleware(self.factory.post('/libros/nuevo/')).cookies)
+        self.assertNotIn(COOKIE_PIN, middleware(self.factory.get('/libros/')).cookies)
+
+
+class ReplicaEspejoTest(TestCase):
+    def test_lista_libros_con_replica_espejo(self):
+        autor = Autor.objects.create(nombre="Isaac", apellido="Asimov")
+        Libro.objects.create(titulo="Fundacion", autor=autor)
+        resp = self.client.get('/libros/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.context['libros']), 1)
+
+
+class SincronizarReplicaTest(TransactionTestCase):
+    def test_copia_los_datos(self):
+        Autor.objects.create(nombre="Julio", apellido="Cortázar")
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        destino = os.path.join(carpeta.name, 'replica.sqlite3')
+        sincronizar_replica(destino)
+        copia = sqlite3.connect(destino)
+        total = copia.execute("SELECT COUNT(*) FROM gestion_autor").fetchone()[0]
+        copia.close()
+        self.assertEqual(total, 1)
@@ -0,0 +1,81 @@
+from datetime import date
+from time import perf_counter
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from gestion.models import Autor, Libro, Multa, Perfil, Prestamo
+from gestion.reportes import ROLES, TIPOS_MULTA, calcular, cargar
+from gestion.test.test_cache import CACHES_PRUEBA
+
+
+class CalcularTest(SimpleTestCase):
+    def test_un_anio_en_menos_de_un_segundo(self):
+        rng = np.random.default_rng(0)
+        n = 300_000
+        inicio = np.datetime64('2025-01-01') + rng.integers(0, 365, n).astype('timedelta64[D]')
+        devolucion = inicio + rng.integers(1, 40, n).astype('timedelta64[D]')
+        devolucion[rng.random(n) < 0.1] = np.datetime64('NaT')
+        prestamos = {'inicio': inicio, 'maximo': inicio + np.timedelta64(14, 'D'), 'devolucion': devolucion,
+                     'rol': rng.integers(0, len(ROLES), n)}
+        m = n // 3
+        multas = {'fecha': inicio[:m], 'tipo': rng.integers(0, 3, m), 'monto': rng.random(m) * 20,
+                  'pagada': rng.random(m) < 0.5}
+        t = perf_counter()
+        datos = calcular(prestamos, multas, date(2025, 1, 1), date(2025, 12, 31), date(2025, 12, 31))
+        segundos = perf_counter() - t
+        self.assertLess(segundos, 1)
+        self.assertEqual(sum(f['prestamos'] for f in datos['mensual']), n)
+        self.assertEqual(sum(f['prestamos'] for f in datos['retrasos']), n)
+        self.assertEqual(len(datos['mensual']), 12)
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class ReportesVistaTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        libro = Libro.objects.create(titulo="Rayuela", autor=Autor.objects.create(nombre="Julio", apellido="Cortázar"))
+        lector = User.objects.create_user('lector', password='test12345')
+        Perfil.objects.create(usuario=lector, cedula='1', telefono='1', rol='usuario')
+        a_tiempo = Prestamo.objects.create(libro=libro, usuario=lector, fecha_prestamos=date(2025, 3, 1),
+                                           fecha_max=date(2025, 3, 8), fecha_devolucion=date(2025, 3, 5))
+        tarde = Prestamo.objects.create(libro=libro, usuario=lector, fecha_prestamos=date(2025, 3, 10),
+                                        fecha_max=date(2025, 3, 17), fecha_devolucion=date(2025, 3, 27))
+        Multa.objects.create(prestamo=tarde, tipo='r', monto=20, pagada=True, fecha=date(2025, 3, 27))
+        Multa.objects.create(prestamo=a_tiempo, tipo='d', monto=5, fecha=date(2025, 4, 2))
+        bibliotecario = User.objects.create_user('biblio', password='test12345')
+        Perfil.objects.create(usuario=bibliotecario, cedula='2', telefono='1', rol='bibliotecario')
+        # is_staff sin rol del personal no basta: los permisos van por Perfil.rol
+        User.objects.create_user('staff', password='test12345', is_staff=True)
+
+    def test_pagina_y_exportacion(self):
+        self.assertEqual(self.client.get('/reportes/').status_code, 302)
+        self.client.login(username='staff', password='test12345')
+        self.assertEqual(self.client.get('/reportes/').status_code, 403)
+        self.client.login(username='biblio', password='test12345')
+        resp = self.client.get('/reportes/?anio=2025')
+        datos = resp.context['datos']
+        self.assertEqual(datos['total_prestamos'], 2)
+        self.assertEqual(datos['duracion_promedio'], 10.5)
+        self.assertEqual(datos['mensual'][2]['prestamos'], 2)
+        self.assertEqual([f['prestamos'] for f in datos['retrasos']], [1, 0, 0, 1, 0, 0])
+        self.assertEqual(datos['multas'][0], {'tipo': 'retraso', 'cantidad': 1, 'generado': 20.0, 'cobrado': 20.0})
+        self.assertEqual(datos['roles'], [{'rol': 'usuario', 'prestamos': 2, 'atrasados': 1}])
+
+        csv = self.client.get('/reportes/exportar/?anio=2025').content.decode()
+        self.assertIn('mensual,2025-03,2,2,20.00', csv)
+        self.assertEqual(self.client.get('/reportes/exportar/?anio=2025&formato=json').json()['total_prestamos'], 2)
+
+    def test_anio_fuera_de_rango(self):
+        self.client.login(username='biblio', password='test12345')
+        self.assertEqual(self.client.get('/reportes/?anio=0').context['datos']['anio'], 1)
+        self.assertEqual(self.client.get('/reportes/exportar/?anio=10000&formato=json').json()['anio'], 9999)
+
+    def test_codigos_de_rol_y_tipo_desde_la_base(self):
+        sin_perfil = User.objects.get(username='staff')
+        Prestamo.objects.create(libro=Libro.objects.get(), usuario=sin_perfil, fecha_prestamos=date(2025, 5, 1),
+                                fecha_max=date(2025, 5, 8))
+        prestamos, multas = cargar(date(2025, 1, 1), date(2025, 12, 31))
+        self.assertEqual(sorted(prestamos['rol'].tolist()),
+                         [ROLES.index('usuario')] * 2 + [ROLES.index('sin perfil')])
+        self.assertEqual(sorted(multas['tipo'].tolist()), sorted([TIPOS_MULTA.index('r'), TIPOS_MULTA.index('d')]))
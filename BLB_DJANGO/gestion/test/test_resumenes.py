@@ -0,0 +1,62 @@
+from datetime import date, datetime, timezone as tz
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from gestion.models import Autor, Libro, Multa, Perfil, Prestamo, RegistroActividad, ResumenDiario
+from gestion.resumenes import resumir, serie
+from gestion.test.test_cache import CACHES_PRUEBA
+
+
+class ResumenesTest(TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user('lector', password='test12345')
+        self.libro = Libro.objects.create(titulo="Pedro Páramo", autor=Autor.objects.create(nombre="Juan", apellido="Rulfo"))
+
+    def actividad(self, tipo, dia):
+        RegistroActividad.objects.create(usuario=self.usuario, tipo_accion=tipo, descripcion='-',
+                                         fecha_hora=datetime(2025, 5, dia, 15, tzinfo=tz.utc))
+
+    def test_incremental_e_idempotente(self):
+        self.actividad('login', 1)
+        self.actividad('login', 1)
+        self.actividad('logout', 1)
+        self.actividad('login', 3)
+        prestamo = Prestamo.objects.create(libro=self.libro, usuario=self.usuario,
+                                           fecha_prestamos=date(2025, 5, 1), fecha_max=date(2025, 5, 8))
+        Multa.objects.create(prestamo=prestamo, tipo='r', monto=4, fecha=date(2025, 5, 9))
+        Multa.objects.create(prestamo=prestamo, tipo='r', monto=6, fecha=date(2025, 5, 9))
+
+        self.assertEqual(resumir(lote=2)['actividad'], 4)
+        self.assertEqual(resumir(), {'actividad': 0, 'prestamos': 0, 'solicitudes': 0, 'multas': 0})
+        self.assertEqual(ResumenDiario.objects.get(fecha=date(2025, 5, 1), metrica='actividad', dimension='login').valor, 2)
+        self.assertEqual(ResumenDiario.objects.get(metrica='multas_monto', dimension='r').valor, 10)
+
+        # Solo las filas nuevas se suman a los totales existentes
+        self.actividad('login', 1)
+        self.assertEqual(resumir()['actividad'], 1)
+        logins = serie('actividad', date(2025, 5, 1), date(2025, 5, 3), 'login')
+        self.assertEqual([valor for _, valor in logins], [3, 0, 1])
+        self.assertEqual(serie('actividad', date(2025, 5, 1), date(2025, 5, 1))[0][1], 4)
+
+    @override_settings(CACHES=CACHES_PRUEBA)
+    def test_comando_y_pagina(self):
+        self.actividad('login', 2)
+        call_command('resumir_actividad', stdout=StringIO())
+        call_command('resumir_actividad', '--reiniciar', stdout=StringIO())
+        self.assertEqual(ResumenDiario.objects.get(metrica='actividad').valor, 1)
+
+        admin = User.objects.create_user('admin', password='test12345')
+        Perfil.objects.create(usuario=admin, cedula='9', telefono='1', rol='admin')
+        self.client.login(username='admin', password='test12345')
+        with self.assertNumQueries(5):  # sesión, usuario, perfil (menú), serie y dimensiones
+            resp = self.client.get('/reportes/diario/?metrica=actividad&dimension=login&desde=2025-05-01&hasta=2025-05-31')
+        self.assertEqual(len(resp.context['dias']), 31)
+        self.assertEqual(resp.context['total'], 1)
+        # Fechas en los extremos del calendario y rango invertido
+        resp = self.client.get('/reportes/diario/?desde=0001-01-01&hasta=0001-01-02')
+        self.assertEqual(len(resp.context['dias']), 2)
+        resp = self.client.get('/reportes/diario/?desde=0001-01-01&hasta=9999-12-31')
+        self.assertEqual((len(resp.context['dias']), resp.context['desde']), (731, date(9997, 12, 31)))
+        self.assertEqual(self.client.get('/reportes/diario/?desde=2025-05-31&hasta=2025-05-01').status_code, 400)
@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase
+from gestion.db import sentencias_pragma
+
+
+def prueba_carga(carpeta, pragmas, modo_transaccion, lectores=4, escritores=2, segundos=1.0):
+    """
+    Lectores y escritores concurrentes sobre un archivo SQLite temporal.
+    Los escritores imitan a registrar_log (lectura + INSERT dentro de una transacción).
+    Devuelve (lecturas, escrituras, errores_de_lock).
+    """
+    os.makedirs(carpeta, exist_ok=True)
+    ruta = os.path.join(carpeta, 'carga.sqlite3')
+    conn = sqlite3.connect(ruta)
+    for sentencia in sentencias_pragma(pragmas):
+        conn.execute(sentencia)
+    conn.execute("CREATE TABLE libro (id INTEGER PRIMARY KEY, titulo TEXT, stock INTEGER)")
+    conn.execute("CREATE TABLE registro (id INTEGER PRIMARY KEY, descripcion TEXT)")
+    conn.executemany("INSERT INTO libro (titulo, stock) VALUES (?, ?)",
+                     [(f"Libro {i}", i % 5) for i in range(2000)])
+    conn.commit()
+    conn.close()
+
+    contadores = {'lecturas': 0, 'escrituras': 0, 'errores': 0}
+    candado = threading.Lock()
+    fin = time.perf_counter() + segundos
+
+    def conectar():
+        c = sqlite3.connect(ruta, timeout=5, isolation_level=None, check_same_thread=False)
+        for sentencia in sentencias_pragma(pragmas):
+            c.execute(sentencia)
+        return c
+
+    def lector():
+        c = conectar()
+        n = 0
+        while time.perf_counter() < fin:
+            try:
+                c.execute("SELECT id, titulo FROM libro WHERE stock > 0 ORDER BY titulo LIMIT 50").fetchall()
+                n += 1
+            except sqlite3.OperationalError:
+                with candado:
+                    contadores['errores'] += 1
+        with candado:
+            contadores['lecturas'] += n
+        c.close()
+
+    def escritor():
+        c = conectar()
+        n = 0
+        while time.perf_counter() < fin:
+            try:
+                c.execute(f"BEGIN {modo_transaccion}")
+                c.execute("SELECT COUNT(*) FROM registro").fetchone()
+                c.execute("INSERT INTO registro (descripcion) VALUES (?)", ('Creó préstamo',))
+                c.execute("COMMIT")
+                n += 1
+            except sqlite3.OperationalError:
+                if c.in_transaction:
+                    c.execute("ROLLBACK")
+                with candado:
+                    contadores['errores'] += 1
+        with candado:
+            contadores['escrituras'] += n
+        c.close()
+
+    hilos = [threading.Thread(target=lector) for _ in range(lectores)]
+    hilos += [threading.Thread(target=escritor) for _ in range(escritores)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return contadores['lecturas'], contadores['escrituras'], contadores['errores']
+
+
+class SQLiteConcurrenciaTest(SimpleTestCase):
+    def setUp(self):
+        temporal = tempfile.TemporaryDirectory()
+        self.addCleanup(temporal.cleanup)
+        self.carpeta = temporal.name
+
+    def test_wal_sin_errores_de_lock(self):
+        # Línea base: rollback journal y transacciones DEFERRED (lo que trae SQLite por defecto)
+        base = prueba_carga(os.path.join(self.carpeta, 'base'), {'journal_mode': 'DELETE', 'busy_timeout': 5000},
+                            'DEFERRED')
+        lecturas, escrituras, errores = prueba_carga(os.path.join(self.carpeta, 'wal'), settings.SQLITE_PRAGMAS,
+                                                     'IMMEDIATE')
+        self.assertEqual(errores, 0)  # nunca "database is locked"
+        self.assertGreater(lecturas, 0)
+        self.assertGreater(escrituras, 0)
+        # La base choca por el lock (o al menos atiende menos operaciones)
+        self.assertTrue(base[2] > 0 or base[0] + base[1] < lecturas + escrituras,
+                        f'base={base} ajustado={(lecturas, escrituras, errores)}')
+
+    def test_conexion_nueva_aplica_los_pragma(self):
+        # Una conexión de Django sobre un archivo real: la señal connection_created
+        # ejecuta gestion.db.configurar_conexion como en producción
+        datos = {**connections['default'].settings_dict, 'NAME': os.path.join(self.carpeta, 'hook.sqlite3')}
+        conexion = DatabaseWrapper(datos, alias='prueba_pragmas')
+        self.addCleanup(conexion.close)
+        with conexion.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+
+    def test_sentencias_pragma(self):
+        self.assertEqual(sentencias_pragma({'journal_mode': 'WAL', 'synchronous': 'NORMAL'}),
+                         ['PRAGMA journal_mode=WAL', 'PRAGMA synchronous=NORMAL'])
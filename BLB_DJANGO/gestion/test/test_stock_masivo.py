@@ -0,0 +1,84 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from gestion.inventario import ajustar_en_bloque, validar_objetivos
+from gestion.models import Autor, Libro, Perfil
+
+
+class StockMasivoTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.autor = Autor.objects.create(nombre='Isabel', apellido='Allende')
+        cls.casa = Libro.objects.create(titulo='La casa de los espíritus', autor=cls.autor, stock=2,
+                                        isbn='9788401352836')
+        cls.eva = Libro.objects.create(titulo='Eva Luna', autor=cls.autor, stock=1)
+        cls.paula = Libro.objects.create(titulo='Paula', autor=cls.autor, stock=0)
+        bodeguero = User.objects.create_user('bodega', password='test12345')
+        Perfil.objects.create(usuario=bodeguero, cedula='1', telefono='1', rol='bodeguero')
+
+    def setUp(self):
+        self.client.login(username='bodega', password='test12345')
+
+    def stock(self):
+        return dict(Libro.objects.values_list('titulo', 'stock'))
+
+    def test_consultas_no_dependen_de_los_libros(self):
+        extra = [Libro.objects.create(titulo=f'Libro {n}', autor=self.autor, stock=1).id for n in range(8)]
+        with CaptureQueriesContext(connection) as pocos:
+            ajustar_en_bloque({self.casa.id: 5, self.eva.id: 0})
+        with CaptureQueriesContext(connection) as muchos:
+            ajustar_en_bloque({libro_id: 3 for libro_id in extra} | {self.paula.id: 2, self.casa.id: 1})
+        self.assertEqual(len(pocos), len(muchos))
+        self.assertEqual(self.stock()['La casa de los espíritus'], 1)
+        self.assertEqual(list(self.casa.ejemplares.filter(estado='disponible').values_list('numero', flat=True)), [1])
+
+    def test_validar(self):
+        objetivos, errores = validar_objetivos([('Línea 1', '978-84-01-35283-6', '4'), ('Línea 2', str(self.eva.id), '0'),
+                                                ('Línea 3', '999', '1'), ('Línea 4', str(self.paula.id), '-1'),
+                                                ('Línea 5', str(self.casa.id), '2'),
+                                                ('Línea 6', str(self.paula.id), '10000000')])
+        self.assertEqual(objetivos, {self.casa.id: 4, self.eva.id: 0})
+        self.assertEqual(len(errores), 4)
+        self.assertIn('Línea 5: el libro', errores[2])
+        self.assertEqual(errores[3], 'Línea 6: el stock 10000000 supera el máximo de 500 por libro')
+        with override_settings(STOCK_MAXIMO_POR_LIBRO=4):
+            self.assertEqual(validar_objetivos([('Línea 1', str(self.casa.id), '4')]), ({self.casa.id: 4}, []))
+
+    @mock.patch('gestion.views.registrar_log')
+    def test_grilla_solo_aplica_cambios(self, registrar_log):
+        self.client.post('/stock/', {f'stock_{self.casa.id}': '2', f'antes_{self.casa.id}': '2',
+                                     f'stock_{self.eva.id}': '4', f'antes_{self.eva.id}': '1'})
+        self.assertEqual(self.stock(), {'La casa de los espíritus': 2, 'Eva Luna': 4, 'Paula': 0})
+        registrar_log.assert_called_once()
+        self.assertIn('"Eva Luna" a 4', registrar_log.call_args.args[2])
+
+    @mock.patch('gestion.views.LOTE_STOCK', 2)
+    @mock.patch('gestion.views.registrar_log')
+    def test_csv_por_lotes(self, registrar_log):
+        archivo = SimpleUploadedFile('conteo.csv', f'id;stock\n9788401352836;0\n{self.eva.id};3\n\n{self.paula.id};1\n'.encode())
+        respuesta = self.client.post('/stock/', {'archivo': archivo})
+        self.assertContains(respuesta, 'Stock actualizado en 3 libros')
+        self.assertEqual(self.stock(), {'La casa de los espíritus': 0, 'Eva Luna': 3, 'Paula': 1})
+        self.assertEqual(registrar_log.call_count, 2)
+
+    @mock.patch('gestion.views.registrar_log')
+    def test_csv_con_errores_no_aplica_nada(self, registrar_log):
+        archivo = SimpleUploadedFile('conteo.csv', f'{self.eva.id},5\n12345,1\n'.encode())
+        respuesta = self.client.post('/stock/', {'archivo': archivo})
+        self.assertContains(respuesta, 'Línea 2: no hay ningún libro con el id o ISBN')
+        self.assertEqual(self.stock()['Eva Luna'], 1)
+        registrar_log.assert_not_called()
+
+    @mock.patch('gestion.views.LIBROS_POR_PAGINA', 2)
+    def test_paginada_y_con_busqueda(self):
+        respuesta = self.client.get('/stock/')
+        self.assertEqual([l.titulo for l in respuesta.context['libros']], ['Eva Luna', 'La casa de los espíritus'])
+        self.assertContains(respuesta, 'pagina=2')
+        respuesta = self.client.get('/stock/?pagina=2')
+        self.assertEqual([l.titulo for l in respuesta.context['libros']], ['Paula'])
+        respuesta = self.client.get('/stock/?q=casa')
+        self.assertEqual([l.titulo for l in respuesta.context['libros']], ['La casa de los espíritus'])
@@ -0,0 +1,128 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+from gestion.inventario import agregar, por_sucursal, prestar
+from gestion.models import Autor, Libro, Perfil, Prestamo, SolicitudPrestamo, Sucursal
+
+
+class SucursalesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.centro = Sucursal.objects.create(nombre='Centro')
+        cls.norte = Sucursal.objects.create(nombre='Norte')
+        cls.libro = Libro.objects.create(titulo='Rayuela', autor=Autor.objects.create(nombre='Julio', apellido='Cortázar'),
+                                         stock=0)
+        cls.lector = User.objects.create_user('lector', password='test12345')
+        Perfil.objects.create(usuario=cls.lector, cedula='1', telefono='1', rol='usuario', sucursal=cls.norte)
+        cls.biblio = User.objects.create_user('biblio', password='test12345')
+        Perfil.objects.create(usuario=cls.biblio, cedula='2', telefono='1', rol='bibliotecario', sucursal=cls.centro)
+        cls.vence = timezone.localdate() + timedelta(days=7)
+
+    def setUp(self):
+        agregar(self.libro.id, 2, self.centro.id)
+        agregar(self.libro.id, 1, self.norte.id)
+
+    def test_prestar_en_la_sucursal(self):
+        prestamo = prestar(self.lector, self.vence, libro_id=self.libro.id, sucursal_id=self.norte.id)
+        self.assertEqual((prestamo.sucursal_id, prestamo.ejemplar.sucursal_id), (self.norte.id, self.norte.id))
+        self.assertIsNone(prestar(self.lector, self.vence, libro_id=self.libro.id, sucursal_id=self.norte.id))
+        self.libro.refresh_from_db()
+        self.assertEqual(self.libro.stock, 2)
+
+    def test_disponibilidad_por_sucursal_en_una_consulta(self):
+        prestar(self.lector, self.vence, libro_id=self.libro.id, sucursal_id=self.norte.id)
+        with self.assertNumQueries(1):
+            conteos = por_sucursal([self.libro.id])
+        self.assertEqual(conteos, {self.libro.id: [(self.centro.id, 'Centro', 2)]})
+        with self.assertNumQueries(1):
+            datos = self.client.get(f'/api/v1/disponibilidad/sucursales/?ids={self.libro.id},999').json()
+        self.assertEqual(datos['libros'], {str(self.libro.id): [{'sucursal_id': self.centro.id, 'sucursal': 'Centro',
+                                                                 'disponibles': 2}],
+                                           '999': []})
+
+    @mock.patch('gestion.views.registrar_log')
+    def test_listas_del_personal_filtradas_por_sede(self, registrar_log):
+        prestar(self.lector, self.vence, libro_id=self.libro.id, sucursal_id=self.norte.id)
+        centro = prestar(self.lector, self.vence, libro_id=self.libro.id, sucursal_id=self.centro.id)
+        self.client.login(username='biblio', password='test12345')
+        respuesta = self.client.get('/prestamos/')
+        self.assertEqual([p.id for p in respuesta.context['prestamos']], [centro.id])
+
+        # La solicitud toma la sede del usuario y solo la ve el personal de esa sede
+        self.client.login(username='lector', password='test12345')
+        self.client.post('/solicitar-prestamo/', {'libro': self.libro.id, 'dias': 7})
+        solicitud = SolicitudPrestamo.objects.get()
+        self.assertEqual(solicitud.sucursal_id, self.norte.id)
+        self.client.login(username='biblio', password='test12345')
+        respuesta = self.client.get('/solicitudes/')
+        self.assertEqual(list(respuesta.context['solicitudes_pendientes']), [])
+
+        # Norte no tiene copias libres: se rechaza aunque Centro tenga
+        self.client.post(f'/solicitudes/{solicitud.id}/aprobar/')
+        solicitud.refresh_from_db()
+        self.assertEqual(solicitud.estado, 'rechazada')
+        self.assertEqual(Prestamo.objects.count(), 2)
+
+    def test_api_del_personal_filtrada_por_sede(self):
+        norte = prestar(self.lector, self.vence, libro_id=self.libro.id, sucursal_id=self.norte.id)
+        centro = prestar(self.lector, self.vence, libro_id=self.libro.id, sucursal_id=self.centro.id)
+        SolicitudPrestamo.objects.create(libro=self.libro, usuario=self.lector, sucursal=self.norte)
+        self.client.login(username='biblio', password='test12345')
+        self.assertEqual([p['id'] for p in self.client.get('/api/v1/prestamos/').json()['datos']], [centro.id])
+        self.assertEqual(self.client.get(f'/api/v1/prestamos/?sucursal={self.norte.id}').json()['datos'], [])
+        self.assertEqual(self.client.get(f'/api/v1/prestamos/{norte.id}/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/v1/prestamos/{centro.id}/').status_code, 200)
+        self.assertEqual(self.client.get('/api/v1/solicitudes/').json()['datos'], [])
+        # El lector sigue viendo sus préstamos de todas las sedes
+        self.client.login(username='lector', password='test12345')
+        self.assertEqual(len(self.client.get('/api/v1/prestamos/').json()['datos']), 2)
+
+    @mock.patch('gestion.views.registrar_log')
+    def test_stock_de_la_sede(self, registrar_log):
+        bodeguero = User.objects.create_user('bodega', password='test12345')
+        Perfil.objects.create(usuario=bodeguero, cedula='3', telefono='1', rol='bodeguero', sucursal=self.norte)
+        self.client.login(username='bodega', password='test12345')
+        self.client.post('/stock/', {'libro_id': self.libro.id, 'stock': 4})
+        self.assertEqual(por_sucursal([self.libro.id])[self.libro.id],
+                         [(self.centro.id, 'Centro', 2), (self.norte.id, 'Norte', 4)])
+        self.libro.refresh_from_db()
+        self.assertEqual(self.libro.stock, 6)
+        respuesta = self.client.get('/stock/')
+        self.assertEqual(respuesta.context['libros'][0].stock_sucursal, 4)
+
+    @mock.patch('gestion.views.registrar_log')
+    def test_editar_libro_ajusta_la_sede(self, registrar_log):
+        bodeguero = User.objects.create_user('bodega', password='test12345')
+        Perfil.objects.create(usuario=bodeguero, cedula='3', telefono='1', rol='bodeguero', sucursal=self.norte)
+        self.client.login(username='bodega', password='test12345')
+        url = f'/libros/{self.libro.id}/editar/'
+        datos = {'titulo': self.libro.titulo, 'autor': self.libro.autor_id}
+        for stock, error in (('tres', 'no es un entero'), ('-1', 'no es un entero'), ('100000', 'supera el máximo')):
+            self.assertContains(self.client.post(url, {**datos, 'stock': stock}), error)
+        self.assertEqual(Libro.objects.get(id=self.libro.id).stock, 3)
+        self.assertEqual(self.client.post(url, {**datos, 'stock': 0}).status_code, 302)
+        self.assertEqual(por_sucursal([self.libro.id])[self.libro.id], [(self.centro.id, 'Centro', 2)])
+
+    @mock.patch('gestion.views.registrar_log')
+    def test_sucursal_inexistente_en_formularios(self, registrar_log):
+        self.client.login(username='lector', password='test12345')
+        for sucursal in ('centro', '999'):
+            respuesta = self.client.post('/solicitar-prestamo/', {'libro': self.libro.id, 'sucursal': sucursal})
+            self.assertContains(respuesta, 'La sucursal elegida no existe')
+        self.assertFalse(SolicitudPrestamo.objects.exists())
+        self.client.post('/solicitar-prestamo/', {'libro': self.libro.id, 'sucursal': self.centro.id})
+        self.assertEqual(SolicitudPrestamo.objects.get().sucursal, self.centro)
+
+        admin = User.objects.create_user('admin', password='test12345')
+        Perfil.objects.create(usuario=admin, cedula='9', telefono='1', rol='admin')
+        self.client.login(username='admin', password='test12345')
+        datos = {'first_name': 'Ana', 'last_name': 'Paz', 'email': '', 'rol': 'usuario', 'cedula': '1', 'telefono': '1'}
+        for sucursal in ('norte', '999'):
+            respuesta = self.client.post(f'/usuarios/{self.lector.id}/editar/', {**datos, 'sucursal': sucursal})
+            self.assertContains(respuesta, 'La sucursal elegida no existe')
+        self.assertEqual(Perfil.objects.get(usuario=self.lector).sucursal, self.norte)
+        self.client.post(f'/usuarios/{self.lector.id}/editar/', {**datos, 'sucursal': ''})
+        self.assertIsNone(Perfil.objects.get(usuario=self.lector).sucursal)
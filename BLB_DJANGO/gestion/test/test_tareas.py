@@ -0,0 +1,190 @@
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from gestion import tareas
+from gestion.models import Autor, Libro, Perfil, RegistroActividad, Tarea, registrar_log
+from gestion.tareas import encolar, reclamar, rescatar, tarea, trabajar
+
+llamadas = []
+
+
+@tarea
+def _anotar(valor):
+    llamadas.append(valor)
+
+
+@tarea
+def _fallar():
+    raise RuntimeError('sin conexión')
+
+
+class ColaTest(TestCase):
+    def setUp(self):
+        llamadas.clear()
+
+    def test_reclamar_con_un_update(self):
+        encolar('_anotar', 1)
+        encolar('_anotar', 2, retraso=60)
+        with CaptureQueriesContext(connection) as consultas:
+            fila = reclamar('w1')
+        self.assertEqual(len(consultas), 1)
+        self.assertIn('RETURNING', consultas[0]['sql'])
+        self.assertEqual(fila[1:4], ('_anotar', {'args': [1], 'kwargs': {}}, 1))
+        # La otra está programada para más tarde
+        self.assertIsNone(reclamar('w2'))
+        self.assertEqual(trabajar('w1', una_vez=True), 0)
+        self.assertTrue(tareas.ejecutar(fila, 'w1'))
+        self.assertEqual(llamadas, [1])
+        self.assertEqual(Tarea.objects.get(id=fila[0]).estado, 'hecha')
+
+    def test_clave_evita_duplicados(self):
+        for _ in range(3):
+            encolar('_anotar', 1, clave='unica')
+        self.assertEqual(Tarea.objects.filter(clave='unica').count(), 1)
+        trabajar('w1', una_vez=True)
+        encolar('_anotar', 1, clave='unica')
+        self.assertEqual(Tarea.objects.filter(clave='unica', estado='pendiente').count(), 1)
+
+    def test_reintentos_con_espera(self):
+        encolar('_fallar', max_intentos=3)
+        with self.assertLogs('gestion.tareas', 'WARNING'):
+            trabajar('w1', una_vez=True)
+        t = Tarea.objects.get()
+        self.assertEqual((t.estado, t.intentos), ('pendiente', 1))
+        self.assertIn('sin conexión', t.error)
+        self.assertGreater(t.ejecutar_en, timezone.now() + timedelta(seconds=5))
+        with override_settings(TAREAS_REINTENTO_BASE=0), self.assertLogs('gestion.tareas', 'WARNING'):
+            self.assertEqual(trabajar('w1', una_vez=True), 0)  # todavía no vence
+            Tarea.objects.update(ejecutar_en=timezone.now())
+            self.assertEqual(trabajar('w1', una_vez=True), 2)
+        t.refresh_from_db()
+        self.assertEqual((t.estado, t.intentos), ('fallida', 3))
+
+    def test_rescatar_tareas_abandonadas(self):
+        encolar('_anotar', 1)
+        reclamar('muerto')
+        Tarea.objects.update(bloqueada_hasta=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(rescatar(), 1)
+        out = StringIO()
+        call_command('runworker', una_vez=True, stdout=out)
+        self.assertIn('1 tareas ejecutadas', out.getvalue())
+        self.assertEqual(llamadas, [1])
+
+    def test_clave_con_gemela_pendiente(self):
+        # Volver a la cola chocaría con tarea_clave_pendiente: la gemela pendiente hará el trabajo
+        encolar('_fallar', clave='unica')
+        fila = reclamar('w1')
+        encolar('_fallar', clave='unica')
+        with self.assertLogs('gestion.tareas', 'WARNING'):
+            self.assertFalse(tareas.ejecutar(fila, 'w1'))
+        self.assertEqual(Tarea.objects.get(id=fila[0]).estado, 'fallida')
+        self.assertFalse(tareas.reintentar(fila[0]))
+
+        gemela = reclamar('muerto')
+        encolar('_fallar', clave='unica')
+        Tarea.objects.filter(id=gemela[0]).update(bloqueada_hasta=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(rescatar(), 1)
+        self.assertEqual(Tarea.objects.get(id=gemela[0]).estado, 'fallida')
+        self.assertEqual(Tarea.objects.filter(clave='unica', estado='pendiente').count(), 1)
+
+    @override_settings(TAREAS_SINCRONAS=True)
+    def test_modo_sincrono(self):
+        self.assertIsNone(encolar('_anotar', 5))
+        with self.assertLogs('gestion.tareas', 'ERROR'):
+            self.assertIsNone(encolar('_fallar'))
+        self.assertEqual(llamadas, [5])
+        self.assertFalse(Tarea.objects.exists())
+
+
+class TareasBibliotecaTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.autor = Autor.objects.create(nombre='Julio', apellido='Cortázar')
+        cls.bodeguero = User.objects.create_user('bodega', password='test12345')
+        Perfil.objects.create(usuario=cls.bodeguero, cedula='3', telefono='1', rol='bodeguero')
+        admin = User.objects.create_user('admin', password='test12345')
+        Perfil.objects.create(usuario=admin, cedula='9', telefono='1', rol='admin')
+
+    def test_volcar_logs(self):
+        registrar_log(self.bodeguero, 'crear', 'Primero')
+        registrar_log(None, 'ver', 'Segundo')
+        self.assertEqual(Tarea.objects.get().nombre, 'volcar_logs')
+        with tempfile.TemporaryDirectory() as carpeta:
+            archivo = os.path.join(carpeta, 'logs.txt')
+            with mock.patch('gestion.tareas.ARCHIVO_LOGS', archivo):
+                self.assertEqual(tareas.volcar_logs(), 2)
+                self.assertEqual(tareas.volcar_logs(), 0)
+            with open(archivo, encoding='utf-8') as f:
+                lineas = f.readlines()
+        self.assertIn('| Usuario: bodega | Acción: CREAR | Primero | IP: - | URL: -', lineas[0])
+        self.assertIn('Usuario: Anónimo', lineas[1])
+        self.assertEqual(len(lineas), RegistroActividad.objects.count())
+
+    def test_volcar_logs_sin_repetir_tras_un_fallo(self):
+        for n in range(3):
+            registrar_log(None, 'ver', f'Registro {n}')
+        linea_log = tareas._linea_log
+
+        def fallar_en_el_tercero(registro):
+            if registro.descripcion == 'Registro 2':
+                raise OSError('disco lleno')
+            return linea_log(registro)
+
+        with tempfile.TemporaryDirectory() as carpeta:
+            archivo = os.path.join(carpeta, 'logs.txt')
+            with open(archivo, 'w', encoding='utf-8') as f:
+                f.write('anterior\n')
+            with mock.patch('gestion.tareas.ARCHIVO_LOGS', archivo):
+                # Falla el tercero, con los dos primeros ya escritos
+                with mock.patch('gestion.tareas._linea_log', fallar_en_el_tercero), self.assertRaises(OSError):
+                    tareas.volcar_logs(lote=1)
+                with open(archivo, encoding='utf-8') as f:
+                    self.assertEqual(f.read(), 'anterior\n')
+                self.assertEqual(tareas.volcar_logs(lote=1), 3)
+            with open(archivo, encoding='utf-8') as f:
+                lineas = f.readlines()
+        self.assertEqual(len(lineas), 4)
+
+    @mock.patch('gestion.views.registrar_log')
+    @mock.patch('gestion.tareas.obtener_descripcion', return_value='Una novela')
+    @mock.patch('gestion.tareas.requests.get')
+    def test_crear_libro_delega_la_portada(self, get, obtener_descripcion, registrar_log):
+        self.client.login(username='bodega', password='test12345')
+        self.client.post('/libros/nuevo/', {'titulo': 'Rayuela', 'autor': self.autor.id, 'stock': 1,
+                                            'imagen_url': 'https://covers.openlibrary.org/b/id/1-M.jpg',
+                                            'es_de_openlibrary': 'true', 'id_openlibrary': '/works/OL1W'})
+        get.assert_not_called()
+        self.assertEqual(sorted(Tarea.objects.values_list('nombre', flat=True)),
+                         ['completar_descripcion', 'descargar_portada'])
+        get.return_value = mock.Mock(content=b'jpg', status_code=200)
+        with tempfile.TemporaryDirectory() as carpeta, override_settings(MEDIA_ROOT=carpeta):
+            self.assertEqual(trabajar('w1', una_vez=True), 2)
+            libro = Libro.objects.get(titulo='Rayuela')
+            self.assertTrue(libro.imagen.name.endswith('.jpg'))
+        self.assertEqual(libro.descripcion, 'Una novela')
+
+    @mock.patch('gestion.views.registrar_log')
+    def test_pagina_de_estado(self, registrar_log):
+        encolar('_fallar', max_intentos=1)
+        encolar('_anotar', 1, retraso=3600)
+        with self.assertLogs('gestion.tareas', 'WARNING'):
+            trabajar('w1', una_vez=True)
+        self.client.login(username='bodega', password='test12345')
+        self.assertEqual(self.client.get('/tareas/').status_code, 403)
+        self.client.login(username='admin', password='test12345')
+        respuesta = self.client.get('/tareas/')
+        self.assertContains(respuesta, 'sin conexión')
+        self.assertEqual([f['nombre'] for f in respuesta.context['pendientes']], ['_anotar'])
+        fallida = Tarea.objects.get(estado='fallida')
+        self.client.post('/tareas/', {'reintentar': fallida.id})
+        fallida.refresh_from_db()
+        self.assertEqual((fallida.estado, fallida.intentos), ('pendiente', 0))
@@ -5,7 +5,7 @@ from gestion.models import Libro, Autor
 class ListaLibroViewTest(TestCase):
     @classmethod
     def setUpTestData(cls):
-        autor = Autor.objects.create(nombre="autor", apellido="libro", bibiografia="bio")
+        autor = Autor.objects.create(nombre="autor", apellido="libro", bibliografia="bio")
         for i in range(3):
             Libro.objects.create(titulo=f"I Robot {i}", autor=autor, disponible=True)
             
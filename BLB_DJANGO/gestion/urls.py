@@ -19,6 +19,7 @@ urlpatterns = [
     #libros
     path('libros/', lista_libros, name="lista_libros"),
     path('libros/nuevo/', crear_libro, name="crear_libro"),
+    path('libros/tendencias/', tendencias, name="tendencias"),
     path('libros/<int:id>/', detalle_libro, name="detalle_libro"),
     path('libros/<int:id>/editar/', editar_libro, name="editar_libro"),
     path('libros/<int:id>/eliminar/', eliminar_libro, name="eliminar_libro"),
@@ -33,6 +34,7 @@ urlpatterns = [
     #Prestamos
     path('prestamos/', lista_prestamos, name="lista_prestamos"),
     path('prestamos/nuevo/', crear_prestamo, name="crear_prestamo"),
+    path('prestamos/escanear/', escanear_codigo, name="escanear_codigo"),
     path('prestamos/<int:id>', detalle_prestamo, name="detalle_prestamo"),
     path('prestamos/<int:prestamo_id>/devolver/', devolver_libro, name='devolver_libro'),
     
@@ -60,8 +62,36 @@ urlpatterns = [
     
     # Gestión de Stock (Bodeguero)
     path('stock/', gestionar_stock, name='gestionar_stock'),
+    path('libros/<int:id>/ejemplares/', ejemplares_libro, name='ejemplares_libro'),
     
     # API OpenLibrary
     path('api/libros/', api_buscar_libros, name='api_buscar_libros'),
     path('api/autores/', api_buscar_autores, name='api_buscar_autores'),
+    path('api/autocompletar/', api_autocompletar, name='api_autocompletar'),
+    
+    # API JSON v1 (solo lectura; ver gestion/api.py)
+    path('api/v1/libros/', api_v1_lista, {'recurso': 'libros'}, name='api_v1_libros'),
+    path('api/v1/libros/<int:id>/', api_v1_detalle, {'recurso': 'libros'}, name='api_v1_libros_detalle'),
+    path('api/v1/libros/isbn/<str:codigo>/', api_v1_libro_isbn, name='api_v1_libros_isbn'),
+    path('api/v1/autores/', api_v1_lista, {'recurso': 'autores'}, name='api_v1_autores'),
+    path('api/v1/autores/<int:id>/', api_v1_detalle, {'recurso': 'autores'}, name='api_v1_autores_detalle'),
+    path('api/v1/prestamos/', api_v1_lista, {'recurso': 'prestamos'}, name='api_v1_prestamos'),
+    path('api/v1/prestamos/<int:id>/', api_v1_detalle, {'recurso': 'prestamos'}, name='api_v1_prestamos_detalle'),
+    path('api/v1/solicitudes/', api_v1_lista, {'recurso': 'solicitudes'}, name='api_v1_solicitudes'),
+    path('api/v1/solicitudes/<int:id>/', api_v1_detalle, {'recurso': 'solicitudes'}, name='api_v1_solicitudes_detalle'),
+    path('api/v1/disponibilidad/', api_v1_disponibilidad, name='api_v1_disponibilidad'),
+    path('api/v1/disponibilidad/sucursales/', api_v1_disponibilidad_sucursales, name='api_v1_disponibilidad_sucursales'),
+    
+    # Exportaciones en streaming (CSV / JSONL)
+    path('exportar/<str:tipo>/', exportar_datos, name='exportar'),
+    
+    # Métricas de rendimiento (Prometheus, solo personal)
+    path('metrics', metricas, name='metricas'),
+    path('consultas-lentas/', consultas_lentas, name='consultas_lentas'),
+    path('tareas/', estado_tareas, name='estado_tareas'),
+    
+    # Reportes de circulación (solo personal)
+    path('reportes/', reportes, name='reportes'),
+    path('reportes/exportar/', exportar_reporte, name='exportar_reporte'),
+    path('reportes/diario/', reporte_diario, name='reporte_diario'),
 ]
\ No newline at end of file
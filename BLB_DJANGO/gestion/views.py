@@ -1,17 +1,38 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.conf import settings
-from django.http import HttpResponseForbidden, JsonResponse
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.contrib.auth import login
+from django.core.paginator import Paginator
 from functools import wraps
-from .openlibrary import buscar_libros, buscar_autores
+from .openlibrary import buscar_libros, buscar_autores, obtener_descripcion, obtener_biografia
+from .metricas import exportar_prometheus
+from .consultas_lentas import peores_consultas
+from .reportes import filas_csv, reporte
+from .exportaciones import exportar, filtrar_libros, filtrar_multas, filtrar_prestamos
+from . import api
+from .disponibilidad import disponibilidad, parsear_ids
+from .inventario import (ajustar_en_bloque, ajustar_stock, devolver, es_codigo_ejemplar, por_sucursal, prestar,
+                         validar_objetivos)
+from .resumenes import METRICAS, dimensiones, serie
+from .kardex import stock_en
+from .tareas import encolar, reintentar
+from .replica import solo_lectura
+from .autocompletar import autocompletar
+from .popularidad import ESCALAS, populares, tendencias as libros_en_tendencia, valor_actual
+from .condicional import (condicional, estado_busqueda, estado_detalle_autor, estado_detalle_libro,
+                          estado_disponibilidad, estado_lista_libros)
 
-from .models import Autor, Libro, Prestamo, Multa, Perfil, SolicitudPrestamo, RegistroActividad, registrar_log
+from .normalizacion import clave_autor, normalizar_isbn
+from .models import (Autor, Libro, Prestamo, Multa, Perfil, SolicitudPrestamo, RegistroActividad, Recomendacion,
+                     Sucursal, Tarea, registrar_log)
 from .forms import RegistroUsuarioForm
-from datetime import timedelta
+from datetime import MAXYEAR, MINYEAR, date, timedelta
+import csv
+import io
 
 # ============================================
 # SISTEMA DE PERMISOS HECHO PARA LOS USUARIOS POR ROLES
@@ -32,6 +53,22 @@ def obtener_rol(user):
     except:
         return 'usuario'
 
+def sucursal_de(user):
+    """Id de la sucursal del perfil; None si no tiene (ve todas las sedes)"""
+    try:
+        return user.perfil.sucursal_id
+    except (AttributeError, Perfil.DoesNotExist):
+        return None
+
+def filtros_personal(request, rol):
+    """GET de las listas; el personal con sucursal queda fijado a su sede (?sucursal=)"""
+    sucursal = sucursal_de(request.user) if rol != 'usuario' else None
+    if not sucursal:
+        return request.GET
+    parametros = request.GET.copy()
+    parametros['sucursal'] = str(sucursal)
+    return parametros
+
 def tiene_permiso(user, roles_permitidos):
     """Verifica si el usuario tiene alguno de los roles permitidos"""
     rol = obtener_rol(user)
@@ -54,6 +91,7 @@ def requiere_rol(*roles_permitidos):
         return _wrapped_view
     return decorator
 
+@solo_lectura
 def index(request):
     # Calcular totales para el dashboard
     total_libros = Libro.objects.count()
@@ -63,8 +101,9 @@ def index(request):
     total_stock = Libro.objects.aggregate(total=models.Sum('stock'))['total'] or 0
     mis_solicitudes = 0
     
-    # Libros destacados para visitantes (los últimos 8)
-    libros_destacados = Libro.objects.all().order_by('-id')[:8]
+    # Libros destacados para visitantes: los 8 más populares (índice de popularidad).
+    # El orden se renueva cuando caduca el fragmento (CACHE_FRAGMENTOS_TIMEOUT)
+    libros_destacados = populares(8)
     
     if request.user.is_authenticated:
         mis_solicitudes = SolicitudPrestamo.objects.filter(usuario=request.user).count()
@@ -79,10 +118,23 @@ def index(request):
         'libros_destacados': libros_destacados,
     })
 
+@solo_lectura
+@condicional(estado_lista_libros)
 def lista_libros(request):
-    libros = Libro.objects.all()
+    libros = Libro.objects.select_related('autor')
     return render(request, 'gestion/templates/libros.html', {'libros': libros})
 
+@solo_lectura
+def tendencias(request):
+    """Libros con más préstamos y solicitudes en la última semana - todos pueden ver"""
+    libros = list(libros_en_tendencia(20))
+    for libro in libros:
+        # Préstamos equivalentes, ya con el decaimiento aplicado
+        libro.actividad = valor_actual(libro.tendencia, ESCALAS['tendencia'])
+    return render(request, 'gestion/templates/tendencias.html', {'libros': libros})
+
+@solo_lectura
+@condicional(estado_detalle_libro)
 def detalle_libro(request, id):
     """Vista para ver detalle de un libro - todos pueden ver"""
     libro = get_object_or_404(Libro, id=id)
@@ -91,11 +143,25 @@ def detalle_libro(request, id):
     if request.user.is_authenticated:
         rol = obtener_rol(request.user)
         puede_editar = rol in ['bodeguero', 'superusuario']
+    # Calculadas por lotes (comando calcular_recomendaciones); solo se consultan si el fragmento no está en caché
+    recomendaciones = Recomendacion.objects.filter(libro_id=libro.id).select_related('recomendado__autor')
     return render(request, 'gestion/templates/detalle_libro.html', {
         'libro': libro,
-        'puede_editar': puede_editar
+        'puede_editar': puede_editar,
+        'recomendaciones': recomendaciones,
     })
 
+def _error_isbn(isbn, libro=None):
+    """Mensaje si el ISBN (opcional) no es válido o ya es de otro libro; None si se puede usar"""
+    if not isbn:
+        return None
+    normalizado = normalizar_isbn(isbn)
+    if normalizado is None:
+        return f'El ISBN {isbn} no es válido.'
+    if Libro.objects.filter(isbn=normalizado).exclude(id=getattr(libro, 'id', None)).exists():
+        return f'Ya existe un libro con el ISBN {isbn}.'
+    return None
+
 @requiere_rol('bodeguero')
 def editar_libro(request, id):
     """Vista para editar un libro - solo bodeguero y admin"""
@@ -108,8 +174,6 @@ def editar_libro(request, id):
         if autor_id:
             libro.autor = get_object_or_404(Autor, id=autor_id)
         libro.descripcion = request.POST.get('descripcion', libro.descripcion)
-        libro.stock = int(request.POST.get('stock', libro.stock))
-        libro.disponible = request.POST.get('disponible') == 'on'
         
         if request.POST.get('anio_publicacion'):
             libro.anio_publicacion = int(request.POST.get('anio_publicacion'))
@@ -118,13 +182,37 @@ def editar_libro(request, id):
         if imagen:
             libro.imagen = imagen
         
-        libro.save()
+        isbn = request.POST.get('isbn', libro.isbn or '').strip()
+        error = _error_isbn(isbn, libro)
+        stock = request.POST.get('stock', '').strip()
+        maximo = settings.STOCK_MAXIMO_POR_LIBRO
+        if error is None and stock and not stock.isdigit():
+            error = f'El stock "{stock}" no es un entero mayor o igual a 0.'
+        elif error is None and stock and int(stock) > maximo:
+            error = f'El stock {stock} supera el máximo de {maximo} por libro.'
+        if error is None:
+            libro.isbn = isbn
+            try:
+                # stock y disponible los lleva el inventario (ejemplares), no se guardan aquí
+                with transaction.atomic():
+                    libro.save(update_fields=['titulo', 'autor', 'descripcion', 'anio_publicacion', 'imagen',
+                                              'isbn', 'updated_at'])
+            except IntegrityError:
+                # Otro libro tomó el mismo ISBN entre la validación y el guardado
+                error = f'Ya existe un libro con el ISBN {isbn}.'
+        if error:
+            return render(request, 'gestion/templates/editar_libro.html',
+                          {'libro': libro, 'autores': autores, 'error': error, 'isbn': isbn})
+        if stock:
+            # Como en gestionar_stock: el bodeguero con sede ajusta los ejemplares de su sede
+            ajustar_stock(libro, int(stock), sucursal_id=sucursal_de(request.user), actor=request.user)
         registrar_log(request.user, 'editar', f'Editó libro: {libro.titulo}', request, 'Libro', libro.id)
         return redirect('detalle_libro', id=libro.id)
     
     return render(request, 'gestion/templates/editar_libro.html', {
         'libro': libro,
-        'autores': autores
+        'autores': autores,
+        'isbn': libro.isbn or '',
     })
 
 @requiere_rol('bodeguero')
@@ -154,12 +242,18 @@ def crear_libro(request):
         autor_id = request.POST.get('autor')
         autor_nombre = request.POST.get('autor_nombre', '')  # Nombre del autor de OpenLibrary
         stock = request.POST.get('stock', 1)
-        disponible = request.POST.get('disponible') == 'on'
         imagen = request.FILES.get('imagen')
         imagen_url = request.POST.get('imagen_url', '')
         descripcion = request.POST.get('descripcion', '')
         anio_publicacion = request.POST.get('anio_publicacion')
         es_de_openlibrary = request.POST.get('es_de_openlibrary') == 'true'
+        id_openlibrary = request.POST.get('id_openlibrary', '')  # work key, p. ej. /works/OL45804W
+        isbn = request.POST.get('isbn', '').strip()
+        
+        # El ISBN es opcional, pero si viene debe ser válido y no estar registrado
+        error = _error_isbn(isbn)
+        if error:
+            return render(request, 'gestion/templates/crear_libros.html', {'autores': autores, 'error': error})
         
         # Determinar el autor
         autor = None
@@ -174,39 +268,42 @@ def crear_libro(request):
             else:
                 nombre = autor_nombre
                 apellido = ''
-            # Buscar o crear el autor
-            autor, created = Autor.objects.get_or_create(
-                nombre__iexact=nombre,
-                apellido__iexact=apellido,
-                defaults={'nombre': nombre, 'apellido': apellido}
-            )
+            # Buscar por la clave normalizada (indexada): "J.R.R. Tolkien" = "J. R. R. Tolkien"
+            autor = Autor.objects.filter(clave_normalizada=clave_autor(nombre, apellido)).first()
+            if autor is None:
+                autor = Autor.objects.create(nombre=nombre, apellido=apellido)
         
         if titulo and autor:
-            libro = Libro.objects.create(
-                titulo=titulo, 
-                autor=autor, 
-                stock=int(stock) if stock else 1,
-                disponible=disponible,
-                descripcion=descripcion,
-                anio_publicacion=int(anio_publicacion) if anio_publicacion else None,
-                es_de_openlibrary=es_de_openlibrary
-            )
+            try:
+                with transaction.atomic():
+                    libro = Libro.objects.create(
+                        titulo=titulo, 
+                        autor=autor, 
+                        stock=int(stock) if stock else 1,  # Libro.save crea un ejemplar por unidad
+                        disponible=int(stock or 1) > 0,
+                        descripcion=descripcion,
+                        anio_publicacion=int(anio_publicacion) if anio_publicacion else None,
+                        es_de_openlibrary=es_de_openlibrary,
+                        isbn=isbn
+                    )
+            except IntegrityError:
+                # Otro libro tomó el mismo ISBN entre la validación y el guardado
+                return render(request, 'gestion/templates/crear_libros.html',
+                              {'autores': autores, 'error': f'Ya existe un libro con el ISBN {isbn}.'})
+            # Los ejemplares nuevos quedan en la sede del bodeguero
+            if sucursal_de(request.user):
+                libro.ejemplares.update(sucursal_id=sucursal_de(request.user))
             
             # Si hay imagen subida manualmente, usarla
             if imagen:
                 libro.imagen = imagen
                 libro.save()
-            # Si hay URL de OpenLibrary, descargar la imagen
+            # Si hay URL de OpenLibrary, la portada la descarga el worker
             elif imagen_url:
-                try:
-                    import requests
-                    from django.core.files.base import ContentFile
-                    response = requests.get(imagen_url, timeout=10)
-                    if response.status_code == 200:
-                        nombre_archivo = f"libro_{libro.id}.jpg"
-                        libro.imagen.save(nombre_archivo, ContentFile(response.content), save=True)
-                except Exception as e:
-                    print(f"Error descargando imagen: {e}")
+                encolar('descargar_portada', libro.id, imagen_url)
+            # Sin descripción (la búsqueda no la trajo): se completa en segundo plano
+            if es_de_openlibrary and not descripcion and id_openlibrary:
+                encolar('completar_descripcion', libro.id, id_openlibrary)
             
             registrar_log(request.user, 'crear', f'Creó libro: {titulo}', request, 'Libro', libro.id)
             return redirect('lista_libros')
@@ -219,8 +316,11 @@ def lista_prestamos(request):
         prestamos = Prestamo.objects.filter(usuario=request.user)
     else:
         prestamos = Prestamo.objects.all()
+    # Mismos filtros que la exportación (?estado=, ?usuario=, ?sucursal=, ?desde=, ?hasta=)
+    prestamos = filtrar_prestamos(prestamos, filtros_personal(request, rol))
     return render(request, 'gestion/templates/prestamos.html', {'prestamos': prestamos})
 
+@solo_lectura
 def lista_autores(request):
     autores = Autor.objects.all()
     return render(request, 'gestion/templates/autores.html', {'autores': autores})
@@ -239,6 +339,14 @@ def crear_autor(request, id=None):
         apellido = request.POST.get('apellido')
         bibliografia = request.POST.get('bibliografia')
         if autor == None:
+            # Evitar duplicados: mismo nombre normalizado (tildes, iniciales, mayúsculas)
+            existente = Autor.objects.filter(clave_normalizada=clave_autor(nombre, apellido)).first()
+            if existente:
+                return render(request, 'gestion/templates/crear_autores.html', {
+                    'titulo': 'Crear Autor',
+                    'texto_boton': 'Crear',
+                    'existente': existente,
+                })
             Autor.objects.create(nombre=nombre, apellido=apellido, bibliografia=bibliografia)
         else:
             autor.apellido = apellido
@@ -258,49 +366,94 @@ def lista_multas(request):
         multas = Multa.objects.filter(prestamo__usuario=request.user)
     else:
         multas = Multa.objects.all()
+    # Mismos filtros que la exportación (?tipo=, ?pagada=, ?sucursal=, ?desde=, ?hasta=)
+    multas = filtrar_multas(multas, filtros_personal(request, rol))
     return render(request, 'gestion/templates/multas.html', {'multas': multas})
 
+def _libro_por_codigo(codigo):
+    """
+    Libro por código escaneado: el de un ejemplar (EJ-...), un ISBN (10 o 13
+    dígitos, con o sin guiones) o el id. None si no existe.
+    """
+    codigo = (codigo or '').strip()
+    libros = Libro.objects.select_related('autor')
+    if es_codigo_ejemplar(codigo):
+        return libros.filter(ejemplares__codigo_barras=codigo.upper()).first()
+    isbn = normalizar_isbn(codigo)
+    if isbn:
+        return libros.filter(isbn=isbn).first()
+    if codigo.isdigit():
+        return libros.filter(id=codigo).first()
+    return None
+
+def _lector_por_codigo(codigo):
+    """Usuario normal por nombre de usuario o cédula (carnet escaneado); None si no existe"""
+    codigo = (codigo or '').strip()
+    if not codigo:
+        return None
+    return (User.objects.select_related('perfil').filter(perfil__rol='usuario')
+            .filter(models.Q(username=codigo) | models.Q(perfil__cedula=codigo)).first())
+
 @requiere_rol('bibliotecario', 'admin')
 def crear_prestamo(request):
-    libro = Libro.objects.filter(disponible=True)
-    # Solo mostrar usuarios normales (no personal del sistema)
-    usuario = User.objects.filter(perfil__rol='usuario')
+    """
+    Préstamo a partir de códigos escaneados: ejemplar, ISBN o id del libro y
+    usuario o cédula del lector. La página no carga el catálogo ni la lista de usuarios.
+    Con el código de un ejemplar se presta esa copia; si no, cualquiera disponible.
+    """
+    fecha = (timezone.now().date()).isoformat() # YYYY-MM-DD este se captura l aparte de al fehc actual
+    contexto = {'fecha': fecha}
     if request.method == 'POST':
-        libro_id = request.POST.get('libro')
-        usuario_id = request.POST.get('usuario')
+        libro_codigo = request.POST.get('libro', '')
+        usuario_codigo = request.POST.get('usuario', '')
         fecha_prestamo = request.POST.get('fecha_prestamo')
         fecha_max = request.POST.get('fecha_max')
-        if libro_id and usuario_id and fecha_prestamo and fecha_max:
-            libro = get_object_or_404(Libro, id=libro_id)
-            usuario = get_object_or_404(User, id=usuario_id)
-            
-            # Verificar stock
-            if libro.stock > 0:
-                prestamo = Prestamo.objects.create(libro = libro,
-                                                   usuario=usuario,
-                                                   fecha_prestamos=fecha_prestamo,
-                                                   fecha_max=fecha_max)
-                
-                # Actualizar stock y disponibilidad
-                libro.stock -= 1
-                libro.disponible = libro.stock > 0
-                libro.save()
-                
-                # Registrar en log
-                registrar_log(request.user, 'crear', f'Creó préstamo #{prestamo.id} de "{libro.titulo}" para {usuario.username}', request, 'Prestamo', prestamo.id)
-                
-                return redirect('detalle_prestamo', id=prestamo.id)
+        contexto.update(libro_codigo=libro_codigo, usuario_codigo=usuario_codigo,
+                        fecha=fecha_prestamo or fecha, fecha_max=fecha_max)
+        if libro_codigo and usuario_codigo and fecha_prestamo and fecha_max:
+            libro = _libro_por_codigo(libro_codigo)
+            usuario = _lector_por_codigo(usuario_codigo)
+            if libro is None:
+                contexto['error'] = f'No hay ningún libro con el código {libro_codigo}.'
+            elif usuario is None:
+                contexto['error'] = f'No hay ningún usuario con el código {usuario_codigo}.'
             else:
-                 # Manejo visual en caso de error (aunque el filtro inicial ayuda)
-                 return render(request, 'gestion/templates/crear_prestamo.html', {
-                    'libros': Libro.objects.filter(disponible=True), # Recargar
-                    'usuarios': User.objects.filter(perfil__rol='usuario'),
-                    'error': 'El libro seleccionado no tiene stock disponible.'
-                 })
-    fecha = (timezone.now().date()).isoformat() # YYYY-MM-DD este se captura l aparte de al fehc actual
-    return render(request, 'gestion/templates/crear_prestamo.html', {'libros': libro,
-                                                                     'usuarios': usuario,
-                                                                     'fecha': fecha})
+                # Reclama un ejemplar disponible y descuenta el stock en la misma transacción
+                codigo = libro_codigo if es_codigo_ejemplar(libro_codigo) else None
+                # Sin código de ejemplar se presta una copia de la sede del bibliotecario
+                sucursal = sucursal_de(request.user)
+                prestamo = prestar(usuario, fecha_max, libro_id=libro.id, codigo=codigo,
+                                   fecha_prestamo=fecha_prestamo, sucursal_id=sucursal, actor=request.user)
+                if prestamo is None:
+                    contexto['error'] = ('Ese ejemplar no está disponible.' if codigo
+                                         else 'El libro seleccionado no tiene stock disponible'
+                                              + (' en esta sucursal.' if sucursal else '.'))
+                else:
+                    # Registrar en log
+                    registrar_log(request.user, 'crear', f'Creó préstamo #{prestamo.id} de "{libro.titulo}" para {usuario.username}', request, 'Prestamo', prestamo.id)
+                    
+                    return redirect('detalle_prestamo', id=prestamo.id)
+    return render(request, 'gestion/templates/crear_prestamo.html', contexto)
+
+@requiere_rol('bibliotecario', 'admin')
+def escanear_codigo(request):
+    """
+    Vista previa del formulario de préstamo: ?libro=<ISBN o id> o ?usuario=<usuario o cédula>.
+    Una consulta indexada por código, para seguir el ritmo del lector de códigos.
+    """
+    if request.GET.get('libro'):
+        libro = _libro_por_codigo(request.GET['libro'])
+        if libro is None:
+            return JsonResponse({'error': 'libro no encontrado'}, status=404)
+        return JsonResponse({'id': libro.id, 'titulo': libro.titulo, 'autor': f'{libro.autor.nombre} {libro.autor.apellido}',
+                             'isbn': libro.isbn, 'stock': libro.stock})
+    if request.GET.get('usuario'):
+        usuario = _lector_por_codigo(request.GET['usuario'])
+        if usuario is None:
+            return JsonResponse({'error': 'usuario no encontrado'}, status=404)
+        return JsonResponse({'id': usuario.id, 'username': usuario.username,
+                             'nombre': usuario.get_full_name() or usuario.username, 'cedula': usuario.perfil.cedula})
+    return JsonResponse({'error': 'indica ?libro= o ?usuario='}, status=400)
 
 @requiere_rol('bodeguero')
 def editar_autor(request, id):
@@ -337,6 +490,8 @@ def eliminar_autor(request, id):
     
     return redirect('lista_autores')
 
+@solo_lectura
+@condicional(estado_detalle_autor)
 def detalle_autor(request, id):
     """Vista pública para ver detalles de un autor"""
     autor = get_object_or_404(Autor, id=id)
@@ -432,16 +587,10 @@ def devolver_libro(request, prestamo_id):
     if request.method == 'POST':
         estado_libro = request.POST.get('estado_libro')
 
-        # Marcar fecha de devolución
-        # Marcar fecha de devolución
-        prestamo.fecha_devolucion = timezone.now().date()
-        
-        # Restaurar Stock
-        prestamo.libro.stock += 1
-        prestamo.libro.disponible = True
-        prestamo.libro.save()
-        
-        prestamo.save()
+        # Marcar fecha de devolución y devolver el ejemplar (uno perdido se da de baja)
+        if not devolver(prestamo, perdido=estado_libro == 'perdida', actor=request.user):
+            # Ya estaba devuelto (doble envío): no repetir stock ni multas
+            return redirect('detalle_prestamo', id=prestamo.id)
         
         # Crear multa por retraso si hay días de retraso
         if prestamo.dias_retraso > 0:
@@ -484,99 +633,115 @@ def renovar_prestamo(request, prestamo_id):
     return redirect('detalle_prestamo', id=prestamo.id)
 
 #API OPENLIBRARY
+def _primer_isbn(codigos):
+    """El primer ISBN válido de una obra de OpenLibrary, ya normalizado ('' si no hay)"""
+    for codigo in codigos:
+        isbn = normalizar_isbn(codigo)
+        if isbn:
+            return isbn
+    return ''
+
+def _libros_openlibrary(query):
+    """Resultados de OpenLibrary con el formato que usan los formularios"""
+    libros = []
+    for libro in buscar_libros(query):
+        # Obtener descripción del Works endpoint (si tiene key)
+        descripcion = ''
+        work_key = libro.get('key', '')
+        if work_key:
+            descripcion = obtener_descripcion(work_key)
+        
+        libros.append({
+            'titulo': libro.get('title', 'Sin título'),
+            'autor': ', '.join(libro.get('author_name', ['Desconocido'])),
+            'año': libro.get('first_publish_year', 'N/A'),
+            'portada': f"https://covers.openlibrary.org/b/id/{libro.get('cover_i', '')}-M.jpg" if libro.get('cover_i') else None,
+            'descripcion': descripcion[:500] if descripcion else '',
+            'id_openlibrary': work_key,
+            'isbn': _primer_isbn(libro.get('isbn', []))
+        })
+    return libros
+
+def _autores_openlibrary(query):
+    autores = []
+    for autor in buscar_autores(query):
+        # Obtener biografía
+        biografia = ''
+        autor_key = autor.get('key', '') # e.g. OL123A
+        if autor_key:
+            biografia = obtener_biografia(autor_key)
+
+        autores.append({
+            'nombre': autor.get('name', 'Sin nombre'),
+            'obras': autor.get('work_count', 0),
+            'biografia': biografia[:500] if biografia else '' 
+        })
+    return autores
+
+@condicional(estado_busqueda, por_usuario=False)
 def api_buscar_libros(request):
     query = request.GET.get('q', '')
     if query:
-        resultados = buscar_libros(query)
-
-        # reiniciar los resultados
-        libros = []
-        for libro in resultados:
-            # Obtener descripción del Works endpoint (si tiene key)
-            descripcion = ''
-            work_key = libro.get('key', '')
-            if work_key:
-                try:
-                    import requests as req
-                    work_response = req.get(f'https://openlibrary.org{work_key}.json', timeout=5)
-                    if work_response.status_code == 200:
-                        work_data = work_response.json()
-                        desc = work_data.get('description', '')
-                        if isinstance(desc, dict):
-                            descripcion = desc.get('value', '')
-                        elif isinstance(desc, str):
-                            descripcion = desc
-                except:
-                    pass
-            
-            libros.append({
-                'titulo': libro.get('title', 'Sin título'),
-                'autor': ', '.join(libro.get('author_name', ['Desconocido'])),
-                'año': libro.get('first_publish_year', 'N/A'),
-                'portada': f"https://covers.openlibrary.org/b/id/{libro.get('cover_i', '')}-M.jpg" if libro.get('cover_i') else None,
-                'descripcion': descripcion[:500] if descripcion else '',
-                'id_openlibrary': work_key
-            })
-        return JsonResponse({'libros': libros})
+        return JsonResponse({'libros': _libros_openlibrary(query)})
     return JsonResponse({'libros': []})
 
+@condicional(estado_busqueda, por_usuario=False)
 def api_buscar_autores(request):
     query = request.GET.get('q', '')
     if query:
-        resultados = buscar_autores(query)
-        autores = []
-        for autor in resultados:
-            # Obtener biografía
-            biografia = ''
-            autor_key = autor.get('key', '') # e.g. OL123A
-            if autor_key:
-                try:
-                    import requests as req
-                    # OpenLibrary devuelve keys como "OL123A", la URL requiere "/authors/OL123A.json"
-                    # A veces la key ya viene completa en search? No, suele ser el ID. 
-                    # El search docs devuelve "key": "OL..."
-                    
-                    url_autor = f'https://openlibrary.org/authors/{autor_key}.json'
-                    resp = req.get(url_autor, timeout=3)
-                    if resp.status_code == 200:
-                        data_autor = resp.json()
-                        bio = data_autor.get('bio', '')
-                        if isinstance(bio, dict):
-                            biografia = bio.get('value', '')
-                        elif isinstance(bio, str):
-                            biografia = bio
-                except:
-                    pass
-
-            autores.append({
-                'nombre': autor.get('name', 'Sin nombre'),
-                'obras': autor.get('work_count', 0),
-                'biografia': biografia[:500] if biografia else '' 
-            })
-        return JsonResponse({'autores': autores})
+        return JsonResponse({'autores': _autores_openlibrary(query)})
     return JsonResponse({'autores': []})
 
+def api_autocompletar(request):
+    """
+    Sugerencias del catálogo local (índice en memoria, gestion/autocompletar.py).
+    Con externos=1 completa con OpenLibrary solo si hay pocos resultados locales.
+    """
+    query = request.GET.get('q', '')
+    tipo = 'autores' if request.GET.get('tipo') == 'autores' else 'libros'
+    locales = autocompletar(tipo, query)
+    externos = []
+    if request.GET.get('externos') and len(query) >= 2 and len(locales) < settings.AUTOCOMPLETAR_MINIMO_LOCAL:
+        externos = _libros_openlibrary(query) if tipo == 'libros' else _autores_openlibrary(query)
+    return JsonResponse({'locales': locales, tipo: externos})
+
 # =====================================================
 # SISTEMA DE SOLICITUDES DE PRÉSTAMOS
 # =====================================================
 
+def _sucursal_invalida(valor):
+    """True si el formulario trae una sucursal que no es el id de una existente"""
+    valor = str(valor or '')
+    return bool(valor) and not (valor.isdigit() and Sucursal.objects.filter(id=valor).exists())
+
 @login_required
 def crear_solicitud(request):
     """Vista para que usuarios normales soliciten un préstamo"""
     # Obtener libros disponibles
     libros_disponibles = Libro.objects.filter(disponible=True)
     
+    sucursales = Sucursal.objects.order_by('nombre')
+    contexto = {'libros': libros_disponibles, 'sucursales': sucursales, 'sucursal_usuario': sucursal_de(request.user)}
+    
     if request.method == 'POST':
         libro_id = request.POST.get('libro')
         dias = request.POST.get('dias', 7)
+        # Sede donde se retirará (la del usuario si no elige otra)
+        sucursal = request.POST.get('sucursal') or sucursal_de(request.user)
         
         if libro_id:
             libro = get_object_or_404(Libro, id=libro_id)
             
+            if _sucursal_invalida(sucursal):
+                return render(request, 'gestion/templates/crear_solicitud.html', {
+                    **contexto,
+                    'error': 'La sucursal elegida no existe'
+                })
+            
             # Verificar que el libro esté disponible
             if not libro.disponible:
                 return render(request, 'gestion/templates/crear_solicitud.html', {
-                    'libros': libros_disponibles,
+                    **contexto,
                     'error': 'Este libro ya no está disponible'
                 })
             
@@ -589,7 +754,7 @@ def crear_solicitud(request):
             
             if solicitud_existente:
                 return render(request, 'gestion/templates/crear_solicitud.html', {
-                    'libros': libros_disponibles,
+                    **contexto,
                     'error': 'Ya tienes una solicitud pendiente para este libro'
                 })
             
@@ -597,7 +762,8 @@ def crear_solicitud(request):
             solicitud = SolicitudPrestamo.objects.create(
                 usuario=request.user,
                 libro=libro,
-                dias_solicitados=int(dias)
+                dias_solicitados=int(dias),
+                sucursal_id=sucursal or None
             )
             
             # Registrar en log
@@ -605,9 +771,7 @@ def crear_solicitud(request):
             
             return redirect('mis_solicitudes')
     
-    return render(request, 'gestion/templates/crear_solicitud.html', {
-        'libros': libros_disponibles
-    })
+    return render(request, 'gestion/templates/crear_solicitud.html', contexto)
 
 @login_required
 def mis_solicitudes(request):
@@ -619,9 +783,13 @@ def mis_solicitudes(request):
 
 @requiere_rol('bibliotecario', 'admin')
 def lista_solicitudes(request):
-    """Vista para que bibliotecarios/admins vean todas las solicitudes pendientes"""
-    solicitudes_pendientes = SolicitudPrestamo.objects.filter(estado='pendiente')
-    solicitudes_procesadas = SolicitudPrestamo.objects.exclude(estado='pendiente')[:20]
+    """Vista para que bibliotecarios/admins vean todas las solicitudes pendientes (de su sede si tienen una)"""
+    solicitudes = SolicitudPrestamo.objects.all()
+    sucursal = sucursal_de(request.user)
+    if sucursal:
+        solicitudes = solicitudes.filter(sucursal_id=sucursal)
+    solicitudes_pendientes = solicitudes.filter(estado='pendiente')
+    solicitudes_procesadas = solicitudes.exclude(estado='pendiente')[:20]
     
     return render(request, 'gestion/templates/lista_solicitudes.html', {
         'solicitudes_pendientes': solicitudes_pendientes,
@@ -637,11 +805,15 @@ def aprobar_solicitud(request, solicitud_id):
         return redirect('lista_solicitudes')
     
     if request.method == 'POST':
-        # Verificar que el libro sigue disponible
-        # Verificar que hay STOCK disponible
-        if solicitud.libro.stock <= 0:
+        # Crear el préstamo reclamando un ejemplar disponible (descuenta el stock)
+        fecha_max = timezone.now().date() + timedelta(days=solicitud.dias_solicitados)
+        prestamo = prestar(solicitud.usuario, fecha_max, libro_id=solicitud.libro_id,
+                           sucursal_id=solicitud.sucursal_id, actor=request.user)
+        
+        # Sin ejemplares disponibles (en la sede de retiro) se rechaza
+        if prestamo is None:
             solicitud.estado = 'rechazada'
-            solicitud.motivo_rechazo = 'No hay stock disponible'
+            solicitud.motivo_rechazo = 'No hay stock disponible' + (' en la sucursal' if solicitud.sucursal_id else '')
             solicitud.fecha_respuesta = timezone.now()
             solicitud.respondido_por = request.user
             solicitud.save()
@@ -653,19 +825,6 @@ def aprobar_solicitud(request, solicitud_id):
         solicitud.respondido_por = request.user
         solicitud.save()
         
-        # Crear el préstamo
-        fecha_max = timezone.now().date() + timedelta(days=solicitud.dias_solicitados)
-        prestamo = Prestamo.objects.create(
-            libro=solicitud.libro,
-            usuario=solicitud.usuario,
-            fecha_max=fecha_max
-        )
-        
-        # Actualizar stock
-        solicitud.libro.stock -= 1
-        solicitud.libro.disponible = solicitud.libro.stock > 0
-        solicitud.libro.save()
-        
         # Registrar en log
         registrar_log(request.user, 'aprobar', f'Aprobó solicitud #{solicitud.id} de {solicitud.usuario.username} para "{solicitud.libro.titulo}"', request, 'SolicitudPrestamo', solicitud.id)
         
@@ -748,7 +907,19 @@ def editar_usuario(request, user_id):
         defaults={'cedula': '0000000000', 'telefono': '0000000000', 'rol': 'usuario'}
     )
     
+    contexto = {
+        'usuario': usuario,
+        'perfil': perfil,
+        'roles': Perfil.ROLES,
+        'sucursales': Sucursal.objects.order_by('nombre'),
+    }
+    
     if request.method == 'POST':
+        sucursal = request.POST.get('sucursal')
+        if _sucursal_invalida(sucursal):
+            return render(request, 'gestion/templates/editar_usuario.html',
+                          {**contexto, 'error': 'La sucursal elegida no existe'})
+        
         # Datos del usuario (User model)
         usuario.first_name = request.POST.get('first_name', usuario.first_name)
         usuario.last_name = request.POST.get('last_name', usuario.last_name)
@@ -762,6 +933,7 @@ def editar_usuario(request, user_id):
         perfil.rol = nuevo_rol
         perfil.cedula = nueva_cedula
         perfil.telefono = nuevo_telefono
+        perfil.sucursal_id = sucursal or None
         perfil.save()
         
         # Actualizar is_staff según el rol
@@ -773,12 +945,7 @@ def editar_usuario(request, user_id):
         
         return redirect('lista_usuarios')
     
-    roles = Perfil.ROLES
-    return render(request, 'gestion/templates/editar_usuario.html', {
-        'usuario': usuario,
-        'perfil': perfil,
-        'roles': roles
-    })
+    return render(request, 'gestion/templates/editar_usuario.html', contexto)
 
 @requiere_rol('admin')
 def eliminar_usuario(request, user_id):
@@ -836,24 +1003,346 @@ def lista_logs(request):
 # GESTIÓN DE STOCK (Bodeguero)
 # =====================================================
 
+# Cambios de stock que se aplican y registran juntos (una transacción y una entrada de log por lote)
+LOTE_STOCK = 500
+LIBROS_POR_PAGINA = 50
+
+def _filas_csv(archivo):
+    """(etiqueta, id o ISBN, stock) de cada línea de un CSV de inventario; salta la cabecera si la hay"""
+    texto = archivo.read().decode('utf-8-sig', errors='replace')
+    primera = texto.split('\n', 1)[0]
+    delimitador = ';' if ';' in primera and ',' not in primera else ','
+    for numero, fila in enumerate(csv.reader(io.StringIO(texto), delimiter=delimitador), start=1):
+        if not any(celda.strip() for celda in fila):
+            continue
+        if numero == 1 and not fila[-1].strip().isdigit():
+            continue
+        yield f'Línea {numero}', fila[0], fila[1] if len(fila) > 1 else ''
+
+def _filas_grilla(post):
+    """Filas de la grilla editada cuyo valor cambió respecto al mostrado"""
+    for clave, valor in post.items():
+        if clave.startswith('stock_') and valor.strip() != post.get(f'antes_{clave[6:]}', '').strip():
+            yield f'Libro #{clave[6:]}', clave[6:], valor
+
+def _aplicar_stock(request, objetivos, sucursal):
+    """Aplica los objetivos por lotes con una entrada de log por lote; devuelve los libros ajustados"""
+    ids = list(objetivos)
+    lotes = range(0, len(ids), LOTE_STOCK)
+    for numero, inicio in enumerate(lotes, start=1):
+        bloque = ids[inicio:inicio + LOTE_STOCK]
+        resultado = ajustar_en_bloque({libro_id: objetivos[libro_id] for libro_id in bloque}, sucursal,
+                                      request.user)
+        titulos = dict(Libro.objects.filter(id__in=bloque[:10]).values_list('id', 'titulo'))
+        detalle = ', '.join(f'"{titulos[libro_id]}" a {resultado[libro_id]}' for libro_id in bloque[:10])
+        if len(bloque) > 10:
+            detalle += f' y {len(bloque) - 10} más'
+        lote = f' (lote {numero} de {len(lotes)})' if len(lotes) > 1 else ''
+        registrar_log(request.user, 'editar', f'Actualizó stock de {len(bloque)} libros{lote}: {detalle}', request,
+                      'Libro', bloque[0] if len(bloque) == 1 else None)
+    return len(ids)
+
 @requiere_rol('bodeguero', 'admin')
 def gestionar_stock(request):
-    """Vista para ver y editar el stock de libros"""
-    libros = Libro.objects.all().order_by('titulo')
+    """
+    Stock de los libros (de su sede si el usuario tiene una), paginado y con
+    búsqueda. El bodeguero puede editar la grilla de la página o subir un CSV
+    de (id o ISBN, stock) para aplicar un conteo de inventario completo.
+    """
+    sucursal = sucursal_de(request.user)
     rol = obtener_rol(request.user)
     puede_editar = rol == 'bodeguero' or rol == 'superusuario'
-    
+    errores, aplicados = [], None
+
     if request.method == 'POST' and puede_editar:
-        libro_id = request.POST.get('libro_id')
-        nuevo_stock = request.POST.get('stock')
-        
-        if libro_id and nuevo_stock:
-            libro = get_object_or_404(Libro, id=libro_id)
-            libro.stock = int(nuevo_stock)
-            libro.save()
-            registrar_log(request.user, 'editar', f'Actualizó stock de "{libro.titulo}" a {nuevo_stock}', request, 'Libro', libro.id)
-    
+        if request.FILES.get('archivo'):
+            filas = _filas_csv(request.FILES['archivo'])
+        elif request.POST.get('libro_id'):
+            filas = [('Libro', request.POST['libro_id'], request.POST.get('stock', ''))]
+        else:
+            filas = _filas_grilla(request.POST)
+        # Todo se valida antes de tocar el inventario: con un error no se aplica nada
+        objetivos, errores = validar_objetivos(filas)
+        if not errores:
+            # Agrega o da de baja ejemplares disponibles; los prestados no se tocan
+            aplicados = _aplicar_stock(request, objetivos, sucursal)
+
+    # Mismos filtros que la exportación (?q=, ?isbn=, ?autor=, ?disponible=)
+    libros = filtrar_libros(Libro.objects.select_related('autor'), request.GET).order_by('titulo', 'id')
+    if sucursal:
+        # Ejemplares en estante de la sede (índice libro, estado, sucursal)
+        libros = libros.annotate(stock_sucursal=models.Count(
+            'ejemplares', filter=models.Q(ejemplares__estado='disponible', ejemplares__sucursal_id=sucursal)))
+    pagina = Paginator(libros, LIBROS_POR_PAGINA).get_page(request.GET.get('pagina'))
+    parametros = request.GET.copy()
+    parametros.pop('pagina', None)
     return render(request, 'gestion/templates/gestionar_stock.html', {
-        'libros': libros,
+        'libros': pagina,
+        'pagina': pagina,
+        'parametros': parametros.urlencode(),
+        'q': request.GET.get('q', ''),
         'puede_editar': puede_editar,
+        'sucursal': Sucursal.objects.filter(id=sucursal).first() if sucursal else None,
+        'errores': errores,
+        'aplicados': aplicados,
+        'stock_maximo': settings.STOCK_MAXIMO_POR_LIBRO,
+    })
+
+
+@requiere_rol('bodeguero', 'bibliotecario', 'admin')
+def ejemplares_libro(request, id):
+    """Ejemplares de un libro con su código de barras, estado y préstamo en curso"""
+    libro = get_object_or_404(Libro.objects.select_related('autor'), id=id)
+    en_curso = {p.ejemplar_id: p for p in Prestamo.objects.filter(libro=libro, fecha_devolucion__isnull=True,
+                                                                   ejemplar__isnull=False).select_related('usuario')}
+    ejemplares = list(libro.ejemplares.select_related('sucursal').order_by('numero'))
+    for ejemplar in ejemplares:
+        ejemplar.prestamo_actual = en_curso.get(ejemplar.id)
+    # ?fecha=AAAA-MM-DD: stock al cierre de ese día según el kardex (foto + movimientos posteriores)
+    try:
+        fecha = date.fromisoformat(request.GET['fecha']) if request.GET.get('fecha') else None
+    except ValueError:
+        fecha = None
+    return render(request, 'gestion/templates/ejemplares.html', {
+        'libro': libro,
+        'ejemplares': ejemplares,
+        'por_sucursal': por_sucursal([libro.id]).get(libro.id, []),
+        'fecha': fecha,
+        'stock_fecha': stock_en(libro.id, fecha) if fecha else None,
+        'movimientos': libro.movimientos.select_related('usuario').order_by('-fecha', '-id')[:20],
+    })
+
+# =====================================================
+# MÉTRICAS DE RENDIMIENTO (Solo administradores)
+# =====================================================
+
+@requiere_rol('admin')
+def metricas(request):
+    """Histogramas por vista en formato de texto de Prometheus"""
+    return HttpResponse(exportar_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@requiere_rol('admin')
+def consultas_lentas(request):
+    """Consultas que superaron el umbral, agrupadas por huella de SQL"""
+    return render(request, 'gestion/templates/consultas_lentas.html', {
+        'grupos': peores_consultas(),
+        'activo': settings.CONSULTAS_LENTAS_ACTIVO,
+        'umbral': settings.CONSULTAS_LENTAS_UMBRAL_MS,
+    })
+
+@requiere_rol('admin')
+def estado_tareas(request):
+    """Estado de la cola de tareas: totales, pendientes por tipo, programadas y fallos"""
+    if request.method == 'POST':
+        id_tarea = request.POST.get('reintentar', '')
+        if id_tarea.isdigit() and reintentar(int(id_tarea)):
+            registrar_log(request.user, 'editar', f'Reintentó la tarea #{id_tarea}', request, 'Tarea', int(id_tarea))
+        return redirect('estado_tareas')
+    ahora = timezone.now()
+    totales = dict(Tarea.objects.order_by().values_list('estado').annotate(n=models.Count('id')))
+    pendientes = (Tarea.objects.filter(estado='pendiente').order_by().values('nombre')
+                  .annotate(listas=models.Count('id', filter=models.Q(ejecutar_en__lte=ahora)),
+                            programadas=models.Count('id', filter=models.Q(ejecutar_en__gt=ahora)),
+                            reintentos=models.Count('id', filter=models.Q(intentos__gt=0)))
+                  .order_by('nombre'))
+    return render(request, 'gestion/templates/tareas.html', {
+        'totales': [(clave, nombre, totales.get(clave, 0)) for clave, nombre in Tarea.ESTADOS],
+        'pendientes': pendientes,
+        'en_curso': Tarea.objects.filter(estado='en_curso').order_by('bloqueada_hasta')[:20],
+        'proximas': Tarea.objects.filter(estado='pendiente', ejecutar_en__gt=ahora).order_by('ejecutar_en')[:20],
+        'fallos': Tarea.objects.filter(estado='fallida').order_by('-terminada')[:20],
+    })
+
+
+# =====================================================
+# REPORTES DE CIRCULACIÓN (Solo personal)
+# =====================================================
+
+def _anio_reporte(request):
+    try:
+        anio = int(request.GET.get('anio', ''))
+    except ValueError:
+        return timezone.localdate().year
+    # date() solo acepta años de 1 a 9999
+    return min(max(anio, MINYEAR), MAXYEAR)
+
+@requiere_rol('admin', 'bibliotecario')
+@solo_lectura
+def reportes(request):
+    """Circulación mensual, retrasos, multas y actividad por rol de un año"""
+    datos = reporte(_anio_reporte(request))
+    maximo = max([fila['prestamos'] for fila in datos['mensual']] + [1])
+    for fila in datos['mensual']:
+        fila['porcentaje'] = round(fila['prestamos'] * 100 / maximo)
+    return render(request, 'gestion/templates/reportes.html', {
+        'datos': datos,
+        'anios': range(timezone.localdate().year, timezone.localdate().year - 6, -1),
+    })
+
+@requiere_rol('admin', 'bibliotecario')
+@solo_lectura
+def exportar_reporte(request):
+    """Descarga el reporte del año en CSV (por defecto) o JSON"""
+    anio = _anio_reporte(request)
+    datos = reporte(anio)
+    if request.GET.get('formato') == 'json':
+        respuesta = JsonResponse(datos)
+        respuesta['Content-Disposition'] = f'attachment; filename="reporte_{anio}.json"'
+        return respuesta
+    respuesta = HttpResponse(content_type='text/csv; charset=utf-8')
+    respuesta['Content-Disposition'] = f'attachment; filename="reporte_{anio}.csv"'
+    csv.writer(respuesta).writerows(filas_csv(datos))
+    return respuesta
+
+@requiere_rol('admin', 'bibliotecario')
+@solo_lectura
+def reporte_diario(request):
+    """Serie diaria de una métrica leída de los resúmenes (comando resumir_actividad)"""
+    hoy = timezone.localdate()
+    metrica = request.GET.get('metrica')
+    if metrica not in METRICAS:
+        metrica = 'actividad'
+    dimension = request.GET.get('dimension') or None
+    try:
+        desde = date.fromisoformat(request.GET.get('desde', ''))
+    except ValueError:
+        desde = hoy - timedelta(days=29)
+    try:
+        hasta = date.fromisoformat(request.GET.get('hasta', ''))
+    except ValueError:
+        hasta = hoy
+    if desde > hasta:
+        return HttpResponse('La fecha desde no puede ser posterior a hasta', status=400)
+    # Como máximo dos años por gráfico (restar solo si cabe: hasta puede estar cerca de date.min)
+    if (hasta - desde).days > 730:
+        desde = hasta - timedelta(days=730)
+    dias = serie(metrica, desde, hasta, dimension)
+    maximo = max([valor for _, valor in dias] + [1])
+    return render(request, 'gestion/templates/reporte_diario.html', {
+        'dias': [{'fecha': fecha, 'valor': valor, 'porcentaje': round(valor * 100 / maximo)} for fecha, valor in dias],
+        'total': sum(valor for _, valor in dias),
+        'metricas': METRICAS,
+        'metrica': metrica,
+        'dimensiones': dimensiones(metrica),
+        'dimension': dimension,
+        'desde': desde,
+        'hasta': hasta,
     })
+
+
+# =====================================================
+# EXPORTACIONES (CSV / JSONL en streaming)
+# =====================================================
+
+ROLES_EXPORTACION = {
+    'libros': ('bodeguero', 'bibliotecario', 'admin'),
+    'prestamos': ('bibliotecario', 'admin'),
+    'multas': ('bibliotecario', 'admin'),
+}
+
+@solo_lectura
+def exportar_datos(request, tipo):
+    """Descarga libros, préstamos o multas con los filtros de la lista (?formato=csv|jsonl)"""
+    if not request.user.is_authenticated:
+        return redirect('login')
+    if tipo not in ROLES_EXPORTACION:
+        return HttpResponse(status=404)
+    if not tiene_permiso(request.user, ROLES_EXPORTACION[tipo]):
+        return HttpResponseForbidden("No tienes permiso para acceder a esta página.")
+    respuesta = exportar(tipo, filtros_personal(request, obtener_rol(request.user)), request.GET.get('formato', 'csv'))
+    if respuesta is None:
+        return HttpResponse('Formato no soportado (usa csv o jsonl)', status=400)
+    registrar_log(request.user, 'ver', f'Exportó {tipo} ({request.GET.urlencode() or "sin filtros"})', request)
+    return respuesta
+
+
+# =====================================================
+# API JSON v1 (solo lectura, ver gestion/api.py)
+# =====================================================
+
+ROLES_VEN_TODO = ('bibliotecario', 'admin')
+
+def _consulta_api(request, recurso):
+    """Queryset base según el usuario, o una respuesta de error si no puede ver el recurso"""
+    definicion = api.RECURSOS[recurso]
+    consulta = definicion.modelo.objects.all()
+    if not definicion.privado:
+        return definicion, consulta, None
+    if not request.user.is_authenticated:
+        return definicion, None, JsonResponse({'error': 'autenticación requerida'}, status=401)
+    # Como en las listas: el personal ve todo (el de una sucursal, solo su sede), los usuarios solo lo suyo
+    if not tiene_permiso(request.user, ROLES_VEN_TODO):
+        consulta = consulta.filter(usuario=request.user)
+    elif sucursal_de(request.user):
+        # Igual que filtros_personal, pero también para el detalle
+        consulta = consulta.filter(sucursal_id=sucursal_de(request.user))
+    return definicion, consulta, None
+
+@solo_lectura
+def api_v1_lista(request, recurso):
+    """Página de un recurso con ?fields=, ?include=, ?limite=, ?cursor= y filtros"""
+    definicion, consulta, error = _consulta_api(request, recurso)
+    if error:
+        return error
+    try:
+        pagina = api.listar(definicion, consulta, request.GET)
+    except api.ErrorApi as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if pagina['siguiente']:
+        parametros = request.GET.copy()
+        parametros['cursor'] = pagina['siguiente']
+        pagina['siguiente_url'] = request.build_absolute_uri(f'{request.path}?{parametros.urlencode()}')
+    return JsonResponse(pagina)
+
+@solo_lectura
+def api_v1_detalle(request, recurso, id):
+    """Un objeto del recurso con ?fields= e ?include="""
+    definicion, consulta, error = _consulta_api(request, recurso)
+    if error:
+        return error
+    try:
+        fila = api.detalle(definicion, consulta, id, request.GET)
+    except api.ErrorApi as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if fila is None:
+        return JsonResponse({'error': 'no encontrado'}, status=404)
+    return JsonResponse(fila)
+
+@solo_lectura
+def api_v1_libro_isbn(request, codigo):
+    """Un libro por ISBN-10/13 escaneado (con o sin guiones): una consulta por el índice único"""
+    isbn = normalizar_isbn(codigo)
+    if isbn is None:
+        return JsonResponse({'error': f'ISBN inválido: {codigo}'}, status=400)
+    definicion, consulta, _ = _consulta_api(request, 'libros')
+    try:
+        fila = api.buscar(definicion, consulta, request.GET, isbn=isbn)
+    except api.ErrorApi as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if fila is None:
+        return JsonResponse({'error': 'no encontrado'}, status=404)
+    return JsonResponse(fila)
+
+@solo_lectura
+def api_v1_disponibilidad_sucursales(request):
+    """Ejemplares disponibles de cada libro por sucursal (?ids=1,2,3), con una sola consulta agrupada"""
+    ids = parsear_ids(request.GET.get('ids'))
+    if ids is None:
+        return JsonResponse({'error': f'indica entre 1 y {settings.DISPONIBILIDAD_MAX_IDS} ids: ?ids=1,2,3'},
+                            status=400)
+    conteos = por_sucursal(ids)
+    return JsonResponse({'libros': {
+        str(id_): [{'sucursal_id': sucursal_id, 'sucursal': nombre, 'disponibles': n}
+                   for sucursal_id, nombre, n in conteos.get(id_, [])]
+        for id_ in ids}})
+
+@solo_lectura
+@condicional(estado_disponibilidad, por_usuario=False)
+def api_v1_disponibilidad(request):
+    """Stock, cola de solicitudes y próxima devolución de hasta DISPONIBILIDAD_MAX_IDS libros (?ids=1,2,3 o ISBN)"""
+    codigos = parsear_ids(request.GET.get('ids'), isbn=True)
+    if codigos is None:
+        return JsonResponse({'error': f'indica entre 1 y {settings.DISPONIBILIDAD_MAX_IDS} ids o ISBN: '
+                                      '?ids=1,2,978-84-376-0494-7'}, status=400)
+    return JsonResponse(disponibilidad(codigos))
+